@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,7 +11,63 @@ LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
 LINE_CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
 LINE_USER_ID = os.getenv("LINE_USER_ID")  # Targeted user ID or Group ID
 
+# 併行設定
+# ANALYSIS_WORKERS: /run_analysis 同時分析的股票數 (1 = 依序執行)
+# 其餘為各外部服務同時進行中的請求上限
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+FINMIND_POOL_SIZE = int(os.getenv("FINMIND_POOL_SIZE", "4"))
+CHIPS_CONCURRENCY = int(os.getenv("CHIPS_CONCURRENCY", "2"))
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "2"))
+# Gemini 每個 model 的每分鐘請求數 / token 數 (token bucket 限速)，
+# GEMINI_MODEL_LIMITS 可個別覆寫，例如 '{"gemini-2.0-flash": {"rpm": 15, "tpm": 1000000}}'
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "10"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "250000"))
+GEMINI_MODEL_LIMITS = json.loads(os.getenv("GEMINI_MODEL_LIMITS", "{}"))
+# 429/503 時同一個 model 最多重試幾次，以及願意等待的 retry-after 上限 (秒)，超過則改用下一個 model
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_MAX_RETRY_WAIT = float(os.getenv("GEMINI_MAX_RETRY_WAIT", "30"))
+# 熔斷：model 額度已滿 / 不可用後跳過的冷卻秒數 (連續發生時加倍，最長 GEMINI_BREAKER_MAX_COOLDOWN)
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", "60"))
+GEMINI_BREAKER_MAX_COOLDOWN = float(os.getenv("GEMINI_BREAKER_MAX_COOLDOWN", "900"))
+# 改連到其他 Gemini 相容的位址 (例如本機假伺服器 scripts/fake_gemini.py，測試吞吐量用)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+# 以串流方式接收 Gemini 回應 (可較早取得第一段文字)
+GEMINI_STREAM = os.getenv("GEMINI_STREAM", "false").lower() in ("1", "true", "yes")
+# 多檔股票同時需要 EPS 預估時，每次合併搜尋的股票數 (1 = 逐檔搜尋)
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "5"))
+# BACKTEST_WORKERS: 回測時併行的 process 數 (預設為 CPU 核心數)
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+
+# Gemini EPS 預估快取 (以股票代號 + 揭露期間為 key，保存在 DATA_STORE_DIR)
+# EPS_CACHE_TTL_HOURS: 快取新鮮期，期間內直接回傳
+# EPS_CACHE_STALE_HOURS: 過期後仍可先回傳舊結果、同時在背景重新搜尋的時間 (0 = 過期即重新搜尋)
+EPS_CACHE_TTL_HOURS = float(os.getenv("EPS_CACHE_TTL_HOURS", "72"))
+EPS_CACHE_STALE_HOURS = float(os.getenv("EPS_CACHE_STALE_HOURS", "168"))
+
+# EPS 預估搜尋方式:
+# "inline" (預設，分析時等待搜尋完成，結果直接寫在報告中)
+# "background" (報告先使用快取/前一次的預估，新的搜尋排入背景佇列，完成後另行推播)
+#   佇列保存在 DATA_STORE_DIR，須指向持久的 Volume；容器本地目錄在 Cloud Run 換 instance 後即遺失，
+#   佇列中的工作不會被處理，而營收月份已標記為處理過，該月的預估將不會再推播
+EPS_FORECAST_MODE = os.getenv("EPS_FORECAST_MODE", "inline")
+# 背景工作最多嘗試次數 (之後放棄)
+EPS_JOB_MAX_ATTEMPTS = int(os.getenv("EPS_JOB_MAX_ATTEMPTS", "3"))
+# 認領工作的租約分鐘數：處理中的 process 停住或被終止時，超過此時間其他 process 可再次認領
+EPS_JOB_LEASE_MINUTES = float(os.getenv("EPS_JOB_LEASE_MINUTES", "15"))
+
 # Google Sheets
 # Path to the json key file or the content itself
 GOOGLE_SHEETS_CREDENTIALS_FILE = os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE", "credentials.json")
 GOOGLE_SHEET_URL = os.getenv("GOOGLE_SHEET_URL")
+
+# Local Data Store
+# 本地資料快取目錄 (日線 Parquet 等)，Cloud Run 上可指向掛載的 Volume
+DATA_STORE_DIR = os.getenv("DATA_STORE_DIR", "data_store")
+
+# 每日日線更新方式: "per_stock" (逐檔增量抓取) 或 "bulk" (單日全市場批次匯入)
+DAILY_INGEST_MODE = os.getenv("DAILY_INGEST_MODE", "per_stock")
+
+# 技術面計算方式:
+# "panel" (每天以最近 60/90 根 K 棒重新計算整份清單)
+# "incremental" (保存每檔的策略狀態，每天只處理新的 K 棒，狀態涵蓋完整歷史)
+TECHNICAL_ENGINE = os.getenv("TECHNICAL_ENGINE", "panel")
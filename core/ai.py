@@ -1,7 +1,16 @@
 import os
+import re
 import logging
 import time
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    GEMINI_CONCURRENCY, EPS_CACHE_TTL_HOURS, EPS_CACHE_STALE_HOURS,
+    GEMINI_RPM, GEMINI_TPM, GEMINI_MODEL_LIMITS, GEMINI_MAX_RETRIES, GEMINI_MAX_RETRY_WAIT, GEMINI_BASE_URL,
+    GEMINI_BATCH_SIZE, GEMINI_BREAKER_COOLDOWN, GEMINI_BREAKER_MAX_COOLDOWN, GEMINI_STREAM,
+)
+from core import store
+from core.ratelimit import ModelLimiter, CircuitBreaker
 
 # New SDK
 from google import genai
@@ -16,92 +25,616 @@ SEARCH_CAPABLE_MODELS = [
     "gemini-2.0-flash",   # 備援：支援 Search
 ]
 
-def search_eps_forecast(stock_id, stock_name):
+# 限制同時進行中的 Gemini 請求數 (併行分析時避免瞬間打滿額度)
+_gemini_slots = threading.BoundedSemaphore(GEMINI_CONCURRENCY)
+
+# 各 model 的 RPM / TPM 額度 (token bucket)，取代每次請求後固定等待 5 秒
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+# 各 model 的熔斷器與健康統計 (成功率、延遲)，用來在執行期間調整 SEARCH_CAPABLE_MODELS 的嘗試順序
+_breakers = {}
+_health = {}
+_health_lock = threading.Lock()
+
+# 至少呼叫幾次後才以成功率 / 延遲判斷 model 是否不健康
+HEALTH_MIN_CALLS = 5
+# 成功率低於此值，或平均延遲超過最快 model 的 SLOW_FACTOR 倍時，排到健康的 model 之後
+HEALTH_MIN_SUCCESS_RATE = 0.5
+HEALTH_SLOW_FACTOR = 3.0
+
+# 預估 token 數時加上的輸出 (含搜尋結果) 額度，實際用量於回應後修正
+ESTIMATED_OUTPUT_TOKENS = 1024
+
+# EPS 預估快取 (store JSON 快取，{"股票代號:揭露期間": {"text", "fetched_at"}})
+EPS_CACHE_NAME = "eps_forecast"
+_cache_stats = {"hit": 0, "stale": 0, "miss": 0, "refresh": 0}
+_cache_lock = threading.Lock()
+_refreshing = set()
+
+
+def _get_limiter(model_name):
     """
-    使用 Gemini 聯網搜尋法人對該公司的最新 EPS 預估
-    具備 Model 備援機制：當一個 model 額度用完時，自動切換到下一個
-    
-    Args:
-        stock_id (str): 股票代號
-        stock_name (str): 股票名稱
-        
+    取得 model 的限速器 (GEMINI_MODEL_LIMITS 可個別覆寫 rpm / tpm)
+    """
+    with _limiters_lock:
+        if model_name not in _limiters:
+            limits = GEMINI_MODEL_LIMITS.get(model_name, {})
+            _limiters[model_name] = ModelLimiter(limits.get("rpm", GEMINI_RPM), limits.get("tpm", GEMINI_TPM))
+        return _limiters[model_name]
+
+
+def _get_breaker(model_name):
+    with _limiters_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(GEMINI_BREAKER_COOLDOWN, GEMINI_BREAKER_MAX_COOLDOWN)
+        return _breakers[model_name]
+
+
+def _record(model_name, start, outcome, error=None):
+    """
+    記錄一次請求的結果 (outcome: "ok" / "quota" (429/503) / "error") 與延遲
+    """
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    with _health_lock:
+        h = _health.setdefault(model_name, {"calls": 0, "ok": 0, "quota": 0, "error": 0,
+                                            "total_ms": 0.0, "max_ms": 0.0, "last_error": None})
+        h["calls"] += 1
+        h[outcome] += 1
+        h["total_ms"] += elapsed_ms
+        h["max_ms"] = max(h["max_ms"], elapsed_ms)
+        if error is not None:
+            h["last_error"] = str(error)[:200]
+
+
+def get_model_health():
+    """
+    取得各 model 的健康狀態
+
     Returns:
-        str: 整理後的預估報告文字
+        dict: {"order": 目前的嘗試順序, "models": {model: {"calls", "ok", "quota", "error", "success_rate",
+               "avg_ms", "max_ms", "last_error", "state", "reopens_in"}}}
     """
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY")
-    
-    if not api_key:
-        logger.error("GEMINI_API_KEY missing.")
-        return "無法執行 EPS 搜尋 (Missing API Key)"
-        
-    try:
-        # Initialize Client
-        client = genai.Client(api_key=api_key)
-        
-        # Define Tool (Google Search)
-        tools = [types.Tool(google_search=types.GoogleSearch())]
-        
-        prompt = f"""
-你是一名極簡風格的財務助手。請針對台灣股市代號 {stock_id} ({stock_name}) 進行「法人EPS預估」的聯網搜尋。
-範圍限定：**最近一個月內**。
+    with _health_lock:
+        health = {name: dict(h) for name, h in _health.items()}
+    models = {}
+    for name in SEARCH_CAPABLE_MODELS:
+        h = health.get(name, {"calls": 0, "ok": 0, "quota": 0, "error": 0, "total_ms": 0.0, "max_ms": 0.0, "last_error": None})
+        breaker = _get_breaker(name)
+        h["success_rate"] = h["ok"] / h["calls"] if h["calls"] else None
+        total_ms = h.pop("total_ms")
+        h["avg_ms"] = total_ms / h["calls"] if h["calls"] else None
+        h["state"] = breaker.state
+        h["reopens_in"] = round(breaker.remaining(), 1)
+        models[name] = h
+    return {"order": _model_order(models), "models": models}
 
-目標：找出「本年度」與「下年度」(若有) 的 EPS 預估值 (單位：新台幣 TWD)。
 
-請嚴格遵守以下「極簡輸出規則」：
+def _model_order(models=None):
+    """
+    依健康狀態調整嘗試順序：熔斷中的 model 排最後，成功率過低或明顯較慢的次之，
+    其餘維持 SEARCH_CAPABLE_MODELS 的原本順序
+    """
+    if models is None:
+        return get_model_health()["order"]
+    sampled = [h["avg_ms"] for h in models.values() if h["calls"] >= HEALTH_MIN_CALLS and h["ok"]]
+    fastest = min(sampled) if sampled else None
+
+    def unhealthy(h):
+        if h["calls"] < HEALTH_MIN_CALLS:
+            return False
+        if h["success_rate"] < HEALTH_MIN_SUCCESS_RATE:
+            return True
+        return fastest is not None and h["avg_ms"] > fastest * HEALTH_SLOW_FACTOR
+
+    def key(item):
+        index, name = item
+        h = models[name]
+        return h["state"] == CircuitBreaker.OPEN, unhealthy(h), index
+
+    return [name for _, name in sorted(enumerate(SEARCH_CAPABLE_MODELS), key=key)]
+
+
+def format_model_health():
+    """
+    將 model 健康狀態整理成一行一個 model 的文字 (寫入 log 用)
+    """
+    health = get_model_health()
+    lines = []
+    for name in health["order"]:
+        h = health["models"][name]
+        rate = f"{h['success_rate'] * 100:.0f}%" if h["success_rate"] is not None else "-"
+        avg = f"{h['avg_ms']:.0f} ms" if h["avg_ms"] is not None else "-"
+        lines.append(f"{name}: {h['state']}，{h['calls']} 次 (成功率 {rate}，額度/不可用 {h['quota']})，平均 {avg}")
+    return "\n".join(lines)
+
+
+def _is_retriable(e):
+    """
+    額度已滿 (429) 或服務暫時不可用 (503)
+    """
+    if getattr(e, "code", None) in (429, 503):
+        return True
+    error_msg = str(e)
+    return "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "503" in error_msg or "UNAVAILABLE" in error_msg
+
+
+def _retry_after(e):
+    """
+    從錯誤取出伺服器建議的等待秒數 (Retry-After header 或 RetryInfo.retryDelay)，沒有時回傳 None
+    """
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if headers:
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(e))
+    return float(match.group(1)) if match else None
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or 0
+
+
+def _http_options():
+    """
+    GEMINI_BASE_URL 有設定時改連到該位址 (例如本機的假 Gemini 伺服器 scripts/fake_gemini.py)
+    """
+    return types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+
+
+# 共用的 Google Search 生成設定 (每次請求相同，只建立一次)
+SEARCH_CONFIG = types.GenerateContentConfig(tools=[types.Tool(google_search=types.GoogleSearch())])
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    取得 process 共用的 genai.Client (第一次呼叫時建立，之後重複使用同一個 HTTP 連線池)
+    API key 或 GEMINI_BASE_URL 改變時重新建立
+
+    Returns:
+        genai.Client: 沒有設定 GEMINI_API_KEY 時回傳 None
+    """
+    global _client, _client_key
+    key = (os.getenv("GEMINI_API_KEY"), GEMINI_BASE_URL)
+    if _client is not None and _client_key == key:
+        return _client
+    with _client_lock:
+        if not key[0]:
+            return None
+        if _client is None or _client_key != key:
+            _client = genai.Client(api_key=key[0], http_options=_http_options())
+            _client_key = key
+        return _client
+
+
+def _call_model(client, model_name, prompt, stream=False, on_chunk=None):
+    """
+    對單一 model 送出一次請求
+    stream 時以 generate_content_stream 逐段接收，on_chunk 可在完整回應前先處理已收到的文字
+
+    Returns:
+        tuple: (回應文字, 實際 token 用量)
+    """
+    if not stream:
+        response = client.models.generate_content(model=model_name, contents=prompt, config=SEARCH_CONFIG)
+        return (response.text if response else None), _usage_tokens(response)
+
+    parts, usage, start = [], 0, time.perf_counter()
+    for chunk in client.models.generate_content_stream(model=model_name, contents=prompt, config=SEARCH_CONFIG):
+        if chunk.text:
+            if not parts:
+                logger.info(f"{model_name} 收到第一段回應: {(time.perf_counter() - start) * 1000:.0f} ms")
+            parts.append(chunk.text)
+            if on_chunk:
+                on_chunk(chunk.text)
+        usage = _usage_tokens(chunk) or usage
+    return "".join(parts), usage
+
+
+_OUTPUT_RULES = """請嚴格遵守以下「極簡輸出規則」：
 1. **只輸出數字與趨勢**：不要任何摘要、不要引言、不要廢話。
 2. **格式限定**：
    年份 EPS: 數字 (趨勢)
    Source: [來源名稱](URL)
 3. **趨勢標記**：若報告有提到「調升」、「調降」、「持平」，請括號標註。若無，則不標註。
-4. **無數據時**：若搜尋不到明確數字，請回傳 \"暫無 EPS 預估資料\"。
+4. **無數據時**：若搜尋不到明確數字，請回傳 \"暫無 EPS 預估資料\"。"""
 
-輸出範例：
-2024 EPS: 5.5元 (調升)
+_OUTPUT_EXAMPLE = """2024 EPS: 5.5元 (調升)
 2025 EPS: 6.2~6.5元
-Source: [工商時報](https://...)
+Source: [工商時報](https://...)"""
+
+
+def _eps_prompt(stock_id, stock_name):
+    return f"""
+你是一名極簡風格的財務助手。請針對台灣股市代號 {stock_id} ({stock_name}) 進行「法人EPS預估」的聯網搜尋。
+範圍限定：**最近一個月內**。
+
+目標：找出「本年度」與「下年度」(若有) 的 EPS 預估值 (單位：新台幣 TWD)。
+
+{_OUTPUT_RULES}
+
+輸出範例：
+{_OUTPUT_EXAMPLE}
 """
+
+
+def _batch_prompt(stocks):
+    """
+    多檔股票合併成一次搜尋的 prompt，每檔的結果以 "### [股票代號]" 開頭的區段輸出
+    """
+    listing = "\n".join(f"- {stock_id} ({stock_name})" for stock_id, stock_name in stocks)
+    return f"""
+你是一名極簡風格的財務助手。請針對以下台灣股市股票，逐檔進行「法人EPS預估」的聯網搜尋。
+範圍限定：**最近一個月內**。
+
+{listing}
+
+目標：找出每檔股票「本年度」與「下年度」(若有) 的 EPS 預估值 (單位：新台幣 TWD)。
+
+輸出結構 (必須遵守，程式會依此拆開各檔結果)：
+- 每檔股票一個區段，依上面的順序輸出，共 {len(stocks)} 個區段。
+- 區段第一行固定為「### [股票代號]」(代號放在方括號內，例如 ### [{stocks[0][0]}])，不要加其他文字。
+- 區段內容不要使用 # 開頭的標題。
+- 區段內容依下方規則，每檔股票都必須有自己的區段，不可合併或省略。
+
+{_OUTPUT_RULES}
+
+輸出範例 (單一區段)：
+### [{stocks[0][0]}]
+{_OUTPUT_EXAMPLE}
+"""
+
+
+# 區段標題 "### [股票代號]" (容許 ## ~ #### 、粗體，以及模型省略方括號的 "### 股票代號")
+_SECTION_HEADER = re.compile(r"^[ \t]*#{2,4}[ \t]*\**[ \t]*(\[)?[ \t]*([0-9A-Za-z]+)[ \t]*(?(1)\])[ \t]*\**([^\n]*)$", re.M)
+
+
+def parse_batch_sections(text, stock_ids):
+    """
+    從合併搜尋的回應中拆出每檔股票的區段
+
+    Args:
+        text (str): 模型回應
+        stock_ids (list): 要求的股票代號
+
+    Returns:
+        dict: {stock_id: 區段文字}，缺少或內容為空的股票不會出現
+    """
+    wanted = {str(sid) for sid in stock_ids}
+    # 要求的股票代號一定是區段開頭；其他代號只有整行就是 "### [代號]" 時才算，
+    # 內容中類似 "## 2025 EPS"、"## [2026] 預估" 的標題不會切斷區段
+    headers = [m for m in _SECTION_HEADER.finditer(text or "")
+               if m.group(2) in wanted or (m.group(1) and not m.group(3).strip())]
+    sections = {}
+    for i, match in enumerate(headers):
+        sid = match.group(2)
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        body = text[match.end():end].strip()
+        if sid in wanted and body and sid not in sections:
+            sections[sid] = body
+    return sections
+
+
+def _generate(prompt, label, estimated_tokens, stream=None, on_chunk=None):
+    """
+    使用 Gemini 聯網搜尋 (Google Search tool) 產生回應
+    具備 Model 備援機制：當一個 model 額度用完時，自動切換到下一個
+    每個 model 依 RPM / TPM 額度限速；429/503 時依 retry-after 暫停該 model，
+    等待時間不長時重試同一個 model，否則切換到下一個
+    
+    Args:
+        stream (bool): 以串流方式接收回應，None 時使用 GEMINI_STREAM
+        on_chunk (callable): 串流時每收到一段文字就呼叫
+    
+    Returns:
+        tuple: (回應文字, 是否成功)，失敗時文字為錯誤說明
+    """
+    stream = GEMINI_STREAM if stream is None else stream
+    
+    try:
+        client = get_client()
+        if client is None:
+            logger.error("GEMINI_API_KEY missing.")
+            return "無法執行 EPS 搜尋 (Missing API Key)", False
         
-        # Model fallback mechanism
-        for model_name in SEARCH_CAPABLE_MODELS:
-            logger.info(f"Generating EPS forecast search for {stock_id} {stock_name} (Model: {model_name})...")
+        # Model fallback mechanism (依健康狀態排序，熔斷中的 model 直接跳過)
+        for model_name in _model_order():
+            breaker = _get_breaker(model_name)
+            if not breaker.allow():
+                logger.warning(f"Model {model_name} 熔斷中 (剩餘 {breaker.remaining():.0f} 秒)，切換到下一個 model...")
+                continue
             
-            try:
-                # API Call
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                        tools=tools
-                    )
-                )
+            limiter = _get_limiter(model_name)
+            for attempt in range(GEMINI_MAX_RETRIES + 1):
+                logger.info(f"Generating EPS forecast search for {label} (Model: {model_name})...")
+                waited = limiter.acquire(estimated_tokens)
+                if waited > 0:
+                    logger.info(f"Model {model_name} 限速等待 {waited:.1f} 秒")
                 
-                # Add delay to avoid rate limiting
-                time.sleep(5)
-                
-                if response and response.text:
-                    logger.info(f"EPS search succeeded with model: {model_name}")
-                    return response.text.strip()
-                else:
-                    logger.warning(f"Empty response from {model_name}, trying next model...")
-                    continue
+                start = time.perf_counter()
+                try:
+                    with _gemini_slots:
+                        text, usage = _call_model(client, model_name, prompt, stream, on_chunk)
+                except Exception as e:
+                    if not _is_retriable(e):
+                        # Non-retriable error (model 本身可用，不觸發熔斷)
+                        _record(model_name, start, "error", e)
+                        breaker.record_success()
+                        logger.error(f"Gemini Search Error ({model_name}): {e}")
+                        return f"EPS 搜尋發生錯誤: {e}", False
                     
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Check if quota/rate limit error - try next model
-                if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "503" in error_msg or "UNAVAILABLE" in error_msg:
-                    logger.warning(f"Model {model_name} 額度已滿或不可用，切換到下一個 model...")
+                    # 依 retry-after 暫停此 model (沒有提供時以指數退避)
+                    _record(model_name, start, "quota", e)
+                    retry_after = _retry_after(e)
+                    delay = retry_after if retry_after is not None else 2 ** attempt
+                    limiter.pause(delay)
+                    if delay > GEMINI_MAX_RETRY_WAIT or attempt == GEMINI_MAX_RETRIES:
+                        breaker.record_failure(retry_after)
+                        logger.warning(f"Model {model_name} 額度已滿或不可用 (retry-after {delay:.0f} 秒)，熔斷並切換到下一個 model...")
+                        break
+                    logger.warning(f"Model {model_name} 額度已滿或不可用，{delay:.1f} 秒後重試 ({attempt + 1}/{GEMINI_MAX_RETRIES})")
                     continue
-                else:
-                    # Non-retriable error
-                    logger.error(f"Gemini Search Error ({model_name}): {e}")
-                    return f"EPS 搜尋發生錯誤: {e}"
+                
+                _record(model_name, start, "ok")
+                breaker.record_success()
+                limiter.settle(estimated_tokens, usage)
+                if text:
+                    logger.info(f"EPS search succeeded with model: {model_name}")
+                    return text.strip(), True
+                logger.warning(f"Empty response from {model_name}, trying next model...")
+                break
         
         # All models exhausted
         logger.error("所有備援 model 都無法使用")
-        return "EPS 搜尋失敗 (所有 model 額度已滿)"
+        return "EPS 搜尋失敗 (所有 model 額度已滿)", False
             
     except Exception as e:
         logger.error(f"Gemini Search Init Error: {e}")
-        return f"EPS 搜尋初始化錯誤: {e}"
+        return f"EPS 搜尋初始化錯誤: {e}", False
+
+
+def _request_eps_forecast(stock_id, stock_name):
+    """
+    搜尋單一股票的法人 EPS 預估
+
+    Returns:
+        tuple: (預估報告文字, 是否成功)
+    """
+    prompt = _eps_prompt(stock_id, stock_name)
+    return _generate(prompt, f"{stock_id} {stock_name}", len(prompt) + ESTIMATED_OUTPUT_TOKENS)
+
+
+def _request_eps_batch(stocks):
+    """
+    以一次搜尋取得多檔股票的法人 EPS 預估
+
+    Args:
+        stocks (list): [(stock_id, stock_name), ...]
+
+    Returns:
+        dict: {stock_id: 預估報告文字}，只包含成功拆出區段的股票
+    """
+    prompt = _batch_prompt(stocks)
+    label = ", ".join(str(stock_id) for stock_id, _ in stocks)
+    text, ok = _generate(prompt, f"[{label}]", len(prompt) + ESTIMATED_OUTPUT_TOKENS * len(stocks))
+    return parse_batch_sections(text, [stock_id for stock_id, _ in stocks]) if ok else {}
+
+
+def _cache_key(stock_id, period):
+    return f"{stock_id}:{period}" if period else str(stock_id)
+
+
+def _count(kind):
+    with _cache_lock:
+        _cache_stats[kind] += 1
+
+
+def _save_forecast(stock_id, period, text):
+    key = _cache_key(stock_id, period)
+    entry = {"text": text, "fetched_at": time.time()}
+    store.update_cache(EPS_CACHE_NAME, lambda cache: {**cache, key: entry})
+
+
+def _refresh(stock_id, stock_name, period):
+    """
+    重新搜尋並寫入快取 (只保存成功的結果)
+    """
+    text, ok = _request_eps_forecast(stock_id, stock_name)
+    if ok:
+        _save_forecast(stock_id, period, text)
+    return text, ok
+
+
+def _refresh_in_background(stock_id, stock_name, period):
+    """
+    背景重新搜尋 (stale-while-revalidate)，同一個 key 同時只會有一個
+    """
+    key = _cache_key(stock_id, period)
+    with _cache_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+        _cache_stats["refresh"] += 1
+
+    def run():
+        try:
+            _refresh(stock_id, stock_name, period)
+        except Exception as e:
+            logger.error(f"背景更新 EPS 預估失敗 ({key}): {e}")
+        finally:
+            with _cache_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name=f"eps-refresh-{key}", daemon=True).start()
+
+
+def _lookup(stock_id, stock_name, period):
+    """
+    查詢快取：新鮮期內命中；過期但仍在 stale 期間內回傳舊結果並於背景更新
+
+    Returns:
+        tuple: (快取文字，需要重新搜尋時為 None, 快取項目 (搜尋失敗時備用))
+    """
+    key = _cache_key(stock_id, period)
+    entry = (store.load_cache(EPS_CACHE_NAME) or {}).get(key)
+    if entry:
+        age_hours = (time.time() - entry.get("fetched_at", 0)) / 3600
+        if age_hours < EPS_CACHE_TTL_HOURS:
+            _count("hit")
+            logger.info(f"EPS 預估快取命中: {key} ({age_hours:.1f} 小時前)")
+            return entry["text"], entry
+        if age_hours < EPS_CACHE_TTL_HOURS + EPS_CACHE_STALE_HOURS:
+            _count("stale")
+            logger.info(f"EPS 預估快取過期，先回傳舊結果並於背景更新: {key} ({age_hours:.1f} 小時前)")
+            _refresh_in_background(stock_id, stock_name, period)
+            return entry["text"], entry
+
+    _count("miss")
+    logger.info(f"EPS 預估快取未命中: {key}")
+    return None, entry
+
+
+def search_eps_forecast(stock_id, stock_name, period=None, force=False):
+    """
+    取得法人 EPS 預估 (先查本地快取，必要時才呼叫 Gemini 聯網搜尋)
+
+    - 新鮮期 (EPS_CACHE_TTL_HOURS) 內直接回傳快取
+    - 過期但仍在 EPS_CACHE_STALE_HOURS 內：先回傳舊結果，背景重新搜尋
+    - 其餘情況同步搜尋；搜尋失敗時若有更舊的快取則回傳舊結果
+
+    Args:
+        stock_id (str): 股票代號
+        stock_name (str): 股票名稱
+        period (str): 觸發搜尋的揭露期間 (e.g. 營收月份 "2025-10")，不同期間分開快取
+        force (bool): 忽略快取，直接重新搜尋
+
+    Returns:
+        str: 整理後的預估報告文字
+    """
+    entry = None
+    if force:
+        _count("miss")
+    else:
+        text, entry = _lookup(stock_id, stock_name, period)
+        if text is not None:
+            return text
+
+    text, ok = _refresh(stock_id, stock_name, period)
+    if not ok and entry:
+        logger.warning(f"EPS 搜尋失敗，改用舊的快取結果: {_cache_key(stock_id, period)}")
+        return entry["text"]
+    return text
+
+
+def search_eps_forecasts(stocks, force=False, batch_size=None, with_status=False):
+    """
+    取得多檔股票的法人 EPS 預估 (營收公布週大量股票同時觸發時使用)
+
+    快取未命中的股票每 batch_size 檔合併成一次搜尋，回應依 "### [股票代號]" 拆回各檔；
+    缺少區段的股票 (或合併搜尋失敗時) 改為單檔搜尋。各次搜尋以 GEMINI_CONCURRENCY 併行。
+
+    Args:
+        stocks (list): [(stock_id, stock_name, period), ...]
+        force (bool): 忽略快取，直接重新搜尋
+        batch_size (int): 每次合併搜尋的股票數，預設為 GEMINI_BATCH_SIZE (1 = 逐檔搜尋)
+        with_status (bool): 同時回傳是否取得有效結果 (快取命中或搜尋成功)
+
+    Returns:
+        list: 與 stocks 順序相同的預估報告文字；with_status 時為 [(文字, 是否成功), ...]
+    """
+    batch_size = max(1, batch_size or GEMINI_BATCH_SIZE)
+    results, entries, pending = {}, {}, {}
+    for stock_id, stock_name, period in stocks:
+        key = _cache_key(stock_id, period)
+        if key in results or key in pending:
+            continue
+        if force:
+            _count("miss")
+        else:
+            text, entries[key] = _lookup(stock_id, stock_name, period)
+            if text is not None:
+                results[key] = (text, True)
+                continue
+        pending[key] = (stock_id, stock_name, period)
+
+    items = list(pending.values())
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    logger.info(f"EPS 預估: {len(stocks)} 檔，快取 {len(results)} 檔，需搜尋 {len(items)} 檔 ({len(chunks)} 次合併搜尋)")
+
+    def run(chunk):
+        sections = _request_eps_batch([(stock_id, stock_name) for stock_id, stock_name, _ in chunk]) if len(chunk) > 1 else {}
+        out = {}
+        for stock_id, stock_name, period in chunk:
+            key = _cache_key(stock_id, period)
+            text, ok = sections.get(str(stock_id)), True
+            if text is not None:
+                _save_forecast(stock_id, period, text)
+            else:
+                if len(chunk) > 1:
+                    logger.warning(f"合併搜尋缺少 {stock_id} 的結果，改為單檔搜尋")
+                text, ok = _refresh(stock_id, stock_name, period)
+                if not ok and entries.get(key):
+                    text = entries[key]["text"]
+            out[key] = (text, ok)
+        return out
+
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(GEMINI_CONCURRENCY, len(chunks)))) as executor:
+            for out in executor.map(run, chunks):
+                results.update(out)
+    results = [results[_cache_key(stock_id, period)] for stock_id, _, period in stocks]
+    return results if with_status else [text for text, _ in results]
+
+
+def get_cached_forecast(stock_id, period=None):
+    """
+    只讀取快取 (不搜尋)：優先取該期間的結果，沒有時取同一檔股票最近一次的預估
+
+    Returns:
+        dict: {"text", "period", "fetched_at", "fresh"} (fresh 表示為該期間且仍在新鮮期內)，沒有任何快取時為 None
+    """
+    cache = store.load_cache(EPS_CACHE_NAME) or {}
+    key = _cache_key(stock_id, period)
+    entry, entry_period = cache.get(key), period
+    if entry is None:
+        prefix = f"{stock_id}:"
+        previous = [(k[len(prefix):] if k.startswith(prefix) else None, e)
+                    for k, e in cache.items() if k.startswith(prefix) or k == str(stock_id)]
+        if not previous:
+            return None
+        entry_period, entry = max(previous, key=lambda item: item[1].get("fetched_at", 0))
+    age_hours = (time.time() - entry.get("fetched_at", 0)) / 3600
+    return {
+        "text": entry["text"],
+        "period": entry_period,
+        "fetched_at": entry.get("fetched_at"),
+        "fresh": entry_period == period and age_hours < EPS_CACHE_TTL_HOURS,
+    }
+
+
+def get_cache_stats():
+    """
+    取得 EPS 預估快取的命中統計
+
+    Returns:
+        dict: {"hit", "stale", "miss", "refresh"} (refresh 為背景更新次數)
+    """
+    with _cache_lock:
+        return dict(_cache_stats)
+
+
+def format_cache_stats():
+    """
+    將快取統計整理成一行文字 (寫入 log 用)
+    """
+    s = get_cache_stats()
+    total = s["hit"] + s["stale"] + s["miss"]
+    rate = (s["hit"] + s["stale"]) / total * 100 if total else 0.0
+    return f"命中 {s['hit']}、過期回傳 {s['stale']}、未命中 {s['miss']} (命中率 {rate:.0f}%)，背景更新 {s['refresh']} 次"
@@ -1,7 +1,7 @@
+import numpy as np
 import pandas as pd
 import logging
-from ta.momentum import StochasticOscillator
-from ta.trend import SMAIndicator
+from core.indicators import compute_indicators
 
 # 設定日誌
 logger = logging.getLogger(__name__)
@@ -20,40 +20,55 @@ def calculate_technical_indicators(df):
         logger.warning("資料不足，無法計算長天期指標")
         return df
 
-    # 1. 計算移動平均線 (MA)
-    # 使用 ta 套件或 pandas rolling
-    
-    # MA5 (週線)
-    ma5_indicator = SMAIndicator(close=df['close'], n=5)
-    df['MA5'] = ma5_indicator.sma_indicator()
+    # 以 NumPy 陣列一次算出 MA5 (週線)、MA20 (月線)、MA60 (季線) 與 KD (9, 3)
+    indicators = compute_indicators(
+        df['max'].to_numpy(dtype=float),
+        df['min'].to_numpy(dtype=float),
+        df['close'].to_numpy(dtype=float)
+    )
     
-    # MA20 (月線)
-    ma20_indicator = SMAIndicator(close=df['close'], n=20)
-    df['MA20'] = ma20_indicator.sma_indicator()
+    # 填補 NaN (前端幾天無法計算)
+    for col, values in indicators.items():
+        df[col] = np.where(np.isnan(values), 0.0, values)
     
-    # MA60 (季線)
-    ma60_indicator = SMAIndicator(close=df['close'], n=60)
-    df['MA60'] = ma60_indicator.sma_indicator()
+    return df
 
-    # 2. 計算 KD 指标 (Stochastic Oscillator)
-    # 參數：n=9 (9天), d_n=3 (D值平滑)
-    kd_indicator = StochasticOscillator(
-        high=df['max'], 
-        low=df['min'], 
-        close=df['close'], 
-        n=9, 
-        d_n=3
-    )
+def analyze_technical(df, stock_id=None):
+    """
+    單一股票的技術面分析 (日/週/月慣性 / 三日高低點 / 均線交叉)
     
-    df['K'] = kd_indicator.stoch()  # 注意：ta 套件的 stoch() 通常指 %K
-    df['D'] = kd_indicator.stoch_signal() # %D
+    Args:
+        df (pd.DataFrame): 已計算指標的日線資料
+        stock_id (str): 指定時週線/月線使用本地保存的 K 棒 (並以 df 增量更新)
+        
+    Returns:
+        dict: 技術面結果 (與 core.panel.analyze_panel 的每檔結果格式相同)
+            {'date', 'close', 'MA20', 'inertia', 'three_day', 'ma_cross'}
+    """
+    from core.strategy import analyze_all_inertia, analyze_3day_high_low, analyze_ma_cross
+    from core.bars import update_period_bars
     
-    # 填補 NaN (前端幾天無法計算)
-    df = df.fillna(0)
+    df_weekly = df_monthly = None
+    if stock_id:
+        try:
+            df_weekly = update_period_bars(stock_id, df, 'W')
+            df_monthly = update_period_bars(stock_id, df, 'M')
+        except Exception as e:
+            logger.error(f"更新 {stock_id} 週/月 K 棒失敗，改由日線彙總: {e}")
+            df_weekly = df_monthly = None
     
-    return df
+    last_row = df.iloc[-1]
+    return {
+        'date': pd.Timestamp(last_row['date']),
+        'close': last_row['close'],
+        'MA20': last_row.get('MA20', np.nan),
+        'inertia': analyze_all_inertia(df, df_weekly, df_monthly),
+        'three_day': analyze_3day_high_low(df, "日線"),
+        'ma_cross': analyze_ma_cross(df),
+    }
 
-def analyze_stock(stock_id, last_revenue_month=None, last_financial_quarter=None, stock_name=None):
+def analyze_stock(stock_id, last_revenue_month=None, last_financial_quarter=None, stock_name=None, technical=None,
+                  eps_mode=None):
     """
     整合函式：抓資料 -> 算指標 -> 營收分析 -> 財報分析
     
@@ -62,6 +77,8 @@ def analyze_stock(stock_id, last_revenue_month=None, last_financial_quarter=None
         last_revenue_month (str): 上次處理的營收月份
         last_financial_quarter (str): 上次處理的財報季度 (e.g. "2024-Q3")
         stock_name (str): 股票名稱
+        technical (dict): 已由 panel 引擎算好的技術面結果，None 時逐檔抓資料計算
+        eps_mode (str): "background" / "inline"，None 時使用 EPS_FORECAST_MODE
         
     Returns:
         dict: {
@@ -72,27 +89,30 @@ def analyze_stock(stock_id, last_revenue_month=None, last_financial_quarter=None
     """
     from core.data import fetch_stock_data, fetch_monthly_revenue, fetch_financial_statements
     
-    # 1. 抓資料 (日線)
-    df = fetch_stock_data(stock_id)
-    if df.empty:
-        return {'report': f"股票 {stock_id} 抓取日線資料失敗。", 'revenue_update': None, 'financial_update': None}
-        
-    # 2. 算指標
-    df = calculate_technical_indicators(df)
+    if technical is None:
+        # 1. 抓資料 (日線)
+        df = fetch_stock_data(stock_id)
+        if df.empty:
+            return {'report': f"股票 {stock_id} 抓取日線資料失敗。", 'revenue_update': None, 'financial_update': None}
+            
+        # 2. 算指標 + 3. 策略/邏輯運算 (技術面)
+        technical = analyze_technical(calculate_technical_indicators(df), stock_id)
     
-    # 3. 策略/邏輯運算 (技術面)
-    from core.strategy import analyze_revenue, analyze_financials, analyze_all_inertia, analyze_3day_high_low, analyze_ma_cross
+    from core.strategy import analyze_revenue, analyze_financials
     strategy_result = {} # Empty dict for now, used for passing info to AI
-    inertia_result = analyze_all_inertia(df)
-    three_day_result = analyze_3day_high_low(df, "日線")
-    ma_cross_result = analyze_ma_cross(df)
+    inertia_result = technical['inertia']
+    three_day_result = technical['three_day']
+    ma_cross_result = technical['ma_cross']
     
     # Add info for AI (Simple Version)
     strategy_result['inertia'] = inertia_result
     strategy_result['three_day'] = three_day_result['state']
     
     # 4. 營收分析
+    from config import EPS_FORECAST_MODE
     from core.ai import search_eps_forecast
+    from core.eps_jobs import forecast_for_report
+    eps_mode = eps_mode or EPS_FORECAST_MODE
     
     revenue_info = None
     revenue_report_str = ""
@@ -106,8 +126,12 @@ def analyze_stock(stock_id, last_revenue_month=None, last_financial_quarter=None
             # 偵測到新營收
             rev_val = revenue_result['revenue'] / 100000000 # 轉成億
             
-            # Trigger EPS Search via Gemini
-            eps_forecast_str = search_eps_forecast(stock_id, stock_name)
+            # Trigger EPS Search via Gemini (同一營收月份的結果會快取，重跑不重複搜尋)
+            # background: 不等待搜尋，先使用快取/前一次的預估，新的結果由背景工作另行推播
+            if eps_mode == 'background':
+                eps_forecast_str = forecast_for_report(stock_id, stock_name, revenue_result['date_str'])
+            else:
+                eps_forecast_str = search_eps_forecast(stock_id, stock_name, period=revenue_result['date_str'])
             
             revenue_report_str = f"""
 【最新月營收公布】({revenue_result['year']}-{revenue_result['month']})
@@ -163,12 +187,7 @@ YoY: {revenue_result['yoy_pct']:.2f}%
     from core.chips import fetch_chips_data, analyze_chips_consecutive, format_chips_report
     chips_report_str = ""
     try:
-        # Check if today is Monday (0) to reduce load? Or run always?
-        # User requested "First trading day of week".
-        # Let's run it always so the latest info is always visible, or restrict if performance issue.
-        # Scraping is external, might be slow (2-3s).
-        # Let's add a condition: Run if Monday OR if we haven't seen this week's data?
-        # Simpler: Run always.
+        # 股權分散表每週公布一次，本地快取只在新一週資料應已公布時才重新抓取 (每次抓取約 2-3 秒)
         df_chips = fetch_chips_data(stock_id)
         chips_results = analyze_chips_consecutive(df_chips)
         chips_report_str = format_chips_report(chips_results)
@@ -177,13 +196,12 @@ YoY: {revenue_result['yoy_pct']:.2f}%
         chips_report_str = ""
 
     # 7. 格式化輸出
-    last_row = df.iloc[-1]
-    last_date = last_row['date'].strftime('%Y-%m-%d')
+    last_date = technical['date'].strftime('%Y-%m-%d')
     
     title_name = f"{stock_id} {stock_name}" if stock_name else stock_id
     
     # --- 1. 基本訊息 ---
-    basic_info_str = f"[基本訊息]\n收盤價: {last_row['close']}\n月線(20MA): {last_row['MA20']:.2f}"
+    basic_info_str = f"[基本訊息]\n收盤價: {technical['close']}\n月線(20MA): {technical['MA20']:.2f}"
 
     # --- 2. 技術面 ---
     # Helper to format 3-day line
@@ -204,8 +222,10 @@ YoY: {revenue_result['yoy_pct']:.2f}%
         return base
 
     technical_lines = [
-        # Inertia
-        f"{inertia_result['weekly']}" if inertia_result.get('weekly') else None,
+        # Inertia (日/週/月)
+        inertia_result.get('daily'),
+        inertia_result.get('weekly'),
+        inertia_result.get('monthly'),
         "", # Empty line
         # 3-Day
         fmt_3day(three_day_result, "日線"),
@@ -258,38 +278,70 @@ YoY: {revenue_result['yoy_pct']:.2f}%
 """
     return {'report': output, 'revenue_update': revenue_update, 'financial_update': fin_update}
 
-def analyze_index(index_id, index_name):
+def prefetch_eps_forecasts(stock_list, workers=None):
+    """
+    分析前先找出有新營收的股票，合併搜尋 EPS 預估並寫入快取
+    (之後 analyze_stock 直接命中快取，營收公布週不必每檔各呼叫一次 Gemini)
+    
+    Args:
+        stock_list (list): 觀察清單 [{'id', 'name', 'last_revenue_month', ...}]
+        workers (int): 讀取營收的執行緒數
+        
+    Returns:
+        int: 需要 EPS 預估的股票數
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from core.data import fetch_monthly_revenue
+    from core.strategy import analyze_revenue
+    from core.ai import search_eps_forecasts
+    
+    def new_revenue(stock_info):
+        try:
+            return analyze_revenue(fetch_monthly_revenue(stock_info['id']), stock_info.get('last_revenue_month'))
+        except Exception as e:
+            logger.error(f"預先讀取營收失敗 {stock_info['id']}: {e}")
+            return None
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers or 1)) as executor:
+        revenues = list(executor.map(new_revenue, stock_list))
+    
+    stocks = [(s['id'], s.get('name'), rev['date_str']) for s, rev in zip(stock_list, revenues) if rev]
+    if stocks:
+        search_eps_forecasts(stocks)
+    return len(stocks)
+
+
+def analyze_index(index_id, index_name, technical=None):
     """
     分析大盤/櫃買指數 (僅包含基本訊息與技術面)
+    
+    Args:
+        technical (dict): 已由 panel 引擎算好的技術面結果，None 時自行抓資料計算
     """
     from core.data import fetch_stock_data
-    from core.strategy import analyze_all_inertia, analyze_3day_high_low, analyze_ma_cross
     
-    # 1. Fetch Data
-    df = fetch_stock_data(index_id)
-    if df.empty:
-        return f"【{index_name}】無法取得資料"
-        
-    # 2. Calc Tech
-    df = calculate_technical_indicators(df)
+    if technical is None:
+        # 1. Fetch Data
+        df = fetch_stock_data(index_id)
+        if df.empty:
+            return f"【{index_name}】無法取得資料"
+            
+        # 2. Calc Tech + 3. Strategy
+        technical = analyze_technical(calculate_technical_indicators(df), index_id)
     
-    # 3. Strategy
-    inertia_result = analyze_all_inertia(df)
-    three_day_result = analyze_3day_high_low(df, "日線")
-    ma_cross_result = analyze_ma_cross(df)
+    inertia_result = technical['inertia']
+    three_day_result = technical['three_day']
+    ma_cross_result = technical['ma_cross']
     
     # 4. Format Output
-    last_row = df.iloc[-1]
-    last_date = last_row['date'].strftime('%Y-%m-%d')
+    last_date = technical['date'].strftime('%Y-%m-%d')
     
     # --- 1. Basic Info ---
-    basic_info_str = f"[基本訊息]\n收盤價: {last_row['close']}\n月線(20MA): {last_row['MA20']:.2f}"
+    basic_info_str = f"[基本訊息]\n收盤價: {technical['close']}\n月線(20MA): {technical['MA20']:.2f}"
     
     # --- 2. Technical ---
     # Inertia
-    tech_lines = [
-        f"{inertia_result['weekly']}" if inertia_result.get('weekly') else None
-    ]
+    tech_lines = [inertia_result.get(key) for key in ('daily', 'weekly', 'monthly')]
     
     # 3-Day
     # 3-Day
@@ -0,0 +1,456 @@
+import numpy as np
+import pandas as pd
+import logging
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from config import BACKTEST_WORKERS
+from core import store
+from core.indicators import sma
+from core.strategy import (
+    inertia_signals, breakout_signals, ma_cross_signals, moving_average,
+    _latch_signals, cross_state_series
+)
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 回測：以本地日線資料庫的歷史逐根重播策略狀態 (與 core/strategy.py 相同的訊號與狀態機)，
+# 收盤後依狀態決定部位，預設於隔天開盤成交，計算每個規則、每檔股票的勝率、報酬與回撤。
+# 訊號與損益皆以 NumPy 沿時間軸一次計算，多檔股票以 process pool 併行。
+
+# 規則名稱 -> 報告標題
+BACKTEST_RULES = {
+    'inertia': "日線慣性",
+    'breakout': "三日高低點",
+    'ma_cross': "均線交叉",
+}
+
+# 規則參數 (window 為 None 表示使用完整歷史建立狀態，與 analyze_* 的 window 參數相同)
+DEFAULT_PARAMS = {
+    'inertia': {'window': None},
+    'breakout': {'lookback': 3, 'window': None},
+    'ma_cross': {'fast': 20, 'slow': 60, 'ma_type': "sma", 'obs_days': 3, 'window': None},
+}
+
+# 交易成本 (比例)：手續費買賣各收一次，證交稅只在賣出時收，滑價買賣各計一次
+DEFAULT_COSTS = {'fee_rate': 0.001425, 'tax_rate': 0.003, 'slippage': 0.0}
+
+FILL_MODES = ('open', 'close')
+
+
+def _expire(state, last_event, max_age):
+    """
+    狀態只在最後一次觸發距今 max_age 根以內時有效 (模擬只看最後 N 根 K 棒的 window)
+    """
+    if max_age is None:
+        return state
+    age = np.arange(state.shape[-1]) - last_event
+    return np.where((last_event >= 0) & (age <= max_age), state, 0).astype(np.int8)
+
+
+def _windowed_latch(signal, max_age):
+    state, _, _ = _latch_signals(signal)
+    n = signal.shape[-1]
+    last_trigger = np.maximum.accumulate(np.where(signal != 0, np.arange(n), -1), axis=-1)
+    return _expire(state, last_trigger, max_age)
+
+
+def _mask_after_missing(signal, close, lookback):
+    """
+    前 lookback 根中有缺值 (panel 左側補的 NaN) 的位置不產生訊號，與逐檔計算時前 N 根沒有訊號相同
+    """
+    missing = ~np.isfinite(np.asarray(close, dtype=float))
+    if not missing.any():
+        return signal
+    n = signal.shape[-1]
+    counts = np.concatenate((np.zeros(missing.shape[:-1] + (1,), dtype=int), np.cumsum(missing, axis=-1)), axis=-1)
+    t = np.arange(n)
+    prior = counts[..., t] - counts[..., np.maximum(t - lookback, 0)]
+    return np.where(prior > 0, 0, signal).astype(np.int8)
+
+
+def inertia_state(high, low, close, window=None):
+    """
+    逐根 K 棒的慣性狀態 (+1 慣性向上 / -1 慣性向下 / 0 無訊號)
+
+    第 t 根的狀態等同 analyze_inertia_with_state(df.iloc[:t + 1], window=window) 的 state
+    """
+    signal = inertia_signals(high, low, close)
+    # window 的第一根沒有前一根可比較，因此只看最後 window - 1 根的訊號
+    return _windowed_latch(signal, window - 2 if window else None)
+
+
+def breakout_state(high, low, close, lookback=3, window=None):
+    """
+    逐根 K 棒的 N 日高低點狀態 (+1 站上 / -1 跌破 / 0 盤整)
+
+    第 t 根的狀態等同 analyze_3day_high_low(df.iloc[:t + 1], lookback=lookback, window=window) 的 state
+    """
+    signal, _, _ = breakout_signals(high, low, close, lookback)
+    signal = _mask_after_missing(signal, close, lookback)
+    return _windowed_latch(signal, window - 1 - lookback if window else None)
+
+
+def ma_cross_state(fast_ma, slow_ma, obs_days=3, window=None):
+    """
+    逐根 K 棒的均線交叉確認狀態 (+1 黃金交叉 / -1 死亡交叉 / 0 尚未確認)，觀察期中維持上一個確認狀態
+
+    window 不為 None 時，交叉發生在最後 window 根之外的狀態視為無訊號
+    (analyze_ma_cross 每次以 window 根重新跑狀態機，兩者只在 window 邊界附近的連續交叉可能不同)
+
+    Args:
+        fast_ma, slow_ma (np.ndarray): 快慢線 (1-D 或 2-D，前段 NaN 不產生交叉)
+    """
+    fast_ma = np.asarray(fast_ma, dtype=float)
+    slow_ma = np.asarray(slow_ma, dtype=float)
+    if fast_ma.ndim > 1:
+        return np.stack([ma_cross_state(f, s, obs_days, window) for f, s in zip(fast_ma, slow_ma)])
+
+    state, cross_pos = cross_state_series(
+        ma_cross_signals(fast_ma, slow_ma), fast_ma > slow_ma, fast_ma < slow_ma, max(2, obs_days)
+    )
+    return _expire(state, cross_pos, window - 2 if window else None)
+
+
+def ma_values(close, n, ma_type="sma"):
+    """
+    移動平均 (SMA 前 n-1 根為 NaN；EMA 與 strategy.moving_average 相同)，可為 2-D
+    """
+    close = np.asarray(close, dtype=float)
+    if ma_type == "sma":
+        return sma(close, n)
+    if close.ndim > 1:
+        return np.stack([ma_values(row, n, ma_type) for row in close])
+    return moving_average(pd.Series(close), n, ma_type).to_numpy()
+
+
+def rule_state(rule, bars, params=None):
+    """
+    計算單一規則的逐根狀態
+
+    Args:
+        rule (str): BACKTEST_RULES 的鍵
+        bars (dict): {'max', 'min', 'close', ...} 價格陣列 (1-D 或 2-D)
+        params (dict): 覆寫 DEFAULT_PARAMS[rule] 的參數
+
+    Returns:
+        np.ndarray: 與 close 同形狀的 int8 陣列
+    """
+    p = {**DEFAULT_PARAMS[rule], **(params or {})}
+    if rule == 'inertia':
+        return inertia_state(bars['max'], bars['min'], bars['close'], p['window'])
+    if rule == 'breakout':
+        return breakout_state(bars['max'], bars['min'], bars['close'], p['lookback'], p['window'])
+    fast_ma = ma_values(bars['close'], p['fast'], p['ma_type'])
+    slow_ma = ma_values(bars['close'], p['slow'], p['ma_type'])
+    return ma_cross_state(fast_ma, slow_ma, p['obs_days'], p['window'])
+
+
+def _shift(values, fill):
+    out = np.empty_like(values)
+    out[..., 0] = fill
+    out[..., 1:] = values[..., :-1]
+    return out
+
+
+def _trade_costs(costs):
+    costs = {**DEFAULT_COSTS, **(costs or {})}
+    buy = costs['fee_rate'] + costs['slippage']
+    sell = costs['fee_rate'] + costs['tax_rate'] + costs['slippage']
+    return buy, sell
+
+
+def _fill_open(open_, close):
+    """
+    開盤價缺值時以前一根收盤代替 (視為沒有跳空)
+    """
+    open_ = np.asarray(open_, dtype=float) if open_ is not None else np.full(close.shape, np.nan)
+    return np.where(np.isfinite(open_), open_, _shift(close, np.nan))
+
+
+def simulate(position, open_, close, costs=None, fill='open'):
+    """
+    依每根 K 棒收盤後的目標部位模擬損益 (可為 2-D，沿最後一軸計算)
+
+    - fill='open'：第 t 根收盤的訊號於第 t+1 根開盤成交；fill='close'：於第 t 根收盤成交
+    - 每次部位變動依變動量扣除成本：買進 (含空單回補) 為 手續費 + 滑價，
+      賣出 (含放空) 另加證交稅
+    - 收盤價為 NaN 的 K 棒 (panel 左側補值) 不持有部位
+
+    Args:
+        position (np.ndarray): 目標部位 (+1 / -1 / 0)
+        open_, close (np.ndarray): 開盤 / 收盤價
+        costs (dict): 覆寫 DEFAULT_COSTS
+
+    Returns:
+        dict: {
+            'held': 每根 K 棒收盤時持有的部位,
+            'multiplier': 每根 K 棒的淨值倍數 (含成本),
+            'equity': 累積淨值 (起始為 1),
+            'bars': 有收盤價的 K 棒數
+        }
+    """
+    if fill not in FILL_MODES:
+        raise ValueError(f"不支援的成交方式: {fill}")
+    close = np.asarray(close, dtype=float)
+    valid = np.isfinite(close)
+    position = np.where(valid, position, 0).astype(np.int8)
+    held = np.where(valid, _shift(position, 0), 0).astype(np.int8) if fill == 'open' else position
+    prev_held = _shift(held, 0)
+    prev_close = _shift(close, np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if fill == 'open':
+            open_ = _fill_open(open_, close)
+            gap = np.nan_to_num(open_ / prev_close - 1, nan=0.0, posinf=0.0, neginf=0.0)
+            intraday = np.nan_to_num(close / open_ - 1, nan=0.0, posinf=0.0, neginf=0.0)
+            gross = (1 + prev_held * gap) * (1 + held * intraday)
+        else:
+            change = np.nan_to_num(close / prev_close - 1, nan=0.0, posinf=0.0, neginf=0.0)
+            gross = 1 + prev_held * change
+
+    buy, sell = _trade_costs(costs)
+    delta = held.astype(int) - prev_held
+    multiplier = gross * (1 - np.maximum(delta, 0) * buy - np.maximum(-delta, 0) * sell)
+    return {
+        'held': held,
+        'multiplier': multiplier,
+        'equity': np.cumprod(multiplier, axis=-1),
+        'bars': valid.sum(axis=-1),
+    }
+
+
+def extract_trades(held, open_, close, costs=None, fill='open'):
+    """
+    由持有部位取出每一筆交易 (1-D，或 2-D 時每列各自計算)
+
+    資料結束時仍持有的交易以最後收盤價計算 (不扣出場成本)，exit 為 -1
+
+    Returns:
+        dict: {'entry', 'exit', 'side', 'return'} 陣列，entry / exit 為該列中的位置，
+              return 為含成本的報酬率 (比例)；2-D 時另含 'row'
+    """
+    held2 = np.atleast_2d(held)
+    close2 = np.atleast_2d(np.asarray(close, dtype=float))
+    rows, width = held2.shape
+    flat_held = held2.ravel()
+
+    # 攤平後依序處理：下一個變動點若已跨到下一列，表示該筆交易持有到資料結束
+    change = np.flatnonzero(held2 != _shift(held2, 0))
+    entries = change[flat_held[change] != 0]
+    row = entries // width
+    nxt = np.append(change, rows * width)[np.searchsorted(change, entries, side='right')]
+    closed = nxt < (row + 1) * width
+
+    open2 = np.atleast_2d(open_) if open_ is not None else None
+    prices = (_fill_open(open2, close2) if fill == 'open' else close2).ravel()
+    entry_px = prices[entries]
+    exit_px = np.where(closed, prices[np.minimum(nxt, rows * width - 1)], close2[row, -1])
+
+    side = flat_held[entries]
+    ratio = exit_px / entry_px
+    gross = np.where(side > 0, ratio, 2 - ratio)
+    buy, sell = _trade_costs(costs)
+    entry_cost = np.where(side > 0, buy, sell)
+    exit_cost = np.where(closed, np.where(side > 0, sell, buy), 0.0)
+    trades = {
+        'entry': entries - row * width,
+        'exit': np.where(closed, nxt - row * width, -1),
+        'side': side,
+        'return': gross * (1 - entry_cost) * (1 - exit_cost) - 1,
+    }
+    if np.ndim(held) > 1:
+        trades['row'] = row
+    return trades
+
+
+def max_drawdown(equity):
+    """
+    最大回撤 (比例，沿最後一軸；起始淨值 1 視為第一個高點)
+    """
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=-1)
+    return (1 - equity / peak).max(axis=-1)
+
+
+def evaluate(sim, trades):
+    """
+    績效指標 (百分比)
+
+    Args:
+        sim (dict): simulate 的結果
+        trades (dict): extract_trades 的結果
+
+    Returns:
+        dict: 1-D 時為單一股票的指標，2-D 時每個指標為每列一個值的陣列
+    """
+    held = np.atleast_2d(sim['held'])
+    rows = held.shape[0]
+    returns = trades['return']
+    row = trades.get('row', np.zeros(len(returns), dtype=int))
+
+    n_trades = np.bincount(row, minlength=rows)
+    wins = np.bincount(row, weights=returns > 0, minlength=rows).astype(int)
+    return_sum = np.bincount(row, weights=returns, minlength=rows)
+    has_trades = n_trades > 0
+    bars = np.atleast_1d(sim.get('bars', held.shape[1]))
+    metrics = {
+        'trades': n_trades,
+        'wins': wins,
+        'hit_rate': np.divide(wins * 100, n_trades, out=np.zeros(rows), where=has_trades),
+        'avg_return_pct': np.divide(return_sum * 100, n_trades, out=np.zeros(rows), where=has_trades),
+        'total_return_pct': (np.atleast_2d(sim['equity'])[:, -1] - 1) * 100,
+        'max_drawdown_pct': max_drawdown(np.atleast_2d(sim['equity'])) * 100,
+        'exposure_pct': np.divide((held != 0).sum(axis=-1) * 100, bars, out=np.zeros(rows), where=bars > 0),
+    }
+    if np.ndim(sim['held']) > 1:
+        return metrics
+    return {key: value[0].item() for key, value in metrics.items()}
+
+
+def backtest_frame(df, rules=None, params=None, costs=None, fill='open', allow_short=False, include_trades=False):
+    """
+    回測單一股票的日線
+
+    Args:
+        df (pd.DataFrame): 依日期排序的日線 (date, open, max, min, close)
+        rules (list): 要回測的規則 (BACKTEST_RULES 的鍵)，None 表示全部
+        params (dict): {rule: {參數}} 覆寫 DEFAULT_PARAMS
+        costs (dict): 覆寫 DEFAULT_COSTS
+        fill (str): 'open' (隔天開盤成交) 或 'close' (當天收盤成交)
+        allow_short (bool): 空方訊號是否放空 (預設只做多，空方訊號時空手)
+        include_trades (bool): 是否附上每筆交易 ('trade_list')
+
+    Returns:
+        list: 每個規則一筆 {'rule', 'trades', 'wins', 'hit_rate', 'avg_return_pct',
+              'total_return_pct', 'max_drawdown_pct', 'exposure_pct', 'start', 'end'}
+    """
+    rules = _check_rules(rules)
+    if df is None or len(df) < 2:
+        return []
+    bars = {col: df[col].to_numpy(dtype=float) for col in ('open', 'max', 'min', 'close') if col in df.columns}
+    dates = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d').to_numpy()
+
+    rows = []
+    for rule in rules:
+        state = rule_state(rule, bars, (params or {}).get(rule))
+        position = state if allow_short else np.maximum(state, 0)
+        sim = simulate(position, bars.get('open'), bars['close'], costs, fill)
+        trades = extract_trades(sim['held'], bars.get('open'), bars['close'], costs, fill)
+        row = {'rule': rule, **evaluate(sim, trades), 'start': dates[0], 'end': dates[-1]}
+        if include_trades:
+            row['trade_list'] = [
+                {
+                    'entry_date': dates[e],
+                    'exit_date': dates[x] if x >= 0 else None,
+                    'side': int(s),
+                    'return_pct': float(r * 100),
+                }
+                for e, x, s, r in zip(trades['entry'], trades['exit'], trades['side'], trades['return'])
+            ]
+        rows.append(row)
+    return rows
+
+
+def _check_rules(rules):
+    rules = list(rules or BACKTEST_RULES)
+    unknown = [r for r in rules if r not in BACKTEST_RULES]
+    if unknown:
+        raise ValueError(f"未知的回測規則: {unknown}")
+    return rules
+
+
+def _backtest_stock(stock_id, start_date=None, end_date=None, **kwargs):
+    """
+    讀取本地日線並回測單一股票 (供 process pool 使用，失敗時回傳空 list)
+    """
+    try:
+        df = store.load_bars(stock_id, start_date, end_date)
+        return [{'stock_id': stock_id, **row} for row in backtest_frame(df, **kwargs)]
+    except Exception as e:
+        logger.error(f"{stock_id} 回測失敗: {e}")
+        return []
+
+
+def summarize_rules(per_stock):
+    """
+    將每檔股票的結果彙總為每個規則一列
+
+    - trades / wins: 全部股票合計，hit_rate 與 avg_return_pct 以交易筆數加權
+    - total_return_pct: 各股票的平均與中位數
+    - max_drawdown_pct: 各股票的平均與最大值
+    """
+    columns = ['rule', 'stocks', 'trades', 'wins', 'hit_rate', 'avg_return_pct',
+               'mean_total_return_pct', 'median_total_return_pct', 'mean_max_drawdown_pct', 'worst_drawdown_pct']
+    if per_stock.empty:
+        return pd.DataFrame(columns=columns)
+
+    weighted = per_stock.assign(return_sum=per_stock['avg_return_pct'] * per_stock['trades'])
+    g = weighted.groupby('rule', sort=False)
+    summary = pd.DataFrame({
+        'stocks': g.size(),
+        'trades': g['trades'].sum(),
+        'wins': g['wins'].sum(),
+        'return_sum': g['return_sum'].sum(),
+        'mean_total_return_pct': g['total_return_pct'].mean(),
+        'median_total_return_pct': g['total_return_pct'].median(),
+        'mean_max_drawdown_pct': g['max_drawdown_pct'].mean(),
+        'worst_drawdown_pct': g['max_drawdown_pct'].max(),
+    })
+    trades = summary['trades'].where(summary['trades'] > 0)
+    summary['hit_rate'] = (summary['wins'] / trades * 100).fillna(0.0)
+    summary['avg_return_pct'] = (summary['return_sum'] / trades).fillna(0.0)
+    return summary.reset_index()[columns]
+
+
+def run_backtest(stock_ids=None, start_date=None, end_date=None, rules=None, params=None, costs=None,
+                 fill='open', allow_short=False, workers=None):
+    """
+    以本地日線資料庫回測多檔股票 (不呼叫 FinMind)
+
+    Args:
+        stock_ids (list): 指定股票，None 表示本地資料庫中的所有股票
+        start_date, end_date (str): 回測區間 "YYYY-MM-DD" (含)，None 表示不限
+        workers (int): process 數，預設為 BACKTEST_WORKERS；1 表示在目前的 process 依序執行
+        其餘參數同 backtest_frame
+
+    Returns:
+        dict: {
+            'stocks': pd.DataFrame,  # 每檔股票、每個規則一列 (stock_id, rule, 指標...)
+            'rules': pd.DataFrame,   # summarize_rules 的結果
+        }
+    """
+    rules = _check_rules(rules)
+    if fill not in FILL_MODES:
+        raise ValueError(f"不支援的成交方式: {fill}")
+    stock_ids = stock_ids or store.list_stocks()
+    workers = max(1, workers or BACKTEST_WORKERS)
+    logger.info(f"開始回測: {len(stock_ids)} 檔, 規則 {rules}, {workers} 個 process")
+
+    job = partial(
+        _backtest_stock, start_date=start_date, end_date=end_date, rules=rules,
+        params=params, costs=costs, fill=fill, allow_short=allow_short
+    )
+    if workers == 1 or len(stock_ids) <= 1:
+        results = list(map(job, stock_ids))
+    else:
+        chunksize = max(1, len(stock_ids) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(job, stock_ids, chunksize=chunksize))
+
+    per_stock = pd.DataFrame([row for rows in results for row in rows])
+    return {'stocks': per_stock, 'rules': summarize_rules(per_stock)}
+
+
+def format_backtest_report(summary):
+    """
+    將規則彙總 (summarize_rules 的結果) 整理成文字報告
+    """
+    lines = []
+    for row in summary.to_dict('records'):
+        lines.append(
+            f"【{BACKTEST_RULES[row['rule']]}】{row['stocks']} 檔 / {row['trades']} 筆交易\n"
+            f"勝率 {row['hit_rate']:.1f}%，平均每筆 {row['avg_return_pct']:+.2f}%\n"
+            f"總報酬 平均 {row['mean_total_return_pct']:+.2f}% / 中位數 {row['median_total_return_pct']:+.2f}%\n"
+            f"最大回撤 平均 {row['mean_max_drawdown_pct']:.2f}% / 最差 {row['worst_drawdown_pct']:.2f}%"
+        )
+    return "\n\n".join(lines)
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import logging
+from datetime import timedelta
+from core import store
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 週線 / 月線 K 棒
+# 由日線彙總 (open 取第一根、max 取最高、min 取最低、close 取最後一根，與 resample_to_period 相同)，
+# 保存在本地資料庫 (weekly/、monthly/，與 daily/ 並列)，每天只更新最後一根進行中的 K 棒。
+
+PERIOD_KINDS = {'W': 'weekly', 'M': 'monthly'}
+OHLC = ['open', 'max', 'min', 'close']
+
+
+def period_labels(dates, period):
+    """
+    計算每根 K 棒所屬的週期編號，以及 pandas resample 使用的標籤日期
+
+    Args:
+        dates (np.ndarray): datetime64[ns]
+        period (str): 'W' (週，週一 ~ 週日，標籤為週日) 或 'M' (月，標籤為月底)
+
+    Returns:
+        tuple: (key, label)
+    """
+    if period == 'W':
+        days = dates.astype('datetime64[D]').astype(np.int64)
+        key = (days + 3) // 7   # 1970-01-01 為週四，+3 後以週一為一週的起點
+        label = (key * 7 + 3).astype('datetime64[D]')
+    elif period == 'M':
+        months = dates.astype('datetime64[M]')
+        key = months.astype(np.int64)
+        label = (months + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+    else:
+        raise ValueError(f"不支援的週期: {period}")
+    return key, label.astype('datetime64[ns]')
+
+
+def aggregate_bars(df_daily, period):
+    """
+    將日線彙總為週線/月線
+
+    Args:
+        df_daily (pd.DataFrame): 依日期排序的日線 (date, open, max, min, close)
+        period (str): 'W' 或 'M'
+
+    Returns:
+        pd.DataFrame: date (週期標籤), open, max, min, close, first_day, last_day
+                      (first_day / last_day 為該週期內第一根與最後一根日 K 的日期)
+    """
+    columns = ['date'] + OHLC + ['first_day', 'last_day']
+    if df_daily is None or df_daily.empty:
+        return pd.DataFrame(columns=columns)
+
+    dates = pd.to_datetime(df_daily['date']).to_numpy()
+    key, label = period_labels(dates, period)
+    new_group = np.ones(len(key), dtype=bool)
+    new_group[1:] = key[1:] != key[:-1]
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(key)) - 1
+
+    values = {col: df_daily[col].to_numpy(dtype=float) if col in df_daily.columns else np.full(len(key), np.nan)
+              for col in OHLC}
+    bars = pd.DataFrame({
+        'date': label[starts],
+        'open': values['open'][starts],
+        'max': np.fmax.reduceat(values['max'], starts),
+        'min': np.fmin.reduceat(values['min'], starts),
+        'close': values['close'][ends],
+        'first_day': pd.DatetimeIndex(dates[starts]).strftime("%Y-%m-%d"),
+        'last_day': pd.DatetimeIndex(dates[ends]).strftime("%Y-%m-%d"),
+    })
+    return bars.dropna(subset=OHLC).reset_index(drop=True)
+
+
+def rollup(bars, df_new, period):
+    """
+    將新的日 K 併入既有的週線/月線：落在最後一根 (進行中) 週期內的部分合併進該根，其餘附加為新的 K 棒
+
+    Args:
+        bars (pd.DataFrame): aggregate_bars 格式的既有 K 棒
+        df_new (pd.DataFrame): 比 bars 最後一根日 K 更新的日線
+
+    Returns:
+        pd.DataFrame
+    """
+    fresh = aggregate_bars(df_new, period)
+    if bars.empty:
+        return fresh
+    if fresh.empty:
+        return bars
+
+    last, first = bars.iloc[-1], fresh.iloc[0]
+    if last['date'] != first['date']:
+        return pd.concat([bars, fresh], ignore_index=True)
+
+    merged = {
+        'date': last['date'],
+        'open': last['open'],
+        'max': np.fmax(last['max'], first['max']),
+        'min': np.fmin(last['min'], first['min']),
+        'close': first['close'],
+        'first_day': last['first_day'],
+        'last_day': first['last_day'],
+    }
+    return pd.concat([bars.iloc[:-1], pd.DataFrame([merged]), fresh.iloc[1:]], ignore_index=True)
+
+
+def load_period_bars(stock_id, period):
+    """
+    讀取本地保存的週線/月線 (不存在時回傳空的 DataFrame)
+    """
+    return store.load_frame(PERIOD_KINDS[period], stock_id)
+
+
+def update_period_bars(stock_id, df_daily, period):
+    """
+    以日線更新本地保存的週線/月線，並回傳完整的 K 棒
+
+    - 尚未保存過：以本地日線資料庫的完整歷史 (沒有時用 df_daily) 建立
+    - 已保存：只彙總比最後一根日 K 更新的部分；df_daily 與保存的 K 棒之間有缺口時，
+      從本地日線資料庫補讀缺少的日期
+
+    Args:
+        stock_id (str): 股票代碼
+        df_daily (pd.DataFrame): 最近的日線資料
+        period (str): 'W' 或 'M'
+
+    Returns:
+        pd.DataFrame: date, open, max, min, close, first_day, last_day
+    """
+    kind = PERIOD_KINDS[period]
+    bars = load_period_bars(stock_id, period)
+
+    if bars.empty:
+        history = store.load_bars(stock_id)
+        source = history if not history.empty and len(history) >= len(df_daily) else df_daily
+        result = aggregate_bars(source, period)
+    else:
+        last_day = pd.Timestamp(bars['last_day'].iloc[-1])
+        daily_dates = pd.to_datetime(df_daily['date'])
+        df_new = df_daily[daily_dates > last_day]
+        if not df_daily.empty and daily_dates.iloc[0] > last_day + timedelta(days=1):
+            from_store = store.load_bars(stock_id, start_date=(last_day + timedelta(days=1)).strftime("%Y-%m-%d"))
+            if not from_store.empty:
+                df_new = from_store
+        if df_new.empty:
+            return bars
+        result = rollup(bars, df_new, period)
+
+    if not result.empty:
+        try:
+            store.save_frame(kind, stock_id, result)
+        except Exception as e:
+            logger.error(f"保存 {stock_id} {kind} K 棒失敗: {e}")
+    return result
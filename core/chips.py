@@ -1,17 +1,57 @@
 import requests
 import pandas as pd
 import logging
+import threading
 from datetime import datetime
+from config import CHIPS_CONCURRENCY
+from core import store, disclosure
 
 logger = logging.getLogger(__name__)
 
-def fetch_chips_data(stock_id):
+# 限制同時對神秘金字塔發出的請求數 (併行分析時避免被擋)
+_chips_slots = threading.BoundedSemaphore(CHIPS_CONCURRENCY)
+
+def fetch_chips_data(stock_id, today=None):
+    """
+    取得股權分散表 (本地快取)
+    資料每週公布一次，只有在快取落後於應已公布的週、或週五/週六公布期間尚未取得本週資料時才重新抓取，
+    同一天只抓取一次；週一~週四通常直接使用快取
+
+    Returns:
+        pd.DataFrame: Columns [Date, TotalShareholders, BigHand400_Pct, BigHand1000_Pct]
+    """
+    today = today or datetime.now()
+    cached = store.load_frame('chips', stock_id)
+    last_checked = (store.load_cache('chips_checked') or {}).get(stock_id)
+    expected, pending = disclosure.chips_periods(today)
+
+    if not disclosure.needs_refresh(disclosure.chips_latest_period(cached), expected, pending, last_checked, today):
+        logger.info(f"{stock_id} 籌碼使用本地快取 (最新 {disclosure.chips_latest_period(cached)})")
+        return cached
+
+    df_new = _scrape_chips(stock_id)
+    if df_new is None:
+        # 抓取失敗：使用快取，下次再重試
+        return cached
+
+    frames = [df for df in (cached, df_new) if not df.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not df.empty:
+        df = df.drop_duplicates(subset=['Date'], keep='last').sort_values('Date').reset_index(drop=True)
+        store.save_frame('chips', stock_id, df)
+
+    today_str = today.strftime("%Y-%m-%d")
+    store.update_cache('chips_checked', lambda c: {**c, stock_id: today_str})
+    return df
+
+def _scrape_chips(stock_id):
     """
     從神秘金字塔抓取股權分散表
     URL: https://norway.twsthr.info/StockHolders.aspx?stock={stock_id}
     
     Returns:
         pd.DataFrame: Columns [Date, TotalShareholders, BigHand400_Pct, BigHand1000_Pct]
+            頁面中沒有股權分散表時為空的 DataFrame；請求失敗時回傳 None
     """
     url = f"https://norway.twsthr.info/StockHolders.aspx?stock={stock_id}"
     headers = {
@@ -20,10 +60,11 @@ def fetch_chips_data(stock_id):
     
     try:
         logging.info(f"Fetching chips data from {url}...")
-        resp = requests.get(url, headers=headers, timeout=10)
+        with _chips_slots:
+            resp = requests.get(url, headers=headers, timeout=10)
         if resp.status_code != 200:
             logger.error(f"Chips fetch failed: {resp.status_code}")
-            return pd.DataFrame()
+            return None
 
         # Parse Tables
         tables = pd.read_html(resp.text)
@@ -118,7 +159,7 @@ def fetch_chips_data(stock_id):
 
     except Exception as e:
         logger.error(f"Error fetching chips data: {e}")
-        return pd.DataFrame()
+        return None
 
 def analyze_chips_consecutive(df):
     """
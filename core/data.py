@@ -1,20 +1,109 @@
 import pandas as pd
-from FinMind.data import DataLoader
 from datetime import datetime, timedelta
-from config import FINMIND_API_TOKEN
+from core import store, disclosure
+from core.loader import finmind_call
+import threading
 import logging
 
 
 # 設定日誌
 logger = logging.getLogger(__name__)
 
-def fetch_stock_data(stock_id, days=180):
+# 股票基本資料索引 (process 內共用)
+_stock_info_index = None
+_stock_info_date = None
+_stock_info_lock = threading.Lock()
+
+def _download_daily(stock_id, start_date, end_date):
+    """
+    向 FinMind 下載指定區間的日線並標準化欄位型態 (失敗時直接拋出例外)
+    """
+    df = finmind_call(
+        'taiwan_stock_daily',
+        stock_id=stock_id,
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    return _normalize_daily(df)
+
+def _normalize_daily(df):
+    """
+    標準化 FinMind 日線欄位型態 (日期轉 datetime、數值欄位轉數字)
+    """
+    if df.empty:
+        return pd.DataFrame()
+        
+    # 重新命名欄位以符合習慣 (FinMind 欄位: date, open, max, min, close, Trading_Volume, ...)
+    # FinMind v1.5+ 回傳欄位通常是: date, stock_id, Trading_Volume, Trading_money, open, max, min, close, ...
+    # 注意：成交量單位通常是 '股'，我們可能需要轉成 '張' (除以 1000) 方便閱讀，但在這裡先保持原樣或僅做標準化
+    
+    # 確保日期格式正確
+    df['date'] = pd.to_datetime(df['date'])
+    
+    # 排序
+    df = df.sort_values('date')
+    
+    # 轉換數值型態 (有時候 API 會回傳字串)
+    cols_to_numeric = ['open', 'max', 'min', 'close', 'Trading_Volume']
+    for col in cols_to_numeric:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+            
+    return df
+
+def ingest_market_daily():
+    """
+    以「單一日期、全市場」查詢批次更新本地日線
+    每個交易日只需一次 API 呼叫，再分發到各股票的本地資料
+    
+    Returns:
+        bool: 成功回傳 True；失敗回傳 False (呼叫端應改用逐檔抓取)
+    """
+    try:
+        latest = store.latest_expected_trading_day()
+        sync = store.get_market_sync()
+        if sync is not None:
+            start = (pd.Timestamp(sync['checked']) + timedelta(days=1)).strftime("%Y-%m-%d")
+        else:
+            start = latest
+            
+        dates = [d.strftime("%Y-%m-%d") for d in pd.bdate_range(start, latest)]
+        if not dates:
+            logger.info("全市場日線已是最新，無需匯入")
+            return True
+            
+        for date_str in dates:
+            logger.info(f"批次匯入全市場日線: {date_str}")
+            df = _normalize_daily(finmind_call('taiwan_stock_daily', start_date=date_str, end_date=date_str))
+            
+            if df.empty:
+                if date_str == latest:
+                    # 最新一日可能尚未公布，下次再檢查
+                    logger.info(f"{date_str} 尚無全市場資料")
+                    break
+                # 平日但無資料 -> 休市
+                store.mark_market_checked(date_str)
+                continue
+                
+            written = store.save_market_day(df, date_str)
+            logger.info(f"{date_str} 已寫入 {written} 檔股票")
+            
+        return True
+        
+    except Exception as e:
+        logger.error(f"全市場批次匯入失敗: {e}")
+        return False
+
+def fetch_stock_data(stock_id, days=180, use_store=True):
     """
-    從 FinMind 抓取個股的日線資料 (股價與成交量)
+    取得個股的日線資料 (股價與成交量)
+    優先讀取本地資料庫，只向 FinMind 補抓缺少的日期區間
     
     Args:
         stock_id (str): 股票代碼，例如 '2330'
         days (int): 要抓取的天數，預設 180 天 (為了計算長天期 MA)
+        use_store (bool): 是否使用本地資料庫，False 時直接向 FinMind 抓完整區間
         
     Returns:
         pd.DataFrame: 包含 date, open, max, min, close, current_volume 等欄位
@@ -24,87 +113,162 @@ def fetch_stock_data(stock_id, days=180):
         end_date = datetime.now().strftime("%Y-%m-%d")
         start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
         
-        logger.info(f"開始抓取 {stock_id} 資料: {start_date} ~ {end_date}")
+        if not use_store:
+            logger.info(f"開始抓取 {stock_id} 資料: {start_date} ~ {end_date}")
+            df = _download_daily(stock_id, start_date, end_date)
+            if df.empty:
+                logger.warning(f"股票 {stock_id} 查無資料")
+            return df
         
-        dl = DataLoader()
-        # 如有 Token 則設定
-        if FINMIND_API_TOKEN:
-            dl.login_by_token(api_token=FINMIND_API_TOKEN)
-            
-        df = dl.taiwan_stock_daily(
-            stock_id=stock_id,
-            start_date=start_date,
-            end_date=end_date
-        )
+        for range_start, range_end in store.missing_ranges(stock_id, start_date, end_date):
+            logger.info(f"開始補抓 {stock_id} 資料: {range_start} ~ {range_end}")
+            try:
+                df_new = _download_daily(stock_id, range_start, range_end)
+            except Exception as e:
+                # API 失敗 (如額度用完) 時仍使用本地已有的資料
+                logger.error(f"補抓 {stock_id} 資料時發生錯誤，改用本地資料: {e}")
+                continue
+            store.save_bars(stock_id, df_new, covered_from=range_start,
+                            checked_through=min(range_end, store.latest_expected_trading_day()))
         
+        df = store.load_bars(stock_id, start_date, end_date)
         if df.empty:
             logger.warning(f"股票 {stock_id} 查無資料")
-            return pd.DataFrame()
-            
-        # 重新命名欄位以符合習慣 (FinMind 欄位: date, open, max, min, close, Trading_Volume, ...)
-        # FinMind v1.5+ 回傳欄位通常是: date, stock_id, Trading_Volume, Trading_money, open, max, min, close, ...
-        # 注意：成交量單位通常是 '股'，我們可能需要轉成 '張' (除以 1000) 方便閱讀，但在這裡先保持原樣或僅做標準化
-        
-        # 確保日期格式正確
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # 排序
-        df = df.sort_values('date')
-        
-        # 轉換數值型態 (有時候 API 會回傳字串)
-        cols_to_numeric = ['open', 'max', 'min', 'close', 'Trading_Volume']
-        for col in cols_to_numeric:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-                
         return df
 
     except Exception as e:
         logger.error(f"抓取 {stock_id} 資料時發生錯誤: {e}")
         return pd.DataFrame()
 
-def get_stock_name(stock_id):
+def _build_stock_info_index(df):
     """
-    從 FinMind 取得股票名稱
+    將 taiwan_stock_info 整理成 {stock_id: {name, industry, type}}
+    (同一檔股票可能因多個產業別出現多列，取第一列)
     """
-    try:
-        dl = DataLoader()
-        if FINMIND_API_TOKEN:
-            dl.login_by_token(api_token=FINMIND_API_TOKEN)
+    index = {}
+    for row in df.drop_duplicates(subset='stock_id').itertuples(index=False):
+        index[str(row.stock_id)] = {
+            'name': row.stock_name,
+            'industry': getattr(row, 'industry_category', None),
+            'type': getattr(row, 'type', None),
+        }
+    return index
+
+def get_stock_info_index():
+    """
+    取得股票基本資料索引 {stock_id: {'name', 'industry', 'type'}}
+    每個 process 只載入一次，並以本地快取保存 (每日更新一次)
+    
+    Returns:
+        dict: 股票基本資料索引，失敗時回傳空 dict
+    """
+    global _stock_info_index, _stock_info_date
+    
+    today = datetime.now().strftime("%Y-%m-%d")
+    with _stock_info_lock:
+        if _stock_info_index and _stock_info_date == today:
+            return _stock_info_index
             
-        # 取得個股基本資料
-        df = dl.taiwan_stock_info()
+        cached = store.load_cache('stock_info')
+        if cached and cached.get('date') == today:
+            index = cached['stocks']
+        else:
+            try:
+                df = finmind_call('taiwan_stock_info')
+                index = _build_stock_info_index(df) if not df.empty else {}
+                if index:
+                    store.save_cache('stock_info', {'date': today, 'stocks': index})
+            except Exception as e:
+                logger.error(f"無法取得股票基本資料: {e}")
+                index = {}
+                
+            if not index and cached:
+                # API 失敗時沿用過期的快取
+                logger.warning(f"沿用 {cached.get('date')} 的股票基本資料快取")
+                index = cached['stocks']
+                
+        if index:
+            _stock_info_index = index
+            _stock_info_date = today
+        return index
+
+def get_stock_name(stock_id):
+    """
+    取得股票名稱 (查詢本地股票基本資料索引)
+    """
+    info = get_stock_info_index().get(str(stock_id))
+    return info['name'] if info else None
+
+def get_stock_names(stock_ids):
+    """
+    批次取得股票名稱
+    
+    Args:
+        stock_ids (list): 股票代碼列表
         
-        if df.empty:
-            return None
-            
-        # 篩選特定股票
-        row = df[df['stock_id'] == stock_id]
-        if not row.empty:
-            return row.iloc[0]['stock_name']
-            
-        return None
+    Returns:
+        dict: {stock_id: stock_name}，查無名稱的股票不會出現在結果中
+    """
+    index = get_stock_info_index()
+    names = {}
+    for sid in stock_ids:
+        info = index.get(str(sid))
+        if info:
+            names[sid] = info['name']
+    return names
+
+def _fetch_fundamental(kind, stock_id, method, years, periods_func, latest_period_func, key_cols):
+    """
+    依公布時程快取基本面資料：只有在公布期間或快取落後時才向 FinMind 補抓
+
+    Args:
+        kind (str): 'revenue' 或 'financial'
+        method (str): DataLoader 方法名稱
+        periods_func (callable): 推算 (expected, pending) 期別的函式
+        latest_period_func (callable): 取得資料中最新期別的函式
+        key_cols (list): 合併新舊資料時用來去重的欄位
+    """
+    today = datetime.now()
+    start_date = (today - timedelta(days=years*365)).strftime("%Y-%m-%d")
+    
+    cached = store.load_frame(kind, stock_id)
+    last_checked = (store.load_cache('fundamentals_checked') or {}).get(kind, {}).get(stock_id)
+    expected, pending = periods_func(today)
+    
+    if not disclosure.needs_refresh(latest_period_func(cached), expected, pending, last_checked, today):
+        logger.info(f"{stock_id} {kind} 使用本地快取 (最新 {latest_period_func(cached)})")
+        return cached[cached['date'] >= start_date].reset_index(drop=True) if not cached.empty else cached
+        
+    # 已有快取時只補抓最後一期之後的資料
+    fetch_start = start_date if cached.empty else max(start_date, str(cached['date'].max()))
+    try:
+        df_new = finmind_call(method, stock_id=stock_id, start_date=fetch_start)
     except Exception as e:
-        logger.error(f"無法取得股票名稱 {stock_id}: {e}")
-        return None
+        logger.error(f"抓取 {kind} 失敗 {stock_id}，改用本地快取: {e}")
+        return cached[cached['date'] >= start_date].reset_index(drop=True) if not cached.empty else cached
+        
+    frames = [df for df in (cached, df_new) if not df.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not df.empty:
+        df = df.drop_duplicates(subset=key_cols, keep='last').sort_values('date').reset_index(drop=True)
+        store.save_frame(kind, stock_id, df)
+        
+    today_str = today.strftime("%Y-%m-%d")
+    store.update_cache('fundamentals_checked', lambda c: {**c, kind: {**c.get(kind, {}), stock_id: today_str}})
+    
+    return df[df['date'] >= start_date].reset_index(drop=True) if not df.empty else df
 
 def fetch_monthly_revenue(stock_id, years=3):
     """
     抓取月營收資料
+    (本地快取，只在每月 1~10 日公布期間或快取落後時向 FinMind 查詢)
     """
     try:
-        dl = DataLoader()
-        if FINMIND_API_TOKEN:
-            dl.login_by_token(api_token=FINMIND_API_TOKEN)
-            
-        start_date = (datetime.now() - timedelta(days=years*365)).strftime("%Y-%m-%d")
-        
-        df = dl.taiwan_stock_month_revenue(
-            stock_id=stock_id,
-            start_date=start_date
+        return _fetch_fundamental(
+            'revenue', stock_id, 'taiwan_stock_month_revenue', years,
+            disclosure.revenue_periods, disclosure.revenue_latest_period,
+            ['revenue_year', 'revenue_month']
         )
-        
-        return df
     except Exception as e:
         logger.error(f"抓取營收失敗 {stock_id}: {e}")
         return pd.DataFrame()
@@ -112,22 +276,14 @@ def fetch_monthly_revenue(stock_id, years=3):
 def fetch_financial_statements(stock_id, years=3):
     """
     抓取季財報資料
+    (本地快取，只在季報公布期間或快取落後時向 FinMind 查詢)
     """
     try:
-        dl = DataLoader()
-        if FINMIND_API_TOKEN:
-            dl.login_by_token(api_token=FINMIND_API_TOKEN)
-            
-        start_date = (datetime.now() - timedelta(days=years*365)).strftime("%Y-%m-%d")
-        
-        df = dl.taiwan_stock_financial_statement(
-            stock_id=stock_id,
-            start_date=start_date
+        return _fetch_fundamental(
+            'financial', stock_id, 'taiwan_stock_financial_statement', years,
+            disclosure.financial_periods, disclosure.financial_latest_period,
+            ['date', 'type']
         )
-        
-        return df
     except Exception as e:
         logger.error(f"抓取財報失敗 {stock_id}: {e}")
         return pd.DataFrame()
-
-
@@ -0,0 +1,155 @@
+import pandas as pd
+import logging
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# 月營收：上市櫃公司須於每月 10 日前公布上月營收
+REVENUE_DEADLINE_DAY = 10
+
+# 季報公布期限 (一般產業)：Q1 5/15、Q2 8/14、Q3 11/14、年報 (Q4) 隔年 3/31
+# {quarter: (期限月, 期限日)}，Q4 的期限在隔年
+QUARTER_DEADLINES = {1: (5, 15), 2: (8, 14), 3: (11, 14), 4: (3, 31)}
+
+
+def _to_date(today):
+    if today is None:
+        return date.today()
+    return today.date() if hasattr(today, 'date') else today
+
+
+def revenue_periods(today=None):
+    """
+    依公布時程推算月營收的期別
+
+    Returns:
+        tuple: (expected, pending)
+            expected: 依法應已公布的最新月份 "YYYY-MM"
+            pending: 目前公布期間中 (每月 1~10 日) 可能隨時公布的月份，不在公布期間時為 None
+    """
+    today = _to_date(today)
+    first = pd.Timestamp(today.year, today.month, 1)
+    prev_month = (first - pd.DateOffset(months=1)).strftime("%Y-%m")
+    prev_prev_month = (first - pd.DateOffset(months=2)).strftime("%Y-%m")
+
+    if today.day <= REVENUE_DEADLINE_DAY:
+        return prev_prev_month, prev_month
+    return prev_month, None
+
+
+def financial_periods(today=None):
+    """
+    依季報公布期限推算季報的期別
+
+    Returns:
+        tuple: (expected, pending)
+            expected: 公布期限已過的最新季度 "YYYY-Qn"
+            pending: 目前正處於公布期間 (季末隔月 1 日 ~ 期限) 的季度，不在公布期間時為 None
+    """
+    today = _to_date(today)
+    expected = None
+    pending = None
+
+    for year in (today.year - 2, today.year - 1, today.year):
+        for quarter in (1, 2, 3, 4):
+            quarter_end = pd.Timestamp(year, quarter * 3, 1) + pd.offsets.MonthEnd(0)
+            window_start = (quarter_end + pd.Timedelta(days=1)).date()
+            d_month, d_day = QUARTER_DEADLINES[quarter]
+            deadline = date(year + 1 if quarter == 4 else year, d_month, d_day)
+
+            period = f"{year}-Q{quarter}"
+            if deadline < today:
+                expected = period
+            elif window_start <= today:
+                pending = period
+
+    return expected, pending
+
+
+def revenue_latest_period(df_revenue):
+    """
+    取得月營收資料中最新的月份 "YYYY-MM"，無資料時回傳 None
+    """
+    if df_revenue is None or df_revenue.empty:
+        return None
+    ym = df_revenue['revenue_year'].astype(int) * 100 + df_revenue['revenue_month'].astype(int)
+    latest = int(ym.max())
+    return f"{latest // 100}-{str(latest % 100).zfill(2)}"
+
+
+def financial_latest_period(df_fin):
+    """
+    取得季財報資料中最新的季度 "YYYY-Qn"，無資料時回傳 None
+    """
+    if df_fin is None or df_fin.empty:
+        return None
+    last_dt = pd.to_datetime(df_fin['date']).max()
+    return f"{last_dt.year}-Q{(last_dt.month - 1) // 3 + 1}"
+
+
+def needs_refresh(latest_period, expected, pending, last_checked=None, today=None):
+    """
+    判斷本地快取是否需要重新向 FinMind 查詢
+
+    - 同一天已查詢過：不再查詢
+    - 快取落後於「應已公布」的期別：查詢 (可能是先前抓取失敗或公司延遲公布)
+    - 正處於公布期間且尚未取得該期：查詢
+    - 其餘情況 (公布期間外且資料已是最新)：不查詢
+
+    Args:
+        latest_period (str): 快取中最新的期別，無快取時為 None
+        expected (str): 應已公布的最新期別
+        pending (str): 公布期間中的期別 (或 None)
+        last_checked (str): 上次查詢日期 "YYYY-MM-DD"
+        today: 今天 (date/datetime)，預設為系統日期
+
+    Returns:
+        bool: 是否需要查詢
+    """
+    today_str = _to_date(today).strftime("%Y-%m-%d")
+    if last_checked == today_str:
+        return False
+    if latest_period is None:
+        # 從未查詢過 -> 查詢；查過但沒有資料 (如 ETF) -> 只在公布期間重試
+        return last_checked is None or pending is not None
+    if expected and latest_period < expected:
+        return True
+    if pending and latest_period < pending:
+        return True
+    return False
+
+
+def chips_week(date_str):
+    """
+    集保股權分散表資料日期所屬的週 "YYYY-Www" (ISO 週)
+    遇到週五休市時資料日期會提前，以週為單位比較才不會誤判為落後
+    """
+    return pd.Timestamp(str(date_str)).strftime("%G-W%V")
+
+
+def chips_periods(today=None):
+    """
+    依集保每週公布時程推算股權分散表的期別 (每週最後一個交易日的資料，於週五收盤後公布)
+
+    Returns:
+        tuple: (expected, pending)
+            expected: 應已公布的最新一週 "YYYY-Www"
+            pending: 週五、週六可能隨時公布的本週，其餘日子為 None
+    """
+    today = pd.Timestamp(_to_date(today))
+    this_week = chips_week(today)
+    last_week = chips_week(today - pd.Timedelta(days=7))
+    if today.weekday() == 6:
+        return this_week, None
+    if today.weekday() >= 4:
+        return last_week, this_week
+    return last_week, None
+
+
+def chips_latest_period(df_chips):
+    """
+    取得股權分散表中最新資料日期所屬的週，無資料時回傳 None
+    """
+    if df_chips is None or df_chips.empty:
+        return None
+    return chips_week(df_chips['Date'].max())
@@ -0,0 +1,219 @@
+import threading
+import time
+import logging
+from config import EPS_JOB_MAX_ATTEMPTS, EPS_JOB_LEASE_MINUTES
+from core import store
+from core import ai
+from core.notifier import send_line_notification
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# EPS 預估背景工作佇列 (EPS_FORECAST_MODE=background，需持久的 DATA_STORE_DIR)：每日報告不等待 Gemini，先使用快取 (或前一次) 的預估，
+# 需要更新的股票排入佇列 (保存在 store JSON 快取，重啟後仍會繼續處理)，
+# 由背景執行緒 (或排程呼叫 /process_eps_jobs) 合併搜尋，完成後另外以 LINE 推播新的預估。
+# 處理前先在快取中把工作認領為 running (附租約時間)，同時執行的背景執行緒與排程不會重複搜尋、重複推播。
+
+EPS_JOBS_NAME = "eps_jobs"
+
+# 已完成 / 失敗的工作保留天數 (之後從佇列移除)
+JOB_RETENTION_DAYS = 7
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _claimable(job, now):
+    """
+    待處理，或處理中但租約已過期 (處理的 process 停住或被終止)
+    """
+    return job["status"] == "pending" or (job["status"] == "running" and job.get("lease_until", 0) <= now)
+
+
+def _prune(jobs, now):
+    cutoff = now - JOB_RETENTION_DAYS * 86400
+    return {key: job for key, job in jobs.items()
+            if job["status"] in ("pending", "running") or job.get("finished_at", now) >= cutoff}
+
+
+def enqueue(stock_id, stock_name, period):
+    """
+    加入待搜尋佇列 (同一檔股票同一期間只會有一個待處理 / 處理中的工作)
+
+    Returns:
+        bool: 是否為新加入的工作
+    """
+    key = ai._cache_key(stock_id, period)
+    added = []
+
+    def update(jobs):
+        if jobs.get(key, {}).get("status") in ("pending", "running"):
+            return jobs
+        added.append(key)
+        now = time.time()
+        job = {"stock_id": stock_id, "stock_name": stock_name, "period": period,
+               "status": "pending", "attempts": 0, "enqueued_at": now}
+        return {**_prune(jobs, now), key: job}
+
+    store.update_cache(EPS_JOBS_NAME, update)
+    if added:
+        logger.info(f"EPS 預估排入背景佇列: {key}")
+    return bool(added)
+
+
+def pending_jobs():
+    """
+    可認領的工作 (待處理，或租約已過期的處理中工作)
+
+    Returns:
+        list: [(key, job), ...] 依加入順序
+    """
+    jobs = store.load_cache(EPS_JOBS_NAME) or {}
+    now = time.time()
+    pending = [(key, job) for key, job in jobs.items() if _claimable(job, now)]
+    return sorted(pending, key=lambda item: item[1]["enqueued_at"])
+
+
+def _claim_jobs():
+    """
+    在同一次快取更新中把所有可認領的工作標記為 running 並設定租約
+
+    Returns:
+        list: 本次認領的 [(key, job), ...] 依加入順序
+    """
+    claimed = []
+
+    def update(jobs):
+        now = time.time()
+        lease_until = now + EPS_JOB_LEASE_MINUTES * 60
+        jobs = dict(jobs)
+        for key, job in jobs.items():
+            if _claimable(job, now):
+                jobs[key] = {**job, "status": "running", "lease_until": lease_until}
+                claimed.append((key, jobs[key]))
+        return jobs
+
+    store.update_cache(EPS_JOBS_NAME, update)
+    return sorted(claimed, key=lambda item: item[1]["enqueued_at"])
+
+
+def forecast_for_report(stock_id, stock_name, period):
+    """
+    報告用的 EPS 預估 (不等待 Gemini)
+
+    - 該期間的快取仍新鮮：直接使用
+    - 否則排入背景佇列，報告先使用前一次的預估 (加註說明)，沒有任何快取時顯示搜尋中
+    """
+    cached = ai.get_cached_forecast(stock_id, period)
+    if cached and cached["fresh"]:
+        return cached["text"]
+    enqueue(stock_id, stock_name, period)
+    if cached:
+        label = f" ({cached['period']})" if cached["period"] and cached["period"] != period else ""
+        return f"[先前的法人預估{label}，更新後另行推播]\n{cached['text']}"
+    return "法人 EPS 預估搜尋中，完成後另行推播"
+
+
+def format_forecast_update(done):
+    """
+    將完成的預估整理成推播訊息
+
+    Args:
+        done (list): [(job, text), ...]
+    """
+    sections = []
+    for job, text in done:
+        title = f"{job['stock_id']} {job['stock_name']}" if job.get("stock_name") else job["stock_id"]
+        period = f" ({job['period']} 營收)" if job.get("period") else ""
+        sections.append(f"【{title}】{period}\n{text}")
+    return "【法人 EPS 預估更新】\n\n" + "\n\n".join(sections)
+
+
+def process_jobs(batch_size=None, notify=True):
+    """
+    認領並處理佇列中所有待搜尋的工作 (合併搜尋，見 ai.search_eps_forecasts)
+
+    成功的工作標記為 done；失敗時累計次數，達 EPS_JOB_MAX_ATTEMPTS 次標記為 failed，否則放回待處理。
+    其他 process / 執行緒已認領 (租約未過期) 的工作不會重複處理。
+
+    Args:
+        batch_size (int): 每次合併搜尋的股票數，預設為 GEMINI_BATCH_SIZE
+        notify (bool): 有新的預估時以 LINE 推播
+
+    Returns:
+        list: 成功的 [(job, text), ...]
+    """
+    jobs = _claim_jobs()
+    if not jobs:
+        return []
+    logger.info(f"處理 EPS 預估背景工作: {len(jobs)} 檔")
+    stocks = [(job["stock_id"], job["stock_name"], job["period"]) for _, job in jobs]
+    # 一律重新搜尋：排入佇列的是快取已過期的股票，若走 stale 快取會把舊的預估當成新結果推播
+    results = ai.search_eps_forecasts(stocks, force=True, batch_size=batch_size, with_status=True)
+
+    now = time.time()
+    owned = set()
+
+    def update(current):
+        current = dict(current)
+        owned.clear()
+        for (key, job), (_, ok) in zip(jobs, results):
+            latest = current.get(key)
+            if latest is not None and latest.get("lease_until") != job["lease_until"]:
+                # 租約過期後已被其他 process 重新認領：交給對方更新
+                continue
+            owned.add(key)
+            job = dict(latest or job)
+            job.pop("lease_until", None)
+            if ok:
+                job.update(status="done", finished_at=now)
+            else:
+                job["attempts"] += 1
+                if job["attempts"] >= EPS_JOB_MAX_ATTEMPTS:
+                    job.update(status="failed", finished_at=now)
+                    logger.error(f"EPS 預估背景工作失敗 {EPS_JOB_MAX_ATTEMPTS} 次，放棄: {key}")
+                else:
+                    job["status"] = "pending"
+            current[key] = job
+        return _prune(current, now)
+
+    store.update_cache(EPS_JOBS_NAME, update)
+    # 只推播仍由自己持有的工作 (已被重新認領的由對方推播)
+    done = [(job, text) for (key, job), (text, ok) in zip(jobs, results) if ok and key in owned]
+    logger.info(f"EPS 預估背景工作完成: 成功 {len(done)} 檔，失敗 {len(jobs) - len(done)} 檔")
+    if notify and done:
+        send_line_notification(format_forecast_update(done))
+    return done
+
+
+def _run_worker(notify):
+    while True:
+        try:
+            done = process_jobs(notify=notify)
+        except Exception as e:
+            logger.error(f"EPS 預估背景工作發生錯誤: {e}")
+            return
+        # 佇列清空，或這一輪全部失敗 (等下一次啟動再重試，避免不斷重試)
+        if not done or not pending_jobs():
+            return
+
+
+def start_worker(notify=True):
+    """
+    啟動背景執行緒處理佇列 (已在執行時不重複啟動)
+
+    Cloud Run 在回應送出後會限制 CPU (未設定 CPU always allocated 時)，此執行緒可能停住；
+    此時以排程呼叫 /process_eps_jobs 處理為準 (停住的執行緒認領的工作在租約過期後會再被認領)
+
+    Returns:
+        bool: 是否啟動了新的執行緒
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return False
+        if not pending_jobs():
+            return False
+        _worker = threading.Thread(target=_run_worker, args=(notify,), name="eps-jobs", daemon=True)
+        _worker.start()
+        return True
@@ -0,0 +1,329 @@
+import numpy as np
+import pandas as pd
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import ANALYSIS_WORKERS
+from core import store
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 基本面批次引擎：把整份清單 (或全市場) 的長表格式資料一次排序、分組，
+# 所有股票的指標以陣列運算同時算出，只有最後的結果格式化才逐檔進行。
+
+# 月營收 N 個月新高的視窗 (由長到短，含當月)
+REVENUE_HIGH_WINDOWS = (12, 6, 3)
+
+
+def _group_bounds(codes):
+    """
+    已依股票排序的代碼陣列 -> 每組的起點與終點 (含)
+    """
+    new_group = np.ones(len(codes), dtype=bool)
+    new_group[1:] = codes[1:] != codes[:-1]
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(codes)) - 1
+    return starts, ends
+
+
+def _pct_change(current, base):
+    """
+    成長率 (%)，基期不存在或 <= 0 時為 0 (與逐檔分析相同)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = (current - base) / base * 100
+    return np.where(base > 0, pct, 0.0)
+
+
+def _ym_str(year, month):
+    return f"{year}-{str(month).zfill(2)}"
+
+
+def revenue_table(df_revenue, last_processed=None, only_new=True):
+    """
+    一次分析多檔股票的月營收 (MoM / YoY / 歷史新高 / 近 3、6、12 個月新高)
+
+    每檔股票的結果與 strategy.analyze_revenue 相同：以最後一筆 (依 date) 為當月，
+    YoY 以「去年同月」的資料比較 (不依賴資料連續)，N 個月新高為當月是否為最後 N 筆中的最高。
+
+    Args:
+        df_revenue (pd.DataFrame): 長表格式 (stock_id, date, revenue_year, revenue_month, revenue)
+        last_processed (dict/str): 各股票上次處理的月份 {stock_id: "YYYY-MM"}，
+                                   字串表示所有股票相同，None 表示全部視為新資料
+        only_new (bool): 只回傳有新營收的股票
+
+    Returns:
+        pd.DataFrame: 每檔股票一列，欄位 stock_id, year, month, revenue, mom_pct, yoy_pct,
+                      all_time_high, high_12m, high_6m, high_3m, high_status, date_str, is_new
+    """
+    columns = ['stock_id', 'year', 'month', 'revenue', 'mom_pct', 'yoy_pct', 'all_time_high'] + \
+              [f"high_{w}m" for w in REVENUE_HIGH_WINDOWS] + ['high_status', 'date_str', 'is_new']
+    if df_revenue is None or df_revenue.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = df_revenue.sort_values(['stock_id', 'date'], kind='stable')
+    stock_ids = df['stock_id'].astype(str).to_numpy()
+    years = df['revenue_year'].to_numpy()
+    months = df['revenue_month'].to_numpy()
+    revenue = df['revenue'].to_numpy(dtype=float)
+    starts, ends = _group_bounds(stock_ids)
+    sizes = ends - starts + 1
+    current = revenue[ends]
+
+    # 1. MoM：前一筆
+    prev = np.where(sizes >= 2, revenue[np.maximum(ends - 1, 0)], np.nan)
+    mom_pct = _pct_change(current, prev)
+
+    # 2. YoY：(股票, 年月) 排序後以 searchsorted 找去年同月的第一筆
+    codes = np.repeat(np.arange(len(starts)), sizes)
+    ym = years.astype(np.int64) * 12 + months.astype(np.int64)
+    order = np.lexsort((ym, codes))
+    keys = codes[order] * (ym.max() + 13) + ym[order]
+    targets = np.arange(len(starts)) * (ym.max() + 13) + ym[ends] - 12
+    found = np.minimum(np.searchsorted(keys, targets), len(keys) - 1)
+    last_year = np.where(keys[found] == targets, revenue[order][found], np.nan)
+    yoy_pct = _pct_change(current, last_year)
+
+    # 3. 歷史新高 (NaN 略過，與 Series.max 相同)
+    all_time_high = current >= np.fmax.reduceat(revenue, starts)
+
+    # 4. 近 N 個月新高：每檔取最後 N 筆 (N <= 12，直接以索引取出)
+    highs = {}
+    for w in REVENUE_HIGH_WINDOWS:
+        idx = ends[:, None] - np.arange(w)
+        window = np.where(idx >= starts[:, None], revenue[np.maximum(idx, 0)], np.nan)
+        highs[w] = (sizes >= w) & (current >= np.nanmax(window, axis=1))
+
+    high_status = np.full(len(starts), "", dtype=object)
+    for w in REVENUE_HIGH_WINDOWS[::-1]:
+        high_status = np.where(highs[w], f"近 {w} 個月新高", high_status)
+    high_status = np.where(all_time_high, "歷史新高", high_status)
+
+    last_years, last_months = years[ends], months[ends]
+    date_str = [_ym_str(y, m) for y, m in zip(last_years, last_months)]
+    sids = stock_ids[ends]
+    if isinstance(last_processed, dict):
+        processed = [last_processed.get(sid) for sid in sids]
+    else:
+        processed = [last_processed] * len(sids)
+    is_new = np.array([not p or d > p for d, p in zip(date_str, processed)], dtype=bool)
+
+    result = pd.DataFrame({
+        'stock_id': sids,
+        'year': last_years,
+        'month': last_months,
+        'revenue': current,
+        'mom_pct': mom_pct,
+        'yoy_pct': yoy_pct,
+        'all_time_high': all_time_high,
+        **{f"high_{w}m": highs[w] for w in REVENUE_HIGH_WINDOWS},
+        'high_status': high_status,
+        'date_str': date_str,
+        'is_new': is_new,
+    })
+    if only_new:
+        result = result[result['is_new']]
+    return result[columns].reset_index(drop=True)
+
+
+def revenue_result(row):
+    """
+    revenue_table 的一列 -> 與 strategy.analyze_revenue 相同格式的 dict
+    """
+    return {
+        "year": row['year'],
+        "month": row['month'],
+        "revenue": row['revenue'],
+        "mom_pct": float(row['mom_pct']),
+        "yoy_pct": float(row['yoy_pct']),
+        "high_status": row['high_status'],
+        "is_new": True,
+        "date_str": row['date_str'],
+    }
+
+
+def load_revenue_table(stock_ids=None, workers=None):
+    """
+    從本地月營收快取 (fetch_monthly_revenue 保存的資料) 讀取多檔股票，合併為長表格式
+
+    Args:
+        stock_ids (list): None 表示本地有營收快取的所有股票
+    """
+    stock_ids = stock_ids if stock_ids is not None else store.list_frames('revenue')
+
+    def read(sid):
+        df = store.load_frame('revenue', sid)
+        return df.assign(stock_id=str(sid)) if not df.empty else df
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or ANALYSIS_WORKERS)) as executor:
+        frames = [df for df in executor.map(read, stock_ids) if not df.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def scan_revenue_highs(stock_ids=None, min_window=3, month=None, df_revenue=None):
+    """
+    營收新高掃描 (每月 10 日營收公布後，對全市場或指定股票執行)
+
+    Args:
+        stock_ids (list): 指定股票，None 表示本地營收快取中的所有股票
+        min_window (int): 至少為近幾個月新高才列入 (3 / 6 / 12)，歷史新高一律列入
+        month (str): 只列入最新營收為此月份 ("YYYY-MM") 的股票，None 表示全部股票中最新的月份
+        df_revenue (pd.DataFrame): 已讀取的長表格式營收，None 時從本地快取讀取
+
+    Returns:
+        pd.DataFrame: revenue_table 的欄位，依 歷史新高 > 新高月數 > YoY 排序
+    """
+    if min_window not in REVENUE_HIGH_WINDOWS:
+        raise ValueError(f"不支援的新高月數: {min_window}")
+    if df_revenue is None:
+        df_revenue = load_revenue_table(stock_ids)
+    table = revenue_table(df_revenue, only_new=False)
+    if table.empty:
+        return table
+
+    month = month or table['date_str'].max()
+    high_months = np.select(
+        [table['all_time_high']] + [table[f"high_{w}m"] for w in REVENUE_HIGH_WINDOWS],
+        [np.inf] + list(REVENUE_HIGH_WINDOWS), 0
+    )
+    hits = table.assign(_months=high_months)
+    hits = hits[(hits['date_str'] == month) & (hits['_months'] >= min_window)]
+    logger.info(f"{month} 營收新高: {len(hits)} 檔 (共 {len(table)} 檔)")
+    hits = hits.sort_values(['_months', 'yoy_pct'], ascending=False, kind='stable')
+    return hits.drop(columns='_months').reset_index(drop=True)
+
+
+# 季財報使用的科目 (FinMind taiwan_stock_financial_statement 的 type，數值為單季)
+FINANCIAL_METRICS = ('Revenue', 'GrossProfit', 'OperatingIncome', 'IncomeAfterTaxes', 'EPS')
+
+
+def _quarter_index(dates):
+    """
+    日期 -> 會計季度序號 (year * 4 + quarter - 1)
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    return dates.year.to_numpy(dtype=np.int64) * 4 + (dates.month.to_numpy(dtype=np.int64) - 1) // 3
+
+
+def _margins(values):
+    """
+    (…, 科目) 陣列 -> 毛利率、營益率、淨利率 (%)，營收 <= 0 或缺值時為 0
+    """
+    revenue = values[..., 0]
+    ok = revenue > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return [np.where(ok, np.nan_to_num(values[..., k]) / revenue * 100, 0.0) for k in (1, 2, 3)]
+
+
+def financial_table(df_fin, last_processed=None, only_new=True):
+    """
+    一次分析多檔股票的季財報 (毛利率/營益率/淨利率、QoQ/YoY、單季與累計 EPS)
+
+    長表格式只做一次分組，建立 (股票 × 季度 × 科目) 的陣列 (以會計季度為索引)，
+    上一季 / 去年同季直接以季度序號 -1 / -4 取值，累計 EPS 以季度累加和相減，
+    因此缺季時不會錯位 (缺少的比較期視為不存在，成長率為 0)。
+
+    Args:
+        df_fin (pd.DataFrame): 長表格式 (stock_id, date, type, value)
+        last_processed (dict/str): 各股票上次處理的季度 {stock_id: "YYYY-Qn"}，
+                                   字串表示所有股票相同，None 表示全部視為新資料
+        only_new (bool): 只回傳有新財報的股票
+
+    Returns:
+        pd.DataFrame: 每檔股票一列，欄位 stock_id, quarter_str, is_new 及 strategy.analyze_financials 的各項指標
+    """
+    columns = ['stock_id', 'quarter_str', 'gm', 'om', 'nm', 'gm_qoq', 'om_qoq', 'nm_qoq',
+               'gm_yoy', 'om_yoy', 'nm_yoy', 'eps', 'eps_qoq', 'eps_yoy',
+               'eps_ytd', 'eps_ytd_last_year', 'eps_ytd_growth', 'is_new']
+    if df_fin is None or df_fin.empty:
+        return pd.DataFrame(columns=columns)
+
+    stock_codes, stock_ids = pd.factorize(df_fin['stock_id'].astype(str), sort=True)
+    quarters = _quarter_index(df_fin['date'])
+    first_q = int(quarters.min())
+    n_stocks, n_periods = len(stock_ids), int(quarters.max()) - first_q + 1
+    period = quarters - first_q
+
+    # 有任何科目的季度視為「有財報」(與 pivot 後的列相同)
+    present = np.zeros((n_stocks, n_periods), dtype=bool)
+    present[stock_codes, period] = True
+    last = np.full(n_stocks, -1)
+    np.maximum.at(last, stock_codes, period)
+
+    # 同一季同一科目有多筆時，取日期最晚的一天中的第一筆
+    df = pd.DataFrame({
+        's': stock_codes, 'p': period, 'date': pd.to_datetime(df_fin['date']).to_numpy(),
+        'type': df_fin['type'].to_numpy(), 'value': pd.to_numeric(df_fin['value'], errors='coerce').to_numpy(),
+    })
+    df = df[df['type'].isin(FINANCIAL_METRICS)]
+    df = df.drop_duplicates(subset=['s', 'date', 'type'], keep='first')
+    df = df.sort_values('date', kind='stable').drop_duplicates(subset=['s', 'p', 'type'], keep='last')
+    values = np.full((n_stocks, n_periods, len(FINANCIAL_METRICS)), np.nan)
+    metric_pos = {name: k for k, name in enumerate(FINANCIAL_METRICS)}
+    values[df['s'].to_numpy(), df['p'].to_numpy(), df['type'].map(metric_pos).to_numpy()] = df['value'].to_numpy()
+
+    rows = np.arange(n_stocks)
+
+    def at(offset):
+        """
+        比較期的 (是否存在, 科目值)，超出資料範圍視為不存在
+        """
+        p = last - offset
+        exists = (p >= 0) & present[rows, np.maximum(p, 0)]
+        return exists, values[rows, np.maximum(p, 0)]
+
+    current = values[rows, last]
+    margins = _margins(current)
+    eps = np.nan_to_num(current[:, metric_pos['EPS']])
+
+    result = {'stock_id': np.asarray(stock_ids)}
+    for label, offset in (('qoq', 1), ('yoy', 4)):
+        exists, prev = at(offset)
+        for name, now, before in zip(('gm', 'om', 'nm'), margins, _margins(prev)):
+            result[f"{name}_{label}"] = np.where(exists, now - before, 0.0)
+        result[f"eps_{label}"] = np.where(exists, _pct_change(eps, np.nan_to_num(prev[:, metric_pos['EPS']])), 0.0)
+    result.update(gm=margins[0], om=margins[1], nm=margins[2], eps=eps)
+
+    # 累計 EPS：今年 Q1 ~ 本季，與去年 Q1 ~ 同一季
+    eps_cum = np.concatenate((np.zeros((n_stocks, 1)), np.cumsum(np.nan_to_num(values[:, :, metric_pos['EPS']]), axis=1)), axis=1)
+    abs_last = last + first_q
+    year_start = abs_last - abs_last % 4 - first_q
+
+    def period_sum(begin, end):
+        """
+        第 begin ~ end 季 (含，相對於 first_q) 的 EPS 合計
+        """
+        begin = np.clip(begin, 0, n_periods)
+        end = np.clip(end + 1, 0, n_periods)
+        return eps_cum[rows, np.maximum(end, begin)] - eps_cum[rows, begin]
+
+    eps_ytd = period_sum(year_start, last)
+    eps_ytd_last_year = period_sum(year_start - 4, last - 4)
+    result.update(
+        eps_ytd=eps_ytd,
+        eps_ytd_last_year=eps_ytd_last_year,
+        eps_ytd_growth=_pct_change(eps_ytd, eps_ytd_last_year),
+    )
+
+    quarter_str = [f"{q // 4}-Q{q % 4 + 1}" for q in abs_last]
+    if isinstance(last_processed, dict):
+        processed = [last_processed.get(sid) for sid in result['stock_id']]
+    else:
+        processed = [last_processed] * n_stocks
+    result['quarter_str'] = quarter_str
+    result['is_new'] = np.array([not p or q > p for q, p in zip(quarter_str, processed)], dtype=bool)
+
+    table = pd.DataFrame(result)
+    if only_new:
+        table = table[table['is_new']]
+    return table[columns].reset_index(drop=True)
+
+
+def financial_result(row):
+    """
+    financial_table 的一列 -> 與 strategy.analyze_financials 相同格式的 dict
+    """
+    res = {key: float(row[key]) for key in ('gm', 'om', 'nm', 'gm_qoq', 'om_qoq', 'nm_qoq', 'gm_yoy', 'om_yoy',
+                                             'nm_yoy', 'eps', 'eps_qoq', 'eps_yoy', 'eps_ytd', 'eps_ytd_last_year',
+                                             'eps_ytd_growth')}
+    return {"quarter_str": row['quarter_str'], **res, "is_new": True}
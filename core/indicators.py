@@ -0,0 +1,90 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 技術指標核心 (純 NumPy)
+# 所有函式都沿最後一軸 (時間) 計算，可直接套用在 1-D (單一股票) 或 2-D (股票 × 日期) 陣列。
+# 前 n-1 根、或視窗內含 NaN 時結果為 NaN (與 pandas rolling(n, min_periods=n) 相同)。
+
+
+def sma(values, n):
+    """
+    簡單移動平均 (以累加和計算，O(N) 與 n 無關)
+
+    Args:
+        values (np.ndarray): 價格陣列
+        n (int): 天數
+
+    Returns:
+        np.ndarray: 與輸入同形狀的 float 陣列
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < n:
+        return out
+
+    invalid = ~np.isfinite(values)
+    pad = np.zeros(values.shape[:-1] + (1,))
+    csum = np.concatenate([pad, np.cumsum(np.where(invalid, 0.0, values), axis=-1)], axis=-1)
+    cbad = np.concatenate([pad, np.cumsum(invalid, axis=-1)], axis=-1)
+
+    window_sum = csum[..., n:] - csum[..., :-n]
+    window_bad = cbad[..., n:] - cbad[..., :-n]
+    out[..., n - 1:] = np.where(window_bad > 0, np.nan, window_sum / n)
+    return out
+
+
+def rolling_max(values, n):
+    """
+    n 日滾動最高值
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < n:
+        return out
+    out[..., n - 1:] = np.lib.stride_tricks.sliding_window_view(values, n, axis=-1).max(axis=-1)
+    return out
+
+
+def rolling_min(values, n):
+    """
+    n 日滾動最低值
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < n:
+        return out
+    out[..., n - 1:] = np.lib.stride_tricks.sliding_window_view(values, n, axis=-1).min(axis=-1)
+    return out
+
+
+def stochastic(high, low, close, n=9, d_n=3):
+    """
+    KD 指標 (Stochastic Oscillator)
+    K = 100 * (收盤 - n日最低) / (n日最高 - n日最低)，D = K 的 d_n 日平均
+
+    Returns:
+        tuple: (K, D)
+    """
+    lowest = rolling_min(low, n)
+    highest = rolling_max(high, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = 100 * (np.asarray(close, dtype=float) - lowest) / (highest - lowest)
+    d = sma(k, d_n)
+    return k, d
+
+
+def compute_indicators(high, low, close, ma_windows=(5, 20, 60), kd_n=9, kd_d_n=3):
+    """
+    一次計算 MA 與 KD
+
+    Args:
+        high, low, close (np.ndarray): 1-D 或 2-D (股票 × 日期) 陣列
+
+    Returns:
+        dict: {'MA5': arr, 'MA20': arr, 'MA60': arr, 'K': arr, 'D': arr}
+    """
+    result = {f"MA{n}": sma(close, n) for n in ma_windows}
+    result['K'], result['D'] = stochastic(high, low, close, kd_n, kd_d_n)
+    return result
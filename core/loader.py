@@ -0,0 +1,162 @@
+import re
+import queue
+import threading
+import time
+import logging
+from FinMind.data import DataLoader
+from config import FINMIND_API_TOKEN, FINMIND_POOL_SIZE
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+
+# FinMind 回應中表示 Token 失效 / 未授權的狀態碼與訊息
+# (登入失敗時例外訊息為 "<Response [401]>"，資料 API 則為 "FinMind API unexpected response: <msg>")
+AUTH_STATUS_CODES = (401, 403)
+_AUTH_ERROR_PATTERN = re.compile(
+    r"\b(401|403)\b|unauthorized|forbidden|invalid token|token (is )?invalid|token (has )?expired|expired token"
+)
+
+
+def _is_auth_error(e):
+    """
+    判斷是否為 Token 失效 / 未授權的錯誤 (需要重新登入)
+    優先以 HTTP 狀態碼判斷，沒有 response 時只比對明確的授權錯誤訊息
+    (不以 "token" 字樣判斷，避免額度用完、JSON 解析錯誤等也觸發重新登入並多用一次額度)
+    """
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is not None:
+        return status in AUTH_STATUS_CODES
+    return _AUTH_ERROR_PATTERN.search(str(e).lower()) is not None
+
+
+class LoaderPool:
+    """
+    共用的 FinMind DataLoader 池
+
+    - 每個 DataLoader 內含 requests.Session，重複使用可保持 HTTP keep-alive
+    - 第一次借出時才登入 (每個 DataLoader 只登入一次)
+    - Token 失效時丟棄該 DataLoader，重新建立並登入後重試一次
+    - 同時借出的數量受 max_size 限制，可安全地在多執行緒下使用
+    """
+
+    def __init__(self, token=None, max_size=4):
+        self._token = token
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def _record(self, name, start, error=False):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            s = self._stats.setdefault(name, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            s["count"] += 1
+            s["total_ms"] += elapsed_ms
+            s["max_ms"] = max(s["max_ms"], elapsed_ms)
+            if error:
+                s["errors"] += 1
+
+    def _create(self):
+        dl = DataLoader()
+        if self._token:
+            start = time.perf_counter()
+            try:
+                dl.login_by_token(api_token=self._token)
+            except Exception:
+                self._record("login", start, error=True)
+                raise
+            self._record("login", start)
+        return dl
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._create()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, dl):
+        self._idle.put(dl)
+        self._slots.release()
+
+    def _discard(self, dl):
+        self._slots.release()
+
+    def call(self, method, **kwargs):
+        """
+        借出一個 DataLoader 執行指定的方法
+
+        Args:
+            method (str): DataLoader 方法名稱，例如 'taiwan_stock_daily'
+            **kwargs: 傳給該方法的參數
+
+        Returns:
+            方法回傳值 (通常為 pd.DataFrame)
+        """
+        for attempt in (1, 2):
+            dl = self._acquire()
+            start = time.perf_counter()
+            try:
+                result = getattr(dl, method)(**kwargs)
+            except Exception as e:
+                self._record(method, start, error=True)
+                if attempt == 1 and _is_auth_error(e):
+                    logger.warning(f"FinMind 授權失敗，重新登入後重試 {method}: {e}")
+                    self._discard(dl)
+                    continue
+                self._release(dl)
+                raise
+            self._record(method, start)
+            self._release(dl)
+            return result
+
+    def get_stats(self):
+        """
+        取得各方法的呼叫次數與延遲統計 (毫秒)
+
+        Returns:
+            dict: {method: {"count", "errors", "total_ms", "max_ms", "avg_ms"}}
+        """
+        with self._stats_lock:
+            stats = {name: dict(s) for name, s in self._stats.items()}
+        for s in stats.values():
+            s["avg_ms"] = s["total_ms"] / s["count"] if s["count"] else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    取得 process 共用的 LoaderPool (第一次呼叫時建立)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LoaderPool(token=FINMIND_API_TOKEN, max_size=FINMIND_POOL_SIZE)
+        return _pool
+
+
+def finmind_call(method, **kwargs):
+    """
+    透過共用 DataLoader 池呼叫 FinMind API
+    """
+    return get_pool().call(method, **kwargs)
+
+
+def format_call_stats():
+    """
+    將延遲統計整理成一行一個方法的文字 (寫入 log 用)
+    """
+    lines = []
+    for name, s in sorted(get_pool().get_stats().items()):
+        lines.append(f"{name}: {s['count']} 次 (失敗 {s['errors']}), 平均 {s['avg_ms']:.0f} ms, 最長 {s['max_ms']:.0f} ms")
+    return "\n".join(lines)
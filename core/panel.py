@@ -0,0 +1,324 @@
+import numpy as np
+import pandas as pd
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from config import ANALYSIS_WORKERS
+from core.indicators import compute_indicators
+from core.bars import period_labels, update_period_bars
+from core.strategy import (
+    inertia_signals, breakout_signals,
+    _inertia_result, _breakout_result, _ma_cross_result, _default_ma_cross
+)
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# Panel 引擎：把整份清單的日線排成 (股票 × K 棒) 的 2-D 陣列，
+# 指標與訊號一次對所有股票計算，只有最後的結果格式化才逐檔進行。
+
+PRICE_FIELDS = ('open', 'max', 'min', 'close')
+
+# 與 analyze_stock 的逐檔參數一致
+INERTIA_WINDOW = 60     # 日/週/月線慣性：最後 60 根 K 棒
+BREAKOUT_LOOKBACK = 3   # 三日高低點
+BREAKOUT_WINDOW = 60
+MA_FAST, MA_SLOW = 20, 60
+MA_OBS_DAYS = 3
+MA_WINDOW = 90
+MA_TRIGGER_BAND_PCT = 10
+
+
+def _empty_panel(ids, n_stocks, width):
+    panel = {
+        'ids': ids,
+        'lengths': np.zeros(n_stocks, dtype=int),
+        'dates': np.full((n_stocks, width), np.datetime64('NaT'), dtype='datetime64[ns]'),
+    }
+    for field in PRICE_FIELDS:
+        panel[field] = np.full((n_stocks, width), np.nan)
+    return panel
+
+
+def build_panel(frames, keep_empty=False):
+    """
+    將多檔股票的日線 DataFrame 排成 (股票 × K 棒) 的 2-D 陣列
+
+    採「右對齊」：每一列是該股票自己的 K 棒序列，最後一欄都是各自最新的一根，
+    歷史較短的股票在左側補 NaN (日期補 NaT)。取最後 N 欄即等同逐檔 df.tail(N)，
+    停牌日也不會被插入空白 K 棒，因此策略結果與逐檔計算完全相同。
+
+    Args:
+        frames (dict): {stock_id: pd.DataFrame}，需含 date, max, min, close (open 可省略)
+        keep_empty (bool): 保留沒有資料的股票 (K 棒數為 0)，用來與其他 panel 的列對齊
+
+    Returns:
+        dict: {
+            'ids': list,               # 有資料的股票代碼 (維持傳入順序)
+            'lengths': np.ndarray,     # 每檔實際的 K 棒數
+            'dates': np.ndarray,       # datetime64[ns]
+            'open', 'max', 'min', 'close': np.ndarray (float)
+        }
+    """
+    ids = [sid for sid, df in frames.items() if keep_empty or (df is not None and not df.empty)]
+    lengths = np.array([len(frames[sid]) if frames[sid] is not None else 0 for sid in ids], dtype=int)
+    width = int(lengths.max()) if len(ids) else 0
+
+    panel = _empty_panel(ids, len(ids), width)
+    panel['lengths'] = lengths
+    for i, sid in enumerate(ids):
+        df = frames[sid]
+        if lengths[i] == 0:
+            continue
+        pad = width - lengths[i]
+        panel['dates'][i, pad:] = pd.to_datetime(df['date']).to_numpy()
+        for field in PRICE_FIELDS:
+            if field in df.columns:
+                panel[field][i, pad:] = df[field].to_numpy(dtype=float)
+    return panel
+
+
+def load_panel(stock_ids, days=180, offline=False, workers=None, periods=()):
+    """
+    讀取多檔股票的日線並建立 panel
+
+    Args:
+        stock_ids (list): 股票代碼
+        days (int): 讀取的天數
+        offline (bool): True 時只讀本地資料庫，不向 FinMind 補抓
+        workers (int): 併行讀取數，預設為 ANALYSIS_WORKERS
+        periods (tuple): 要一併載入的週期 ('W', 'M')，使用本地保存並增量更新的週線/月線
+
+    Returns:
+        dict: build_panel 的結果 (查無資料的股票不會出現在 ids 中)，
+              有 periods 時另含 'periods': {period: 與日線 panel 列對齊的週期 panel}
+    """
+    from core import store
+    from core.data import fetch_stock_data
+
+    if offline:
+        start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        read = lambda sid: store.load_bars(sid, start_date)
+    else:
+        read = lambda sid: fetch_stock_data(sid, days)
+
+    def read_with_periods(sid):
+        df = read(sid)
+        if df.empty or not periods:
+            return df, {}
+        return df, {period: update_period_bars(sid, df, period) for period in periods}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or ANALYSIS_WORKERS)) as executor:
+        loaded = dict(zip(stock_ids, executor.map(read_with_periods, stock_ids)))
+
+    panel = build_panel({sid: df for sid, (df, _) in loaded.items()})
+    if periods:
+        panel['periods'] = {
+            period: build_panel({sid: loaded[sid][1].get(period) for sid in panel['ids']}, keep_empty=True)
+            for period in periods
+        }
+    return panel
+
+
+def resample_panel(panel, period='W'):
+    """
+    將日線 panel 重取樣為週線或月線 panel (所有股票一次計算)
+
+    與 strategy.resample_to_period 相同：open 取第一根、max 取最高、min 取最低、
+    close 取最後一根，含 NaN 的週期捨棄。
+
+    Args:
+        panel (dict): build_panel 的結果
+        period (str): 'W' 或 'M'
+
+    Returns:
+        dict: 同 build_panel 格式的週線/月線 panel
+    """
+    n_stocks, width = panel['close'].shape
+    valid = np.arange(width) >= (width - panel['lengths'])[:, None]
+    rows, cols = np.nonzero(valid)
+    if len(rows) == 0:
+        return _empty_panel(panel['ids'], n_stocks, 0)
+
+    key, label = period_labels(panel['dates'][rows, cols], period)
+    new_group = np.ones(len(rows), dtype=bool)
+    new_group[1:] = (rows[1:] != rows[:-1]) | (key[1:] != key[:-1])
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(rows)) - 1
+
+    agg = {
+        'open': panel['open'][rows, cols][starts],
+        'max': np.fmax.reduceat(panel['max'][rows, cols], starts),
+        'min': np.fmin.reduceat(panel['min'][rows, cols], starts),
+        'close': panel['close'][rows, cols][ends],
+    }
+    keep = ~np.isnan(np.vstack([agg[field] for field in PRICE_FIELDS])).any(axis=0)
+    group_rows = rows[starts][keep]
+    group_dates = label[starts][keep]
+
+    # 重新右對齊
+    lengths = np.bincount(group_rows, minlength=n_stocks)
+    new_width = int(lengths.max())
+    first_of_row = np.cumsum(lengths) - lengths
+    rank = np.arange(len(group_rows)) - first_of_row[group_rows]
+    new_cols = new_width - lengths[group_rows] + rank
+
+    out = _empty_panel(panel['ids'], n_stocks, new_width)
+    out['lengths'] = lengths
+    out['dates'][group_rows, new_cols] = group_dates
+    for field in PRICE_FIELDS:
+        out[field][group_rows, new_cols] = agg[field][keep]
+    return out
+
+
+def ma_panel(panel):
+    """
+    計算快慢均線 (與 calculate_technical_indicators 相同：不足 60 根的股票為 NaN，其餘前段 NaN 補 0)
+
+    Returns:
+        tuple: (ma_fast, ma_slow) 與 panel 同形狀
+    """
+    indicators = compute_indicators(panel['max'], panel['min'], panel['close'])
+    has_ma = (panel['lengths'] >= 60)[:, None]
+    ma_fast = np.where(has_ma, np.nan_to_num(indicators[f"MA{MA_FAST}"], nan=0.0), np.nan)
+    ma_slow = np.where(has_ma, np.nan_to_num(indicators[f"MA{MA_SLOW}"], nan=0.0), np.nan)
+    return ma_fast, ma_slow
+
+
+def breakout_panel(panel):
+    """
+    三日高低點訊號 (最後 BREAKOUT_WINDOW 根)；各股票自身前 N 根不足的位置不產生訊號
+
+    Returns:
+        dict: {'window', 'pads', 'signal', 'high_pos', 'low_pos'}，陣列皆為最後 window 欄
+    """
+    width = panel['close'].shape[1]
+    w3 = min(BREAKOUT_WINDOW, width)
+    pads3 = np.maximum(w3 - panel['lengths'], 0)
+    signal, high_pos, low_pos = breakout_signals(
+        panel['max'][:, -w3:], panel['min'][:, -w3:], panel['close'][:, -w3:], BREAKOUT_LOOKBACK
+    )
+    signal[np.arange(w3) - pads3[:, None] < BREAKOUT_LOOKBACK] = 0
+    return {'window': w3, 'pads': pads3, 'signal': signal, 'high_pos': high_pos, 'low_pos': low_pos}
+
+
+def period_panel(panel, period):
+    """
+    取得週線/月線 panel：優先使用 load_panel 載入的本地 K 棒，否則由日線 panel 重取樣
+    """
+    stored = panel.get('periods', {}).get(period)
+    return stored if stored is not None else resample_panel(panel, period)
+
+
+def inertia_panel(bars):
+    """
+    慣性訊號 (最後 INERTIA_WINDOW 根 K 棒)
+
+    Args:
+        bars (dict): 日線或週線/月線 panel
+
+    Returns:
+        dict: {'bars', 'window', 'pads', 'signal'}，signal 為最後 window 欄
+    """
+    w = min(INERTIA_WINDOW, bars['close'].shape[1])
+    signal = inertia_signals(bars['max'][:, -w:], bars['min'][:, -w:], bars['close'][:, -w:])
+    return {'bars': bars, 'window': w, 'pads': np.maximum(w - bars['lengths'], 0), 'signal': signal}
+
+
+def weekly_inertia_panel(panel):
+    """
+    週線慣性訊號
+    """
+    return inertia_panel(period_panel(panel, 'W'))
+
+
+def _inertia_desc(inertia, i, time_type):
+    """
+    單一股票的慣性描述 (K 棒不足 2 根時回傳 None)
+    """
+    bars, w = inertia['bars'], inertia['window']
+    if bars['lengths'][i] < 2:
+        return None
+    p = int(inertia['pads'][i])
+    return _inertia_result(bars['dates'][i, -w:][p:], inertia['signal'][i, p:], time_type)['description']
+
+
+def analyze_panel(panel):
+    """
+    以 panel 一次計算所有股票的技術指標與三種策略狀態 (日/週/月線慣性 / 三日高低點 / 均線交叉)
+
+    Args:
+        panel (dict): build_panel 的結果
+
+    Returns:
+        dict: {stock_id: 技術面結果}，格式同 core.analysis.analyze_technical，
+              可直接傳給 analyze_stock / analyze_index 的 technical 參數
+    """
+    ids = panel['ids']
+    if not ids:
+        return {}
+
+    highs, lows, closes = panel['max'], panel['min'], panel['close']
+    lengths = panel['lengths']
+    pads = closes.shape[1] - lengths
+
+    # 1. 指標  2. 三日高低點  3. 日/週/月線慣性 (全部股票一次計算)
+    ma_fast, ma_slow = ma_panel(panel)
+    brk = breakout_panel(panel)
+    w3 = brk['window']
+    inertia = {
+        'daily': inertia_panel(panel),
+        'weekly': inertia_panel(period_panel(panel, 'W')),
+        'monthly': inertia_panel(period_panel(panel, 'M')),
+    }
+    time_types = {'daily': "日線", 'weekly': "週線", 'monthly': "月線"}
+
+    # 4. 逐檔格式化結果
+    results = {}
+    for i, stock_id in enumerate(ids):
+        n, pad = int(lengths[i]), int(pads[i])
+        dates = panel['dates'][i, pad:]
+
+        if n < BREAKOUT_LOOKBACK + 1:
+            three_day = _breakout_result(None, None, None, np.zeros(0, dtype=np.int8), None, None, "日線", BREAKOUT_LOOKBACK)
+        else:
+            p = int(brk['pads'][i])
+            three_day = _breakout_result(
+                panel['dates'][i, -w3:][p:], highs[i, -w3:][p:], lows[i, -w3:][p:],
+                brk['signal'][i, p:], brk['high_pos'][i, p:] - p, brk['low_pos'][i, p:] - p,
+                "日線", BREAKOUT_LOOKBACK
+            )
+
+        if n < MA_SLOW:
+            ma_cross = _default_ma_cross()
+        else:
+            ma_cross = _ma_cross_result(
+                dates, highs[i, pad:], lows[i, pad:], closes[i, pad:], ma_fast[i, pad:], ma_slow[i, pad:],
+                MA_FAST, MA_SLOW, "sma", MA_OBS_DAYS, MA_WINDOW, MA_TRIGGER_BAND_PCT
+            )
+
+        results[stock_id] = {
+            'date': pd.Timestamp(panel['dates'][i, -1]),
+            'close': closes[i, -1],
+            'MA20': ma_fast[i, -1],
+            'inertia': {key: _inertia_desc(inertia[key], i, time_types[key]) for key in inertia},
+            'three_day': three_day,
+            'ma_cross': ma_cross,
+        }
+    return results
+
+
+def analyze_stocks(stock_ids, days=180, offline=False, workers=None):
+    """
+    載入多檔股票並以 panel 引擎計算技術面 (失敗時回傳空 dict，由呼叫端改用逐檔計算)
+    週線/月線使用本地保存的 K 棒 (增量更新)
+
+    Returns:
+        dict: {stock_id: 技術面結果}
+    """
+    try:
+        panel = load_panel(stock_ids, days=days, offline=offline, workers=workers, periods=('W', 'M'))
+        return analyze_panel(panel)
+    except Exception as e:
+        logger.error(f"Panel 技術面分析失敗: {e}")
+        return {}
@@ -0,0 +1,172 @@
+import threading
+import time
+import logging
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket 限速器
+
+    - 容量為每分鐘額度，以固定速率 (額度 / 60 秒) 補充，允許短時間內的突發請求
+    - acquire 會阻塞到額度足夠為止，可安全地在多執行緒下使用
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1.0):
+        """
+        取得 amount 個額度 (超過容量時以容量計，避免永遠等不到)
+
+        Returns:
+            float: 等待的秒數
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+    def adjust(self, amount):
+        """
+        事後修正用量 (正數為多扣、負數為退還)，例如以實際 token 數取代預估值
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class ModelLimiter:
+    """
+    單一 model 的額度控制：每分鐘請求數 (RPM) 與每分鐘 token 數 (TPM)，
+    以及伺服器回覆 429/503 時依 retry-after 暫停整個 model
+    """
+
+    def __init__(self, rpm, tpm, clock=time.monotonic, sleep=time.sleep):
+        self.requests = TokenBucket(rpm, clock, sleep)
+        self.tokens = TokenBucket(tpm, clock, sleep)
+        self._clock = clock
+        self._sleep = sleep
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """
+        暫停此 model 的新請求 seconds 秒 (已暫停更久時維持原本的時間)
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def paused_for(self):
+        """
+        剩餘的暫停秒數 (0 表示可用)
+        """
+        with self._lock:
+            return max(0.0, self._paused_until - self._clock())
+
+    def acquire(self, estimated_tokens):
+        """
+        等待暫停結束，並取得 1 個請求額度與 estimated_tokens 個 token 額度
+
+        Returns:
+            float: 等待的秒數
+        """
+        waited = 0.0
+        while True:
+            remaining = self.paused_for()
+            if remaining <= 0:
+                break
+            self._sleep(remaining)
+            waited += remaining
+        waited += self.requests.acquire(1)
+        waited += self.tokens.acquire(estimated_tokens)
+        return waited
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """
+        請求完成後，以實際 token 用量修正預估值
+        """
+        if actual_tokens:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+class CircuitBreaker:
+    """
+    單一 model 的熔斷器
+
+    - closed：正常使用
+    - open：額度已滿 / 不可用後的冷卻期間，直接跳過此 model (不浪費一次請求)
+    - half_open：冷卻結束後只放行一個試探請求，成功則恢復 closed，失敗則再次 open 且冷卻時間加倍
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, cooldown=60.0, max_cooldown=900.0, clock=time.monotonic):
+        self.cooldown = float(cooldown)
+        self.max_cooldown = float(max_cooldown)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._open_until = 0.0
+        self._trips = 0
+
+    def allow(self):
+        """
+        是否可以送出請求 (冷卻結束時轉為 half_open 並放行一個試探請求)
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self._clock() >= self._open_until:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def remaining(self):
+        """
+        剩餘的冷卻秒數 (closed / half_open 時為 0)
+        """
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self._open_until - self._clock())
+
+    def record_success(self):
+        """
+        model 有正常回應 (非額度問題)，恢復 closed
+        """
+        with self._lock:
+            self.state = self.CLOSED
+            self._trips = 0
+
+    def record_failure(self, retry_after=None):
+        """
+        額度已滿 / 不可用：open，冷卻時間為 cooldown * 2^(連續次數-1) (不超過 max_cooldown)，
+        伺服器的 retry-after 更長時以 retry-after 為準
+        """
+        with self._lock:
+            self._trips += 1
+            wait = min(self.cooldown * 2 ** (self._trips - 1), self.max_cooldown)
+            wait = max(wait, retry_after or 0.0)
+            self.state = self.OPEN
+            self._open_until = self._clock() + wait
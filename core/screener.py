@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+import logging
+from core import store
+from core.panel import (
+    load_panel, ma_panel, breakout_panel, weekly_inertia_panel,
+    MA_FAST, MA_SLOW, MA_OBS_DAYS, MA_WINDOW
+)
+from core.strategy import _latch_signals, ma_cross_signals, _run_cross_state_machine
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 全市場選股：完全使用本地日線資料庫 (不呼叫 FinMind)，以 panel 引擎一次計算所有股票
+# 規則名稱 -> 報告標題
+SCREEN_RULES = {
+    'breakout': "站上三日高點",
+    'golden_cross': "黃金交叉 (已確認)",
+    'weekly_up': "週線慣性向上",
+}
+
+
+def _local_names():
+    """
+    從本地股票基本資料快取取得名稱 (不呼叫 API，沒有快取時回傳空 dict)
+    """
+    cached = store.load_cache('stock_info') or {}
+    return {sid: info.get('name') for sid, info in cached.get('stocks', {}).items()}
+
+
+def _hit(panel, i, names, score, detail):
+    stock_id = panel['ids'][i]
+    return {
+        'stock_id': stock_id,
+        'name': names.get(stock_id),
+        'date': pd.Timestamp(panel['dates'][i, -1]).strftime('%Y-%m-%d'),
+        'close': float(panel['close'][i, -1]),
+        'score': round(float(score), 2),
+        'detail': detail,
+    }
+
+
+def _screen_breakout(panel, current, names):
+    """
+    今天剛站上三日高點的股票，依突破幅度排序
+    """
+    brk = breakout_panel(panel)
+    w3 = brk['window']
+    _, count, _ = _latch_signals(brk['signal'])
+    hits = []
+    for i in np.flatnonzero(current & (brk['signal'][:, -1] == 1)):
+        barrier = panel['max'][i, -w3:][brk['high_pos'][i, -1]]
+        pct = (panel['close'][i, -1] / barrier - 1) * 100
+        hits.append(_hit(panel, i, names, pct, f"突破 {barrier} ({pct:+.2f}%)，連 {int(count[i, -1])} 次"))
+    return sorted(hits, key=lambda h: -h['score'])
+
+
+def _screen_golden_cross(panel, current, names, recent_days):
+    """
+    最近 recent_days 天內完成確認的黃金交叉，依確認日 (新到舊) 與均線乖離排序
+    """
+    ma_fast, ma_slow = ma_panel(panel)
+    lengths = panel['lengths']
+    width = panel['close'].shape[1]
+
+    # 先以向量化訊號篩出近期有黃金交叉的股票，再只對這些股票跑狀態機
+    span = min(width, recent_days + MA_OBS_DAYS)
+    signal = ma_cross_signals(ma_fast[:, -span:], ma_slow[:, -span:])
+    candidates = np.flatnonzero(current & (lengths >= MA_SLOW) & (signal == 1).any(axis=1))
+
+    hits = []
+    for i in candidates:
+        n = int(lengths[i])
+        start = width - min(n, MA_WINDOW)
+        fast_ma, slow_ma = ma_fast[i, start:], ma_slow[i, start:]
+        state, _, cross_idx = _run_cross_state_machine(
+            ma_cross_signals(fast_ma, slow_ma), fast_ma > slow_ma, fast_ma < slow_ma, MA_OBS_DAYS
+        )
+        if state != 1 or cross_idx is None:
+            continue
+        days_ago = len(fast_ma) - 1 - (cross_idx + MA_OBS_DAYS - 1)
+        if days_ago >= recent_days:
+            continue
+        gap = (fast_ma[-1] / slow_ma[-1] - 1) * 100
+        cross_date = pd.Timestamp(panel['dates'][i, start + cross_idx]).strftime('%Y/%m/%d')
+        hit = _hit(panel, i, names, gap, f"MA{MA_FAST}/MA{MA_SLOW} 交叉於 {cross_date}，{days_ago} 天前確認，乖離 {gap:+.2f}%")
+        hit['days_ago'] = days_ago
+        hits.append(hit)
+    return sorted(hits, key=lambda h: (h['days_ago'], -h['score']))
+
+
+def _screen_weekly_up(panel, current, names):
+    """
+    本週剛觸發週線慣性向上的股票，依連續次數與週漲幅排序
+    """
+    inertia = weekly_inertia_panel(panel)
+    weekly = inertia['bars']
+    _, count, _ = _latch_signals(inertia['signal'])
+    hits = []
+    for i in np.flatnonzero(current & (inertia['signal'][:, -1] == 1)):
+        pct = (weekly['close'][i, -1] / weekly['close'][i, -2] - 1) * 100
+        hit = _hit(panel, i, names, pct, f"連續 {int(count[i, -1])} 次，週漲幅 {pct:+.2f}%")
+        hit['count'] = int(count[i, -1])
+        hits.append(hit)
+    return sorted(hits, key=lambda h: (-h['count'], -h['score']))
+
+
+def screen_panel(panel, rules=None, recent_days=5, limit=None, names=None):
+    """
+    對 panel 中的所有股票執行選股規則
+
+    只有最新一根 K 棒落在全市場最新交易日的股票才會列入 (排除停牌或資料過期的股票)
+
+    Args:
+        panel (dict): core.panel.build_panel 的結果
+        rules (list): 要執行的規則 (SCREEN_RULES 的鍵)，None 表示全部
+        recent_days (int): 黃金交叉在最近幾天內完成確認才列入
+        limit (int): 每個規則最多回傳幾檔，None 表示不限
+        names (dict): {stock_id: name}
+
+    Returns:
+        dict: {rule: [{'stock_id', 'name', 'date', 'close', 'score', 'detail'}, ...]} 依排名排序
+    """
+    rules = list(rules or SCREEN_RULES)
+    unknown = [r for r in rules if r not in SCREEN_RULES]
+    if unknown:
+        raise ValueError(f"未知的選股規則: {unknown}")
+
+    names = names or {}
+    if not panel['ids']:
+        return {rule: [] for rule in rules}
+
+    last_dates = panel['dates'][:, -1]
+    current = last_dates == last_dates.max()
+
+    results = {}
+    for rule in rules:
+        if rule == 'breakout':
+            hits = _screen_breakout(panel, current, names)
+        elif rule == 'golden_cross':
+            hits = _screen_golden_cross(panel, current, names, recent_days)
+        else:
+            hits = _screen_weekly_up(panel, current, names)
+        results[rule] = hits[:limit] if limit else hits
+    return results
+
+
+def screen_market(rules=None, days=180, recent_days=5, limit=None, stock_ids=None, workers=None):
+    """
+    從本地日線資料庫載入全市場 (或指定股票) 並執行選股
+
+    Args:
+        days (int): 讀取的天數
+        stock_ids (list): 指定股票，None 表示本地資料庫中的所有股票
+        其餘參數同 screen_panel
+
+    Returns:
+        dict: screen_panel 的結果
+    """
+    stock_ids = stock_ids or store.list_stocks()
+    logger.info(f"開始全市場選股: {len(stock_ids)} 檔")
+    panel = load_panel(stock_ids, days=days, offline=True, workers=workers)
+    return screen_panel(panel, rules, recent_days, limit, _local_names())
+
+
+def format_screen_report(results):
+    """
+    將選股結果整理成文字報告
+    """
+    sections = []
+    for rule, hits in results.items():
+        lines = [f"【{SCREEN_RULES[rule]}】{len(hits)} 檔"]
+        for rank, hit in enumerate(hits, 1):
+            title = f"{hit['stock_id']} {hit['name']}" if hit['name'] else hit['stock_id']
+            lines.append(f"{rank}. {title} 收盤 {hit['close']} - {hit['detail']}")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
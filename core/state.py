@@ -0,0 +1,493 @@
+import copy
+import numpy as np
+import pandas as pd
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import ANALYSIS_WORKERS
+from core import store
+from core.strategy import _breakout_labels, ma_trigger_price
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 策略狀態的增量更新
+# 每個策略的最終狀態 (目前狀態、次數、觸發日期、支撐壓力區、觀察天數…) 以可 JSON 化的 dict 保存，
+# step_* 每次只吃一根新的 K 棒 (O(1))。從頭逐根 step 的結果等同於 analyze_* 使用 window=None (完整歷史)，
+# 均線交叉與每日報告相同，以 calculate_technical_indicators 補 0 後的均線為準。
+#
+# bar: {'date': 'YYYY-MM-DD', 'open': float, 'max': float, 'min': float, 'close': float}
+
+STATE_CACHE_PREFIX = "strategy_state"
+
+# 狀態格式版本：計算方式改變時遞增，舊版本的狀態會重新建立
+# 2: 均線前段天數不足時補 0 (與每日報告相同)
+STATE_VERSION = 2
+
+
+def _format_date(date_str):
+    return pd.Timestamp(date_str).strftime('%Y/%m/%d')
+
+
+def _latch(state, signal, date):
+    """
+    狀態鎖定 + 連續次數 (與 strategy._latch_signals 相同的規則，一次處理一根)
+    """
+    if signal == 0:
+        return
+    if signal == state['state']:
+        state['count'] += 1
+        state['trigger_dates'].append(date)
+    else:
+        state['state'] = signal
+        state['count'] = 1
+        state['trigger_dates'] = [date]
+
+
+# --- 慣性 ---
+
+def new_inertia_state():
+    return {'bars': 0, 'prev': None, 'state': 0, 'count': 0, 'trigger_dates': []}
+
+
+def step_inertia(state, bar):
+    """
+    以一根新 K 棒推進慣性狀態 (就地修改並回傳)
+    """
+    high, low, close = bar['max'], bar['min'], bar['close']
+    signal = 0
+    if state['prev'] is not None:
+        p_high, p_low, p_close = state['prev']
+        if high > p_high and low > p_low and close > p_close:
+            signal = 1
+        elif high < p_high and low < p_low and close < p_close:
+            signal = -1
+    _latch(state, signal, bar['date'])
+    state['prev'] = [high, low, close]
+    state['bars'] += 1
+    return state
+
+
+def inertia_state_result(state, time_type="日線"):
+    """
+    由慣性狀態產生與 analyze_inertia_with_state 相同格式的結果
+    """
+    res = {
+        "state": "盤整/無訊號",
+        "count": 0,
+        "trigger_dates": [],
+        "description": f"{time_type}慣性沒改變"
+    }
+    if state['bars'] < 2 or state['state'] == 0:
+        return res
+
+    current_state = "慣性向上" if state['state'] > 0 else "慣性向下"
+    res['state'] = current_state
+    res['count'] = state['count']
+    res['trigger_dates'] = [_format_date(d) for d in state['trigger_dates']]
+    dates_str = f" [{', '.join(res['trigger_dates'])}]" if res['trigger_dates'] else ""
+    res['description'] = f"{time_type}{current_state} (連續 {state['count']} 次){dates_str}"
+    return res
+
+
+# --- N 日高低點 ---
+
+def new_breakout_state(lookback=3):
+    return {'lookback': lookback, 'bars': 0, 'recent': [], 'state': 0, 'count': 0, 'trigger_dates': [], 'zone': None}
+
+
+def _first_extreme(values, find_max):
+    """
+    第一個出現的最高/最低值位置 (略過 NaN，全為 NaN 時回傳 None)
+    """
+    arr = np.array(values, dtype=float)
+    if np.isnan(arr).all():
+        return None
+    return int(np.nanargmax(arr) if find_max else np.nanargmin(arr))
+
+
+def step_breakout(state, bar):
+    """
+    以一根新 K 棒推進 N 日高低點狀態 (就地修改並回傳)
+    """
+    recent = state['recent']
+    if len(recent) == state['lookback']:
+        hi_pos = _first_extreme([r[1] for r in recent], True)
+        lo_pos = _first_extreme([r[2] for r in recent], False)
+        signal = 0
+        if hi_pos is not None and bar['close'] > recent[hi_pos][1]:
+            signal, zone_bar, zone_type = 1, recent[hi_pos], "support"
+        elif lo_pos is not None and bar['close'] < recent[lo_pos][2]:
+            signal, zone_bar, zone_type = -1, recent[lo_pos], "resistance"
+        if signal:
+            _latch(state, signal, bar['date'])
+            state['zone'] = {'type': zone_type, 'range': [zone_bar[2], zone_bar[1]], 'date': zone_bar[0]}
+
+    recent.append([bar['date'], bar['max'], bar['min']])
+    del recent[:-state['lookback']]
+    state['bars'] += 1
+    return state
+
+
+def breakout_state_result(state, time_type="日線"):
+    """
+    由 N 日高低點狀態產生與 analyze_3day_high_low 相同格式的結果
+    """
+    res = {
+        "state": "盤整",
+        "count": 0,
+        "trigger_dates": [],
+        "zone_type": None,
+        "zone_range": None,
+        "zone_date": None,
+        "description": f"{time_type}盤整"
+    }
+    if state['bars'] < state['lookback'] + 1:
+        return res
+
+    bull_label, bear_label = _breakout_labels(state['lookback'])
+    res['state'] = {1: bull_label, -1: bear_label}.get(state['state'], "盤整/無訊號")
+    if state['state'] == 0:
+        return res
+
+    zone = state['zone']
+    res['count'] = state['count']
+    res['trigger_dates'] = [_format_date(d) for d in state['trigger_dates']]
+    res['zone_type'] = zone['type']
+    res['zone_range'] = list(zone['range'])
+    res['zone_date'] = pd.Timestamp(zone['date'])
+
+    label = "最新支撐" if zone['type'] == 'support' else "最新壓力"
+    res['description'] = f"{label}: {_format_date(zone['date'])} ({float(zone['range'][0])}~{float(zone['range'][1])})"
+    return res
+
+
+# --- 均線交叉 ---
+
+KEY_PRICE_SPAN = 3  # 關鍵價：交叉日前後 3 根
+
+
+def new_ma_cross_state(fast=20, slow=60, ma_type="sma", obs_days=3):
+    return {
+        'fast': fast, 'slow': slow, 'ma_type': ma_type, 'obs_days': max(2, obs_days),
+        'bars': 0,
+        'closes': [],           # 最近 max(slow, 20) 根收盤 (SMA 與扣抵價使用)
+        'ema': [None, None],    # EMA 模式的快慢線
+        'ma': None,             # 最新一根的 [快線, 慢線]
+        'recent_hl': [],        # 最近 3 根的 [最高, 最低] (交叉前的關鍵價區間)
+        'observing': None,      # 觀察中的交叉 {'dir', 'count', 'date', 'window', 'post'}
+        'confirmed': 0,
+        'cross_date': None,
+        'key_window': [],       # 已確認交叉的關鍵價區間 [[最高, 最低], ...]
+        'key_post': 0,          # key_window 中交叉日之後的根數
+    }
+
+
+def _ma_values(state, close):
+    fast, slow = state['fast'], state['slow']
+    closes = state['closes']
+    if state['ma_type'] == "ema":
+        values = []
+        for i, n in enumerate((fast, slow)):
+            prev = state['ema'][i]
+            a = 2 / (n + 1)
+            state['ema'][i] = close if prev is None else prev + a * (close - prev)
+            values.append(state['ema'][i])
+        return values
+    # 前段天數不足時為 0 (與 calculate_technical_indicators / panel 引擎補 0 的結果相同)
+    f = float(np.mean(closes[-fast:])) if len(closes) >= fast else 0.0
+    s = float(np.mean(closes[-slow:])) if len(closes) >= slow else 0.0
+    return [f, s]
+
+
+def step_ma_cross(state, bar):
+    """
+    以一根新 K 棒推進均線交叉狀態 (就地修改並回傳)
+    交叉當天為觀察第 1 天，滿 obs_days 天仍在同一側即確認；觀察失敗當天不偵測新交叉
+    """
+    state['closes'].append(bar['close'])
+    del state['closes'][:-max(state['slow'], 20)]
+    f, s = _ma_values(state, bar['close'])
+    hl = [bar['max'], bar['min']]
+
+    # 已確認交叉的關鍵價區間：持續收集到交叉後第 3 根
+    if state['confirmed'] and state['key_post'] < KEY_PRICE_SPAN:
+        state['key_window'].append(hl)
+        state['key_post'] += 1
+
+    obs = state['observing']
+    if obs is not None:
+        if obs['post'] < KEY_PRICE_SPAN:
+            obs['window'].append(hl)
+            obs['post'] += 1
+        same_side = f > s if obs['dir'] > 0 else f < s
+        if not same_side:
+            state['observing'] = None
+        else:
+            obs['count'] += 1
+            if obs['count'] >= state['obs_days']:
+                state['confirmed'] = obs['dir']
+                state['cross_date'] = obs['date']
+                state['key_window'] = obs['window']
+                state['key_post'] = obs['post']
+                state['observing'] = None
+    elif state['ma'] is not None:
+        pf, ps = state['ma']
+        direction = 0
+        if pf <= ps and f > s:
+            direction = 1
+        elif pf >= ps and f < s:
+            direction = -1
+        if direction:
+            state['observing'] = {
+                'dir': direction, 'count': 1, 'date': bar['date'],
+                'window': state['recent_hl'][-KEY_PRICE_SPAN:] + [hl], 'post': 0
+            }
+
+    state['ma'] = [f, s]
+    state['recent_hl'].append(hl)
+    del state['recent_hl'][:-KEY_PRICE_SPAN]
+    state['bars'] += 1
+    return state
+
+
+def ma_cross_state_result(state, trigger_band_pct=10):
+    """
+    由均線交叉狀態產生與 analyze_ma_cross 相同格式的結果
+    (SMA 與每日報告相同：不足慢線天數時不產生訊號)
+    """
+    res = {
+        "state_desc": "無交叉訊號",
+        "cross_date": None,
+        "key_price": None,
+        "key_price_desc": None
+    }
+    if state['bars'] < 10 or (state['ma_type'] == "sma" and state['bars'] < state['slow']):
+        return res
+
+    obs = state['observing']
+    if obs is not None:
+        label = "黃金交叉" if obs['dir'] > 0 else "死亡交叉"
+        res['state_desc'] = f"{label}觀察中 (第 {obs['count']} 天)"
+    elif state['confirmed']:
+        c_date = _format_date(state['cross_date'])
+        res['state_desc'] = f"{'黃金交叉' if state['confirmed'] > 0 else '死亡交叉'} ({c_date})"
+        res['cross_date'] = c_date
+        window = np.array(state['key_window'], dtype=float)
+        if state['confirmed'] > 0:
+            res['key_price'] = np.nanmax(window[:, 0])
+            res['key_price_desc'] = f"關鍵點前後高點: {res['key_price']}"
+        else:
+            res['key_price'] = np.nanmin(window[:, 1])
+            res['key_price_desc'] = f"關鍵點前後低點: {res['key_price']}"
+
+    # 明日交叉觸發價
+    fast, slow = state['fast'], state['slow']
+    if state['bars'] >= slow:
+        closes = state['closes']
+        today_fast, today_slow = state['ma']
+        today_close = closes[-1]
+        trigger_price = ma_trigger_price(
+            today_fast, today_slow, closes[-fast], closes[-slow], fast, slow, state['ma_type']
+        )
+        if abs(trigger_price - today_close) / today_close * 100 <= trigger_band_pct:
+            res['trigger_price'] = trigger_price
+            if today_fast < today_slow:
+                res['trigger_desc'] = f"⚠️ 黃金交叉觸發價: 明日收盤 > {trigger_price:.2f}"
+            else:
+                res['trigger_desc'] = f"⚠️ 死亡交叉觸發價: 明日收盤 < {trigger_price:.2f}"
+    return res
+
+
+# --- 週線 / 月線 (進行中的 K 棒) ---
+
+def _period_of(date_str, period):
+    """
+    取得日期所屬的週期 (key) 與 resample 標籤日期 (週日 / 月底)
+    """
+    p = pd.Timestamp(date_str).to_period('W' if period == 'W' else 'M')
+    return str(p), p.end_time.strftime('%Y-%m-%d')
+
+
+def new_period_state(period):
+    return {'period': period, 'key': None, 'bar': None, 'inertia': new_inertia_state()}
+
+
+def step_period(state, bar):
+    """
+    以一根新的日 K 推進週線/月線慣性狀態
+    進入新的週期時才把上一根週 (月) K 確定下來，當期 K 棒只暫存於 state['bar']
+    """
+    key, label = _period_of(bar['date'], state['period'])
+    current = state['bar']
+    if current is not None and key != state['key']:
+        step_inertia(state['inertia'], current)
+        current = None
+    if current is None:
+        state['bar'] = {'date': label, 'open': bar['open'], 'max': bar['max'], 'min': bar['min'], 'close': bar['close']}
+    else:
+        current['max'] = float(np.fmax(current['max'], bar['max']))
+        current['min'] = float(np.fmin(current['min'], bar['min']))
+        current['close'] = bar['close']
+    state['key'] = key
+    return state
+
+
+def period_state_result(state, time_type):
+    """
+    含進行中 K 棒的慣性結果 (與 analyze_inertia_with_state(resample_to_period(df)) 相同)
+    """
+    inertia = state['inertia']
+    if state['bar'] is not None:
+        inertia = step_inertia(copy.deepcopy(inertia), state['bar'])
+    return inertia_state_result(inertia, time_type)
+
+
+# --- 個股狀態 ---
+
+def new_stock_state():
+    return {
+        'version': STATE_VERSION,
+        'last_date': None,
+        'last_close': None,
+        'inertia': new_inertia_state(),
+        'breakout': new_breakout_state(),
+        'ma_cross': new_ma_cross_state(),
+        'weekly': new_period_state('W'),
+        'monthly': new_period_state('M'),
+    }
+
+
+def _to_bar(row):
+    return {
+        'date': pd.Timestamp(row['date']).strftime('%Y-%m-%d'),
+        'open': float(row.get('open', np.nan)),
+        'max': float(row['max']),
+        'min': float(row['min']),
+        'close': float(row['close']),
+    }
+
+
+def step_stock(state, bar):
+    """
+    以一根新的日 K 推進個股所有策略狀態
+    """
+    step_inertia(state['inertia'], bar)
+    step_breakout(state['breakout'], bar)
+    step_ma_cross(state['ma_cross'], bar)
+    step_period(state['weekly'], bar)
+    if 'monthly' not in state:
+        # 舊版狀態沒有月線：從下一根開始累積
+        state['monthly'] = new_period_state('M')
+    step_period(state['monthly'], bar)
+    state['last_date'] = bar['date']
+    state['last_close'] = bar['close']
+    return state
+
+
+def advance_state(state, df):
+    """
+    以日線資料中比 state 更新的 K 棒推進狀態
+
+    state 為 None、狀態版本不同，或資料與 state 之間有缺口 (本地資料的第一根晚於 state 的下一根) 時，從頭重建
+
+    Returns:
+        tuple: (state, 處理的 K 棒數)
+    """
+    if df.empty:
+        return state, 0
+    dates = pd.to_datetime(df['date'])
+    if state is not None and state['last_date'] and dates.iloc[0] > pd.Timestamp(state['last_date']):
+        logger.warning(f"策略狀態 ({state['last_date']}) 與日線資料之間有缺口，重新建立")
+        state = None
+    if state is not None and state.get('version') != STATE_VERSION:
+        logger.info(f"策略狀態版本 ({state.get('version')}) 與目前版本 ({STATE_VERSION}) 不同，重新建立")
+        state = None
+    if state is None:
+        state = new_stock_state()
+        new_rows = df
+    else:
+        new_rows = df[dates > pd.Timestamp(state['last_date'])]
+
+    for row in new_rows.to_dict('records'):
+        step_stock(state, _to_bar(row))
+    return state, len(new_rows)
+
+
+def load_state(stock_id):
+    """
+    讀取已保存的個股策略狀態，不存在時回傳 None
+    """
+    return store.load_cache(f"{STATE_CACHE_PREFIX}/{stock_id}")
+
+
+def save_state(stock_id, state):
+    store.save_cache(f"{STATE_CACHE_PREFIX}/{stock_id}", state)
+
+
+def _period_desc(state, time_type):
+    """
+    週線/月線慣性描述 (含進行中 K 棒不足 2 根時回傳 None)
+    """
+    if state is None or state['inertia']['bars'] + (state['bar'] is not None) < 2:
+        return None
+    return period_state_result(state, time_type)['description']
+
+
+def technical_from_state(state):
+    """
+    由個股狀態產生技術面結果 (格式同 core.analysis.analyze_technical)
+    """
+    closes = state['ma_cross']['closes']
+    return {
+        'date': pd.Timestamp(state['last_date']),
+        'close': state['last_close'],
+        'MA20': float(np.mean(closes[-20:])) if len(closes) >= 20 else float('nan'),
+        'inertia': {
+            'daily': inertia_state_result(state['inertia'], "日線")['description'] if state['inertia']['bars'] >= 2 else None,
+            'weekly': _period_desc(state['weekly'], "週線"),
+            'monthly': _period_desc(state.get('monthly'), "月線"),
+        },
+        'three_day': breakout_state_result(state['breakout'], "日線"),
+        'ma_cross': ma_cross_state_result(state['ma_cross']),
+    }
+
+
+def update_technical(stock_id, df):
+    """
+    讀取個股的策略狀態，只處理新的 K 棒後保存，並回傳技術面結果
+
+    Args:
+        stock_id (str): 股票代碼
+        df (pd.DataFrame): 日線資料 (至少需包含 state 最後日期之後的 K 棒)
+
+    Returns:
+        dict: 技術面結果，無資料時回傳 None
+    """
+    state, processed = advance_state(load_state(stock_id), df)
+    if state is None:
+        return None
+    if processed:
+        save_state(stock_id, state)
+    logger.info(f"{stock_id} 策略狀態更新 {processed} 根 K 棒 (至 {state['last_date']})")
+    return technical_from_state(state)
+
+
+def update_technicals(stock_ids, days=180, workers=None):
+    """
+    批次更新多檔股票的策略狀態 (日線透過 fetch_stock_data 取得，失敗的股票不會出現在結果中)
+
+    Returns:
+        dict: {stock_id: 技術面結果}
+    """
+    from core.data import fetch_stock_data
+
+    def update(stock_id):
+        try:
+            return update_technical(stock_id, fetch_stock_data(stock_id, days))
+        except Exception as e:
+            logger.error(f"{stock_id} 策略狀態更新失敗: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or ANALYSIS_WORKERS)) as executor:
+        records = dict(zip(stock_ids, executor.map(update, stock_ids)))
+    return {sid: rec for sid, rec in records.items() if rec is not None}
@@ -0,0 +1,401 @@
+import os
+import json
+import tempfile
+import threading
+import logging
+import pandas as pd
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from config import DATA_STORE_DIR
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# FinMind 日線資料約在收盤後才會更新，此時間 (台北時間) 之前不預期有當日 K 棒
+BAR_PUBLISH_HOUR = 15
+# Cloud Run 容器的系統時區為 UTC，交易日一律以台北時間判斷
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+# 索引檔：記錄每檔股票在本地已「完整涵蓋」的日期區間 {stock_id: {"start": ..., "end": ...}}，
+# 以及個股補抓時確認過的日期 "checked" (休市、尚未公布、暫停交易時 end 不會前進)
+INDEX_FILE = "_index.json"
+
+# 全市場批次匯入進度：{"end": 最後一個有資料的交易日, "checked": 最後檢查過的日期 (含假日)}
+MARKET_FILE = "_market.json"
+
+# 寫入 Parquet 與讀寫索引檔、JSON 快取時共用的鎖 (Flask 多執行緒下避免同時寫入；Parquet 的讀取不需持有)
+_lock = threading.RLock()
+
+
+def _daily_dir():
+    return os.path.join(DATA_STORE_DIR, "daily")
+
+
+def _bars_path(stock_id):
+    return os.path.join(_daily_dir(), f"{stock_id}.parquet")
+
+
+def _index_path():
+    return os.path.join(_daily_dir(), INDEX_FILE)
+
+
+def _market_path():
+    return os.path.join(_daily_dir(), MARKET_FILE)
+
+
+def _atomic_write(path, write_func):
+    """
+    先寫入暫存檔再 rename，避免程式中斷時留下寫一半的檔案
+    暫存檔名每次不同 (同一目錄下)，多個 process 同時寫入同一檔案時不會互相覆寫暫存檔
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write_func(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _load_index():
+    path = _index_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"讀取日線索引失敗，將視為空索引: {e}")
+        return {}
+
+
+def _save_index(index):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    _atomic_write(_index_path(), write)
+
+
+def get_market_sync():
+    """
+    取得全市場批次匯入的進度
+
+    Returns:
+        dict: {"end": str, "checked": str}，尚未做過批次匯入時回傳 None
+    """
+    path = _market_path()
+    with _lock:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"讀取市場匯入進度失敗: {e}")
+            return None
+
+
+def _save_market_sync(sync):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sync, f)
+
+    _atomic_write(_market_path(), write)
+
+
+def mark_market_checked(date_str):
+    """
+    標記某日已檢查過但無資料 (休市)，讓後續增量判斷可以跳過該日
+    """
+    with _lock:
+        sync = get_market_sync()
+        if sync is None:
+            return
+        sync["checked"] = max(sync["checked"], date_str)
+        _save_market_sync(sync)
+
+
+def get_coverage(stock_id):
+    """
+    取得本地已完整涵蓋的日期區間
+
+    Returns:
+        tuple: (start_date, end_date) 字串 "YYYY-MM-DD"，若無資料回傳 None
+    """
+    with _lock:
+        entry = _load_index().get(stock_id)
+    if not entry:
+        return None
+    return entry["start"], entry["end"]
+
+
+def list_stocks():
+    """
+    列出本地資料庫中有日線資料的所有股票代碼 (依代碼排序)
+    """
+    with _lock:
+        return sorted(_load_index())
+
+
+def load_bars(stock_id, start_date=None, end_date=None):
+    """
+    從本地讀取日線資料
+
+    Args:
+        stock_id (str): 股票代碼
+        start_date (str): 起始日期 "YYYY-MM-DD" (含)，None 表示不限
+        end_date (str): 結束日期 "YYYY-MM-DD" (含)，None 表示不限
+
+    Returns:
+        pd.DataFrame: 依日期排序的日線資料，若無資料回傳空的 DataFrame
+    """
+    # 寫入一律先寫暫存檔再 os.replace，讀取不會看到寫到一半的檔案，因此不持有鎖 (並行讀取不互相等待)
+    path = _bars_path(stock_id)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        df = pd.read_parquet(path)
+    except Exception as e:
+        logger.error(f"讀取本地日線失敗 {stock_id}: {e}")
+        return pd.DataFrame()
+
+    if start_date:
+        df = df[df['date'] >= pd.Timestamp(start_date)]
+    if end_date:
+        df = df[df['date'] <= pd.Timestamp(end_date)]
+    return df.reset_index(drop=True)
+
+
+def _merge_into(index, stock_id, df_new, covered_from=None):
+    """
+    合併單一股票的新資料並寫檔，更新傳入的 index (不寫回索引檔)
+    """
+    df_old = load_bars(stock_id)
+
+    frames = [df for df in (df_old, df_new) if df is not None and not df.empty]
+    if not frames:
+        return
+    merged = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    merged = merged.drop_duplicates(subset='date', keep='last').sort_values('date').reset_index(drop=True)
+
+    if df_new is not None and not df_new.empty:
+        _atomic_write(_bars_path(stock_id), lambda p: merged.to_parquet(p, index=False))
+
+    first_date = merged['date'].iloc[0].strftime("%Y-%m-%d")
+    last_date = merged['date'].iloc[-1].strftime("%Y-%m-%d")
+    entry = index.get(stock_id, {"start": first_date, "end": last_date})
+    entry["start"] = min(entry["start"], first_date, covered_from or first_date)
+    entry["end"] = max(entry["end"], last_date)
+    index[stock_id] = entry
+
+
+def save_bars(stock_id, df_new, covered_from=None, checked_through=None):
+    """
+    將新抓到的日線合併進本地資料 (同日期以新資料為準)，並更新涵蓋區間
+
+    Args:
+        stock_id (str): 股票代碼
+        df_new (pd.DataFrame): 新的日線資料 (date 欄位需為 datetime)
+        covered_from (str): 本次請求的起始日期，用來標記涵蓋區間的起點
+                            (例如新上市股票，起點之前本來就沒有資料)
+        checked_through (str): 本次請求已向 FinMind 確認到的日期，
+                               即使沒有新資料 (休市、尚未公布、暫停交易) 也不再重複補抓
+    """
+    with _lock:
+        index = _load_index()
+        _merge_into(index, stock_id, df_new, covered_from)
+        entry = index.get(stock_id)
+        if entry is not None and checked_through:
+            entry["checked"] = max(entry.get("checked", checked_through), checked_through)
+        _save_index(index)
+
+
+def save_market_day(df_day, date_str):
+    """
+    將單一交易日的全市場日線分發到各股票的本地資料
+
+    只有涵蓋區間與上一個匯入日銜接的股票才會被附加 (避免中間出現缺口)，
+    本地完全沒有資料的股票則直接建立新的區間；有缺口或當日不在回應中的股票
+    (暫停交易、指數等) 留給個股補抓處理。
+
+    Args:
+        df_day (pd.DataFrame): 該日全市場日線 (date 欄位需為 datetime，含 stock_id)
+        date_str (str): 交易日 "YYYY-MM-DD"
+
+    Returns:
+        int: 成功寫入的股票檔數
+    """
+    with _lock:
+        index = _load_index()
+        sync = get_market_sync()
+        if sync is not None:
+            prev_end = sync["end"]
+        else:
+            # 首次批次匯入：只接受涵蓋到前一個平日的股票
+            prev_day = pd.Timestamp(date_str) - timedelta(days=1)
+            while prev_day.weekday() >= 5:
+                prev_day -= timedelta(days=1)
+            prev_end = prev_day.strftime("%Y-%m-%d")
+
+        written = 0
+        for stock_id, df_stock in df_day.groupby('stock_id'):
+            entry = index.get(stock_id)
+            if entry is not None and entry["end"] < prev_end:
+                continue
+            _merge_into(index, stock_id, df_stock.reset_index(drop=True))
+            written += 1
+
+        _save_index(index)
+        _save_market_sync({"end": date_str, "checked": max(date_str, (sync or {}).get("checked", date_str))})
+        return written
+
+
+def _cache_path(name):
+    return os.path.join(DATA_STORE_DIR, "cache", f"{name}.json")
+
+
+def load_cache(name):
+    """
+    讀取本地 JSON 快取
+
+    Args:
+        name (str): 快取名稱 (檔名，不含副檔名)
+
+    Returns:
+        dict/list: 快取內容，不存在或讀取失敗時回傳 None
+    """
+    path = _cache_path(name)
+    with _lock:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"讀取快取 {name} 失敗: {e}")
+            return None
+
+
+def save_cache(name, obj):
+    """
+    寫入本地 JSON 快取 (整份覆寫)
+    """
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+
+    with _lock:
+        _atomic_write(_cache_path(name), write)
+
+
+def update_cache(name, update_func):
+    """
+    以「讀取 -> 修改 -> 寫回」的方式更新 JSON 快取 (整個過程持有鎖)
+
+    Args:
+        name (str): 快取名稱
+        update_func (callable): 接收目前內容 (不存在時為 {}) 並回傳新內容
+    """
+    with _lock:
+        save_cache(name, update_func(load_cache(name) or {}))
+
+
+def _frame_path(kind, key):
+    return os.path.join(DATA_STORE_DIR, kind, f"{key}.parquet")
+
+
+def load_frame(kind, key):
+    """
+    讀取本地保存的 DataFrame (例如月營收、季財報)
+
+    Args:
+        kind (str): 資料種類 (子目錄名稱)，例如 'revenue'
+        key (str): 通常為股票代碼
+
+    Returns:
+        pd.DataFrame: 不存在或讀取失敗時回傳空的 DataFrame
+    """
+    # 與 load_bars 相同，整份覆寫為原子操作，讀取不需持有鎖
+    path = _frame_path(kind, key)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        logger.error(f"讀取本地 {kind} 資料失敗 {key}: {e}")
+        return pd.DataFrame()
+
+
+def list_frames(kind):
+    """
+    列出本地保存的某種資料的所有 key (依名稱排序)，例如 list_frames('revenue') 為有營收快取的股票
+    """
+    directory = os.path.join(DATA_STORE_DIR, kind)
+    with _lock:
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len(".parquet")] for name in os.listdir(directory) if name.endswith(".parquet"))
+
+
+def save_frame(kind, key, df):
+    """
+    保存 DataFrame 到本地 (整份覆寫)
+    """
+    with _lock:
+        _atomic_write(_frame_path(kind, key), lambda p: df.to_parquet(p, index=False))
+
+
+def latest_expected_trading_day(now=None):
+    """
+    推算目前 FinMind 應該已經有資料的最近交易日 (僅排除週末，不處理國定假日)
+
+    Args:
+        now (datetime): 目前時間，帶時區時轉換為台北時間，不帶時區時視為台北時間；None 時使用目前的台北時間
+
+    Returns:
+        str: "YYYY-MM-DD"
+    """
+    now = now or datetime.now(TAIPEI_TZ)
+    if now.tzinfo is not None:
+        now = now.astimezone(TAIPEI_TZ)
+    day = now.date()
+    if now.hour < BAR_PUBLISH_HOUR:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.strftime("%Y-%m-%d")
+
+
+def missing_ranges(stock_id, start_date, end_date, now=None):
+    """
+    計算需要向 FinMind 補抓的日期區間
+
+    Returns:
+        list: [(start_date, end_date), ...]，已完整涵蓋時回傳空 list
+    """
+    with _lock:
+        entry = _load_index().get(stock_id)
+    if not entry:
+        return [(start_date, end_date)]
+
+    cov_start, cov_end = entry["start"], entry["end"]
+    # 全市場批次匯入後確認為休市的日期，視為已涵蓋
+    sync = get_market_sync()
+    if sync is not None and cov_end >= sync["end"]:
+        cov_end = max(cov_end, sync["checked"])
+    # 個股補抓時已確認過沒有新資料的日期不再補抓 (補抓時仍從實際資料的最後一天接續，不會留下缺口)
+    checked = max(cov_end, entry.get("checked", cov_end))
+
+    ranges = []
+    if start_date < cov_start:
+        head_end = (pd.Timestamp(cov_start) - timedelta(days=1)).strftime("%Y-%m-%d")
+        ranges.append((start_date, head_end))
+    if checked < min(end_date, latest_expected_trading_day(now)):
+        tail_start = (pd.Timestamp(cov_end) + timedelta(days=1)).strftime("%Y-%m-%d")
+        ranges.append((tail_start, end_date))
+    return ranges
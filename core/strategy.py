@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import logging
 
@@ -5,7 +6,7 @@ logger = logging.getLogger(__name__)
 
 def analyze_revenue(df_revenue, last_processed_str=None):
     """
-    分析月營收資料
+    分析月營收資料 (單一股票，計算方式見 core.fundamentals.revenue_table)
     
     Args:
         df_revenue (pd.DataFrame): 包含月營收的 DataFrame
@@ -14,82 +15,19 @@ def analyze_revenue(df_revenue, last_processed_str=None):
     Returns:
         dict: 營收分析結果 (如果沒有新資料則回傳 None)
     """
+    from core.fundamentals import revenue_table, revenue_result
+    
     if df_revenue.empty:
         return None
         
-    # 確保資料依照日期排序
-    df_revenue = df_revenue.sort_values('date')
-    last_row = df_revenue.iloc[-1]
-    
-    current_ym = f"{last_row['revenue_year']}-{str(last_row['revenue_month']).zfill(2)}"
-    
-    # Check if data is new
-    if last_processed_str and current_ym <= last_processed_str:
+    table = revenue_table(df_revenue.assign(stock_id=''), last_processed_str)
+    if table.empty:
         return None
-        
-    # Process new revenue data
-    current_revenue = last_row['revenue']
-    
-    # 1. MoM (Month-on-Month)
-    mom_pct = 0.0
-    if len(df_revenue) >= 2:
-        prev_month_rev = df_revenue.iloc[-2]['revenue']
-        if prev_month_rev > 0:
-            mom_pct = ((current_revenue - prev_month_rev) / prev_month_rev) * 100
-
-    # 2. YoY (Year-on-Year)
-    yoy_pct = 0.0
-    # Find record from 12 months ago
-    # Using shift logic assuming data is continuous monthly
-    # Better to filter by year-1, same month
-    target_year = last_row['revenue_year'] - 1
-    target_month = last_row['revenue_month']
-    
-    prev_year_row = df_revenue[
-        (df_revenue['revenue_year'] == target_year) & 
-        (df_revenue['revenue_month'] == target_month)
-    ]
-    
-    if not prev_year_row.empty:
-        prev_year_rev = prev_year_row.iloc[0]['revenue']
-        if prev_year_rev > 0:
-            yoy_pct = ((current_revenue - prev_year_rev) / prev_year_rev) * 100
-            
-    # 3. All-time High
-    all_max_revenue = df_revenue['revenue'].max()
-    is_all_time_high = (current_revenue >= all_max_revenue)
-    
-    # 4. N-Month High (e.g., 6 months, 12 months)
-    # Exclude current month for calculation? Or include? "New high in N months" usually means highest in last N including current.
-    # Let's verify highest in last N rows
-    months_high_desc = ""
-    if is_all_time_high:
-        months_high_desc = "歷史新高"
-    else:
-        # Check against recent window (excluding current itself for comparison context, or simple max check)
-        # Simply: Current is max of last N?
-        windows = [12, 6, 3]
-        for w in windows:
-            if len(df_revenue) >= w:
-                recent_max = df_revenue.tail(w)['revenue'].max()
-                if current_revenue >= recent_max:
-                    months_high_desc = f"近 {w} 個月新高"
-                    break
-    
-    return {
-        "year": last_row['revenue_year'],
-        "month": last_row['revenue_month'],
-        "revenue": current_revenue,
-        "mom_pct": mom_pct,
-        "yoy_pct": yoy_pct,
-        "high_status": months_high_desc,
-        "is_new": True,
-        "date_str": current_ym
-    }
+    return revenue_result(table.iloc[0])
 
 def analyze_financials(df_fin, last_processed_str=None):
     """
-    分析季財報資料
+    分析季財報資料 (單一股票，計算方式見 core.fundamentals.financial_table)
     
     Args:
         df_fin (pd.DataFrame): 包含財報的 DataFrame (date, type, value, origin_name)
@@ -98,132 +36,106 @@ def analyze_financials(df_fin, last_processed_str=None):
     Returns:
         dict: 財報分析結果
     """
-    if df_fin.empty:
-        return None
-        
-    # Pivot Data: index=date, columns=type, values=value
-    # FinMind data might have duplicates for same date/type? (Usually no for same report)
-    df_pivot = df_fin.pivot_table(index='date', columns='type', values='value', aggfunc='first')
-    df_pivot = df_pivot.sort_index()
+    from core.fundamentals import financial_table, financial_result
     
-    if df_pivot.empty:
+    if df_fin.empty:
         return None
         
-    last_date = df_pivot.index[-1]
-    last_dt = pd.to_datetime(last_date)
-    year = last_dt.year
-    quarter = (last_dt.month - 1) // 3 + 1
-    current_q_str = f"{year}-Q{quarter}"
-    
-    # Check if new
-    if last_processed_str and current_q_str <= last_processed_str:
+    table = financial_table(df_fin.assign(stock_id=''), last_processed_str)
+    if table.empty:
         return None
-        
-    latest_data = df_pivot.loc[last_date]
-    
-    # 1. Margins Only if Revenue > 0
-    revenue = latest_data.get('Revenue', 0)
-    gross_profit = latest_data.get('GrossProfit', 0)
-    op_income = latest_data.get('OperatingIncome', 0)
-    net_income = latest_data.get('IncomeAfterTaxes', 0) # Or 'TotalConsolidatedProfitForThePeriod' depending on preference
-    
-    gm = (gross_profit / revenue * 100) if revenue > 0 else 0
-    om = (op_income / revenue * 100) if revenue > 0 else 0
-    nm = (net_income / revenue * 100) if revenue > 0 else 0
-    
-    # 2. Comparison (QoQ, YoY) for Margins
-    # Prev Quarter
-    prev_q_date_idx = -2 if len(df_pivot) >= 2 else None
-    
-    # Prev Year Quarter (approx 4 quarters ago)
-    # Better to find by date match, but index search is easier for now if data continuous
-    prev_y_date_idx = -5 if len(df_pivot) >= 5 else None # Current is -1, 4 ago is -5
-    
-    def get_margin(row):
-        r = row.get('Revenue', 0)
-        return (row.get('GrossProfit', 0)/r*100, row.get('OperatingIncome', 0)/r*100, row.get('IncomeAfterTaxes', 0)/r*100) if r > 0 else (0,0,0)
+    return financial_result(table.iloc[0])
+
 
-    gm_qoq_diff = 0
-    om_qoq_diff = 0
-    nm_qoq_diff = 0
+def _latch_signals(signal):
+    """
+    將每根 K 棒的觸發訊號 (+1 / -1 / 0) 轉成「狀態鎖定 + 連續次數」
+
+    - 狀態：最近一次非 0 訊號的方向 (無訊號時維持前一狀態，從未觸發為 0)
+    - 次數：目前這段同方向狀態中累積的觸發次數 (反向觸發才重新計算)
     
-    if prev_q_date_idx is not None:
-        prev_q_row = df_pivot.iloc[prev_q_date_idx]
-        p_gm, p_om, p_nm = get_margin(prev_q_row)
-        gm_qoq_diff = gm - p_gm
-        om_qoq_diff = om - p_om
-        nm_qoq_diff = nm - p_nm
+    Args:
+        signal (np.ndarray): int 陣列，+1 / -1 / 0 (最後一軸為時間，可為 2-D)
         
-    gm_yoy_diff = 0
-    om_yoy_diff = 0
-    nm_yoy_diff = 0
-    
-    if prev_y_date_idx is not None:
-        prev_y_row = df_pivot.iloc[prev_y_date_idx]
-        p_gm_y, p_om_y, p_nm_y = get_margin(prev_y_row)
-        gm_yoy_diff = gm - p_gm_y
-        om_yoy_diff = om - p_om_y
-        nm_yoy_diff = nm - p_nm_y
-
-    # 3. EPS
-    eps = latest_data.get('EPS', 0)
-    
-    # Cumulative EPS (YTD)
-    # Sum EPS for current year up to this quarter
-    # Filter original df_fin for 'EPS' type and year == year
-    # But df_fin dates are strings? pd.to_datetime needed
-    df_fin['date_dt'] = pd.to_datetime(df_fin['date'])
-    eps_ytd = df_fin[
-        (df_fin['type'] == 'EPS') & 
-        (df_fin['date_dt'].dt.year == year) &
-        (df_fin['date_dt'] <= last_dt)
-    ]['value'].sum()
-    
-    # Last Year Cumulative EPS (Same period)
-    eps_ytd_last_year = df_fin[
-        (df_fin['type'] == 'EPS') & 
-        (df_fin['date_dt'].dt.year == year - 1) &
-        (df_fin['date_dt'].dt.month <= last_dt.month)
-    ]['value'].sum()
-    
-    eps_ytd_growth = 0
-    if eps_ytd_last_year > 0:
-        eps_ytd_growth = ((eps_ytd - eps_ytd_last_year) / eps_ytd_last_year) * 100
-    
-    # Single EPS Growth
-    eps_qoq = 0
-    if prev_q_date_idx is not None:
-        p_eps = df_pivot.iloc[prev_q_date_idx].get('EPS', 0)
-        if p_eps > 0:
-            eps_qoq = ((eps - p_eps) / p_eps) * 100
-            
-    eps_yoy = 0
-    if prev_y_date_idx is not None:
-        p_eps_y = df_pivot.iloc[prev_y_date_idx].get('EPS', 0)
-        if p_eps_y > 0:
-            eps_yoy = ((eps - p_eps_y) / p_eps_y) * 100
+    Returns:
+        tuple: (state, count, run_id) 三個與 signal 同形狀的陣列
+               run_id 相同的 K 棒屬於同一段狀態
+    """
+    n = signal.shape[-1]
+    triggered = signal != 0
+    last_trigger = np.maximum.accumulate(np.where(triggered, np.arange(n), -1), axis=-1)
+    state = np.where(last_trigger >= 0, np.take_along_axis(signal, np.maximum(last_trigger, 0), axis=-1), 0)
+    
+    prev_state = np.concatenate((np.zeros(signal.shape[:-1] + (1,), dtype=state.dtype), state[..., :-1]), axis=-1)
+    run_start = triggered & (signal != prev_state)
+    run_id = np.cumsum(run_start, axis=-1)
+    
+    trigger_cum = np.cumsum(triggered, axis=-1)
+    run_base = np.maximum.accumulate(np.where(run_start, trigger_cum - 1, 0), axis=-1)
+    count = np.where(state != 0, trigger_cum - run_base, 0)
+    return state, count, run_id
 
-    return {
-        "quarter_str": current_q_str,
-        "gm": gm, "om": om, "nm": nm,
-        "gm_qoq": gm_qoq_diff, "om_qoq": om_qoq_diff, "nm_qoq": nm_qoq_diff,
-        "gm_yoy": gm_yoy_diff, "om_yoy": om_yoy_diff, "nm_yoy": nm_yoy_diff,
-        "eps": eps,
-        "eps_qoq": eps_qoq, "eps_yoy": eps_yoy,
-        "eps_ytd": eps_ytd, "eps_ytd_last_year": eps_ytd_last_year,
-        "eps_ytd_growth": eps_ytd_growth,
-        "is_new": True
-    }
+def _last_run_positions(signal, run_id):
+    """
+    取得最後一段狀態中所有觸發 K 棒的位置
+    """
+    return np.flatnonzero((signal != 0) & (run_id == run_id[-1]))
+
+def _bar_dates(df):
+    """
+    取得 K 棒日期陣列 (無 date 欄位時回傳 None)
+    """
+    return df['date'].to_numpy() if 'date' in df.columns else None
 
+def _date_value(dates, pos):
+    """
+    取得指定位置的日期 (datetime64 轉為 pd.Timestamp，無日期時回傳位置本身)
+    """
+    if dates is None:
+        return pos
+    value = dates[pos]
+    return pd.Timestamp(value) if isinstance(value, np.datetime64) else value
+
+def _format_bar_dates(dates, positions):
+    """
+    將指定位置的 K 棒日期格式化為 'YYYY/MM/DD' (無日期時以索引轉換，與原本逐列邏輯一致)
+    """
+    if len(positions) == 0:
+        return []
+    values = dates[positions] if dates is not None else positions
+    return [pd.to_datetime(v).strftime('%Y/%m/%d') for v in values]
 
+def inertia_signals(high, low, close):
+    """
+    慣性改變訊號 (向量化)
+    向上: 今高 > 昨高 且 今低 > 昨低 且 今收 > 昨收 -> +1
+    向下: 今高 < 昨高 且 今低 < 昨低 且 今收 < 昨收 -> -1
+    其餘 (含第一根) -> 0
+    
+    Args:
+        high, low, close (np.ndarray): 價格陣列 (最後一軸為時間，可為 2-D)
+        
+    Returns:
+        np.ndarray: 與輸入同形狀的 int 陣列
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    
+    signal = np.zeros(close.shape, dtype=np.int8)
+    up = (high[..., 1:] > high[..., :-1]) & (low[..., 1:] > low[..., :-1]) & (close[..., 1:] > close[..., :-1])
+    down = (high[..., 1:] < high[..., :-1]) & (low[..., 1:] < low[..., :-1]) & (close[..., 1:] < close[..., :-1])
+    signal[..., 1:] = np.where(up, 1, np.where(down, -1, 0))
+    return signal
 
-def analyze_inertia_with_state(df, time_type="日線"):
+def analyze_inertia_with_state(df, time_type="日線", window=60):
     """
     慣性改變判斷 + 狀態鎖定 + 連續次數統計 + 觸發日期追蹤
     
     Args:
         df (pd.DataFrame): price data
         time_type (str): "日線", "週線", "月線" for labeling
+        window (int): 建立狀態所使用的最後 N 根 K 棒，None 表示使用全部歷史
     
     Returns:
         dict: {
@@ -233,72 +145,48 @@ def analyze_inertia_with_state(df, time_type="日線"):
             "description": str (Formatted string for report)
         }
     """
-    default_res = {
+    if df.empty or len(df) < 2:
+        return _inertia_result(None, np.zeros(0, dtype=np.int8), time_type)
+        
+    # Take last N periods to build state history
+    subset = df.tail(window) if window else df
+    
+    signal = inertia_signals(subset['max'].to_numpy(), subset['min'].to_numpy(), subset['close'].to_numpy())
+    return _inertia_result(_bar_dates(subset), signal, time_type)
+
+def _inertia_result(dates, signal, time_type):
+    """
+    由慣性訊號建立狀態結果 (analyze_inertia_with_state 與 panel 引擎共用)
+    
+    Args:
+        dates (np.ndarray): 與 signal 對應的 K 棒日期 (可為 None)
+        signal (np.ndarray): inertia_signals 的結果 (1-D)
+        time_type (str): "日線", "週線", "月線"
+    """
+    res = {
         "state": "盤整/無訊號",
         "count": 0,
         "trigger_dates": [],
         "description": f"{time_type}慣性沒改變"
     }
-    
-    if df.empty or len(df) < 2:
-        return default_res
-        
-    # Take last 60 periods to build state history
-    subset = df.tail(60).copy().reset_index(drop=True)
-    
-    current_state = "盤整/無訊號"
-    current_count = 0
-    current_trigger_dates = []
-    
-    # Start form index 1 (compare i vs i-1)
-    for i in range(1, len(subset)):
-        t1 = subset.loc[i]   # Today
-        t2 = subset.loc[i-1] # Yesterday
+    if len(signal) < 2:
+        return res
         
-        # Get date string
-        current_date_str = ""
-        if 'date' in t1:
-             current_date_str = pd.to_datetime(t1['date']).strftime('%Y/%m/%d')
-        else:
-             current_date_str = pd.to_datetime(subset.index[i]).strftime('%Y/%m/%d')
-        
-        # 1. Up Change
-        # High > Prev High AND Low > Prev Low AND Close > Prev Close (Price Up)
-        if (t1['max'] > t2['max']) and (t1['min'] > t2['min']) and (t1['close'] > t2['close']):
-            if current_state == "慣性向上":
-                current_count += 1
-                current_trigger_dates.append(current_date_str)
-            else:
-                current_state = "慣性向上"
-                current_count = 1
-                current_trigger_dates = [current_date_str]
-                
-        # 2. Down Change
-        # High < Prev High AND Low < Prev Low AND Close < Prev Close (Price Down)
-        elif (t1['max'] < t2['max']) and (t1['min'] < t2['min']) and (t1['close'] < t2['close']):
-            if current_state == "慣性向下":
-                current_count += 1
-                current_trigger_dates.append(current_date_str)
-            else:
-                current_state = "慣性向下"
-                current_count = 1
-                current_trigger_dates = [current_date_str]
-        
-        # 3. No Change -> Hold State
-        # Do nothing, count stays same, list stays same
+    state, count, run_id = _latch_signals(signal)
     
     # Format Result
-    res = default_res.copy()
-    if current_state != "盤整/無訊號":
+    if state[-1] != 0:
+        current_state = "慣性向上" if state[-1] > 0 else "慣性向下"
+        current_count = int(count[-1])
+        
         res['state'] = current_state
         res['count'] = current_count
-        res['trigger_dates'] = current_trigger_dates
+        # 只格式化最後一段狀態的觸發日期
+        res['trigger_dates'] = _format_bar_dates(dates, _last_run_positions(signal, run_id))
         
         dates_str = f" [{', '.join(res['trigger_dates'])}]" if res['trigger_dates'] else ""
         res['description'] = f"{time_type}{current_state} (連續 {current_count} 次){dates_str}"
     else:
-        # Check if we have a state but just no new trigger today? 
-        # Actually logic above maintains state even if no new trigger today.
         # If state is still default, it means NO trigger in the window.
         res['description'] = f"{time_type}慣性沒改變"
         
@@ -336,36 +224,98 @@ def resample_to_period(df, period):
     return resampled.dropna().reset_index()
 
 
-def analyze_all_inertia(df):
+def analyze_all_inertia(df, df_weekly=None, df_monthly=None):
     """
     分析 日/週/月 慣性 (固定全部顯示)
     
     Args:
         df: daily dataframe
+        df_weekly, df_monthly: 已彙總的週線/月線 (例如本地保存的 K 棒)，None 時由日線彙總
+        
+    Returns:
+        dict: {'daily': str, 'weekly': str, 'monthly': str}，K 棒不足 2 根時為 None
     """
-    if 'date' in df.columns:
-        last_date = pd.to_datetime(df.iloc[-1]['date'])
-    else:
-        last_date = pd.to_datetime(df.index[-1])
+    from core.bars import aggregate_bars
+    
+    def describe(bars, time_type):
+        if bars is None or len(bars) < 2:
+            return None
+        return analyze_inertia_with_state(bars, time_type)['description']
         
-    # Weekly: Always run
-    w_inertia = None
-    df_w = resample_to_period(df, 'W')
-    if len(df_w) >= 2:
-        w_res = analyze_inertia_with_state(df_w, "週線")
-        w_inertia = w_res['description']
+    if df_weekly is None:
+        df_weekly = aggregate_bars(df, 'W')
+    if df_monthly is None:
+        df_monthly = aggregate_bars(df, 'M')
             
     return {
-        'weekly': w_inertia
+        'daily': describe(df, "日線"),
+        'weekly': describe(df_weekly, "週線"),
+        'monthly': describe(df_monthly, "月線"),
     }
 
-def analyze_3day_high_low(df, time_type="日線"):
+def _rolling_extreme(values, lookback, find_max):
+    """
+    計算每根 K 棒「前 N 根」的最高 (或最低) 值與其位置 (向量化滑動視窗)
+    位置取第一個出現的極值 (與 pandas idxmax/idxmin 相同)，NaN 會被略過
+
+    Args:
+        values (np.ndarray): 價格陣列 (最後一軸為時間，可為 2-D)
+        lookback (int): N
+        find_max (bool): True 取最高、False 取最低
+
+    Returns:
+        tuple: (extreme, position) 最後一軸長度皆為 T - lookback，
+               第 j 筆對應第 j + lookback 根 K 棒的前 N 根 (j ~ j+N-1)
+    """
+    fill = -np.inf if find_max else np.inf
+    clean = np.where(np.isnan(values), fill, values)
+    windows = np.lib.stride_tricks.sliding_window_view(clean, lookback, axis=-1)[..., :-1, :]
+    offset = windows.argmax(axis=-1) if find_max else windows.argmin(axis=-1)
+    extreme = np.take_along_axis(windows, offset[..., None], axis=-1)[..., 0]
+    extreme = np.where(np.isinf(extreme), np.nan, extreme)
+    return extreme, np.arange(windows.shape[-2]) + offset
+
+def breakout_signals(high, low, close, lookback=3):
+    """
+    N 日高低點突破訊號 (向量化)
+    收盤 > 前 N 日最高 -> +1；收盤 < 前 N 日最低 -> -1；其餘 (含前 N 根) -> 0
+
+    Args:
+        high, low, close (np.ndarray): 價格陣列 (最後一軸為時間，可為 2-D)
+
+    Returns:
+        tuple: (signal, high_pos, low_pos)
+            high_pos / low_pos: 每根 K 棒前 N 日最高/最低那根的位置 (前 N 根為 -1)
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+
+    signal = np.zeros(close.shape, dtype=np.int8)
+    high_pos = np.full(close.shape, -1)
+    low_pos = np.full(close.shape, -1)
+    if close.shape[-1] <= lookback:
+        return signal, high_pos, low_pos
+
+    barrier_high, high_pos[..., lookback:] = _rolling_extreme(high, lookback, True)
+    barrier_low, low_pos[..., lookback:] = _rolling_extreme(low, lookback, False)
+    today_close = close[..., lookback:]
+    signal[..., lookback:] = np.where(today_close > barrier_high, 1, np.where(today_close < barrier_low, -1, 0))
+    return signal, high_pos, low_pos
+
+def _breakout_labels(lookback):
+    n_str = "三" if lookback == 3 else str(lookback)
+    return f"站上{n_str}日高點", f"跌破{n_str}日低點"
+
+def analyze_3day_high_low(df, time_type="日線", lookback=3, window=60):
     """
     三日高低點判斷 + 支撐/壓力區間 + 連續次數統計 + 觸發日期追蹤
     
     Args:
         df (pd.DataFrame): price data
         time_type (str): "日線", "週線", "月線"
+        lookback (int): 比較前 N 日高低點 (預設 3 日)
+        window (int): 建立狀態所使用的最後 N 根 K 棒，None 表示使用全部歷史
         
     Returns:
         dict: {
@@ -378,7 +328,26 @@ def analyze_3day_high_low(df, time_type="日線"):
             "description": str (Formatted string with time_type)
         }
     """
-    default_res = {
+    if df.empty or len(df) < lookback + 1:
+        return _breakout_result(None, None, None, np.zeros(0, dtype=np.int8), None, None, time_type, lookback)
+        
+    # Take last N days
+    subset = df.tail(window) if window else df
+    
+    highs = subset['max'].to_numpy()
+    lows = subset['min'].to_numpy()
+    signal, high_pos, low_pos = breakout_signals(highs, lows, subset['close'].to_numpy(), lookback)
+    return _breakout_result(_bar_dates(subset), highs, lows, signal, high_pos, low_pos, time_type, lookback)
+
+def _breakout_result(dates, highs, lows, signal, high_pos, low_pos, time_type, lookback):
+    """
+    由突破訊號建立狀態與支撐/壓力結果 (analyze_3day_high_low 與 panel 引擎共用)
+    
+    Args:
+        dates, highs, lows (np.ndarray): 與 signal 對應的 K 棒日期 (可為 None)、最高、最低價
+        signal, high_pos, low_pos (np.ndarray): breakout_signals 的結果 (1-D)
+    """
+    res = {
         "state": "盤整",
         "count": 0,
         "trigger_dates": [],
@@ -387,86 +356,29 @@ def analyze_3day_high_low(df, time_type="日線"):
         "zone_date": None,
         "description": f"{time_type}盤整"
     }
-    
-    if df.empty or len(df) < 4:
-        return default_res
+    if len(signal) == 0:
+        # 資料不足 N+1 根
+        return res
         
-    # Take last 60 days
-    subset = df.tail(60).copy().reset_index(drop=True)
-    
-    current_state = "盤整/無訊號"
-    current_count = 0
-    current_trigger_dates = []
-    current_zone = None
+    state, count, run_id = _latch_signals(signal)
     
-    for i in range(3, len(subset)):
-        today_row = subset.loc[i]
-        today_close = today_row['close']
-        # Try to get date string
-        today_date_str = ""
-        if 'date' in today_row:
-             today_date_str = pd.to_datetime(today_row['date']).strftime('%Y/%m/%d')
+    # Format Result
+    bull_label, bear_label = _breakout_labels(lookback)
+    res['state'] = {1: bull_label, -1: bear_label}.get(int(state[-1]), "盤整/無訊號")
+    res['count'] = int(count[-1])
+    res['trigger_dates'] = _format_bar_dates(dates, _last_run_positions(signal, run_id)) if state[-1] != 0 else []
+    
+    if state[-1] != 0:
+        # 支撐/壓力區：最後一次觸發時，前 N 日中最高 (站上) 或最低 (跌破) 的那根 K 棒
+        last_trigger = int(np.flatnonzero(signal)[-1])
+        if state[-1] > 0:
+            zone_pos, zone_type = int(high_pos[last_trigger]), "support"
         else:
-             today_date_str = pd.to_datetime(subset.index[i]).strftime('%Y/%m/%d')
-        
-        # Previous 3 days indices
-        indices_3 = [i-3, i-2, i-1]
-        
-        # Calculate Barrier
-        prev_3_highs = subset.loc[indices_3, 'max'].max()
-        prev_3_lows = subset.loc[indices_3, 'min'].min()
-        
-        if today_close > prev_3_highs:
-            # Bullish Trigger
-            if current_state == "站上三日高點":
-                current_count += 1
-                current_trigger_dates.append(today_date_str)
-            else:
-                current_state = "站上三日高點"
-                current_count = 1
-                current_trigger_dates = [today_date_str]
-            
-            # Update Zone (Always update on trigger)
-            target_idx = subset.loc[indices_3, 'max'].idxmax()
-            target_row = subset.loc[target_idx]
-            current_zone = {
-                "type": "support",
-                "range": [target_row['min'], target_row['max']],
-                "date": target_row['date'] if 'date' in target_row else subset.index[target_idx]
-            }
+            zone_pos, zone_type = int(low_pos[last_trigger]), "resistance"
             
-        elif today_close < prev_3_lows:
-            # Bearish Trigger
-            if current_state == "跌破三日低點":
-                current_count += 1
-                current_trigger_dates.append(today_date_str)
-            else:
-                current_state = "跌破三日低點"
-                current_count = 1
-                current_trigger_dates = [today_date_str]
-                
-            # Update Zone
-            target_idx = subset.loc[indices_3, 'min'].idxmin()
-            target_row = subset.loc[target_idx]
-            current_zone = {
-                "type": "resistance",
-                "range": [target_row['min'], target_row['max']],
-                "date": target_row['date'] if 'date' in target_row else subset.index[target_idx]
-            }
-            
-        # Else: Maintain State, Count, Dates, and Zone (Do nothing)
-        # Count/Dates do not reset or increment on Hold
-            
-    # Format Result
-    res = default_res.copy()
-    res['state'] = current_state
-    res['count'] = current_count
-    res['trigger_dates'] = current_trigger_dates
-    
-    if current_state != "盤整" and current_zone:
-        res['zone_type'] = current_zone['type']
-        res['zone_range'] = current_zone['range']
-        res['zone_date'] = current_zone['date']
+        res['zone_type'] = zone_type
+        res['zone_range'] = [lows[zone_pos], highs[zone_pos]]
+        res['zone_date'] = _date_value(dates, zone_pos)
         
         date_str = pd.to_datetime(res['zone_date']).strftime('%Y/%m/%d')
         min_v = float(res['zone_range'][0])
@@ -478,12 +390,174 @@ def analyze_3day_high_low(df, time_type="日線"):
     return res
 
 
-def analyze_ma_cross(df):
+def moving_average(close, n, ma_type="sma"):
+    """
+    計算移動平均 (SMA 或 EMA)
+
+    Args:
+        close (pd.Series): 收盤價
+        n (int): 天數
+        ma_type (str): "sma" 或 "ema"
+
+    Returns:
+        pd.Series
+    """
+    if ma_type == "ema":
+        return close.ewm(span=n, adjust=False).mean()
+    return close.rolling(n).mean()
+
+def _ma_column(df, n, ma_type):
+    """
+    取得 MA 欄位 (已由 calculate_technical_indicators 算好時直接使用，否則從收盤價計算)
+    """
+    col = f"MA{n}" if ma_type == "sma" else f"EMA{n}"
+    if col in df.columns:
+        return df[col].to_numpy(dtype=float)
+    return moving_average(df['close'].astype(float), n, ma_type).to_numpy()
+
+def ma_cross_signals(fast_ma, slow_ma):
+    """
+    均線交叉訊號 (向量化)
+    黃金交叉: 昨 快線 <= 慢線 且 今 快線 > 慢線 -> +1
+    死亡交叉: 昨 快線 >= 慢線 且 今 快線 < 慢線 -> -1
+
+    Returns:
+        np.ndarray: int 陣列，第一根為 0
+    """
+    fast_ma = np.asarray(fast_ma, dtype=float)
+    slow_ma = np.asarray(slow_ma, dtype=float)
+    signal = np.zeros(fast_ma.shape, dtype=np.int8)
+    prev_f, prev_s = fast_ma[..., :-1], slow_ma[..., :-1]
+    f, s = fast_ma[..., 1:], slow_ma[..., 1:]
+    golden = (prev_f <= prev_s) & (f > s)
+    death = (prev_f >= prev_s) & (f < s)
+    signal[..., 1:] = np.where(golden, 1, np.where(death, -1, 0))
+    return signal
+
+def _cross_events(signal, above, below, obs_days):
+    """
+    交叉確認狀態機的事件：交叉當天為觀察第 1 天，之後每天快線仍在慢線同一側則 +1，
+    滿 obs_days 天即確認；觀察期中任一天失敗則回到上一個確認狀態 (失敗當天不偵測交叉)。
+    只在交叉發生的位置進行狀態轉換，其餘 K 棒直接跳過。
+
+    Yields:
+        tuple: (cross_idx, direction, confirm_at) 每一個通過 (或資料結束時仍在觀察) 的交叉，
+               confirm_at > len(signal) - 1 表示仍在觀察期 (必為最後一筆)
+    """
+    n = len(signal)
+    next_free = 1  # 可以開始偵測交叉的最早位置
+    # 每根 K 棒起 (含) 連續在同一側的根數，交叉的檢查只需查表
+    runs = {1: _forward_runs(above), -1: _forward_runs(below)}
+    directions = signal.tolist()
+
+    for c in np.flatnonzero(signal).tolist():
+        if c < next_free:
+            continue
+        direction = directions[c]
+        confirm_at = c + obs_days - 1
+
+        # 交叉隔天起需要持續在同一側，第一個不在同一側的位置即為失敗日
+        failed_at = c + 1 + runs[direction][c + 1] if c + 1 < n else n
+        if failed_at <= min(confirm_at, n - 1):
+            next_free = failed_at + 1
+            continue
+        yield c, direction, confirm_at
+        if confirm_at > n - 1:
+            return
+        next_free = confirm_at + 1
+
+def _forward_runs(mask):
+    """
+    每個位置起 (含) 連續為 True 的個數
+    """
+    n = len(mask)
+    stops = np.where(mask, n, np.arange(n))
+    next_stop = np.minimum.accumulate(stops[::-1])[::-1]
+    return (next_stop - np.arange(n)).tolist()
+
+def _run_cross_state_machine(signal, above, below, obs_days):
+    """
+    交叉確認狀態機 (規則見 _cross_events)，只回傳最後一根 K 棒的狀態
+
+    Returns:
+        tuple: (state, obs_count, cross_idx)
+            state: 0 Neutral, ±1 確認 (黃金/死亡), ±2 觀察中
+            obs_count: 觀察中的天數 (僅 state 為 ±2 時有意義)
+            cross_idx: 最後一次「已確認」交叉發生的位置 (無則 None)
+    """
+    n = len(signal)
+    confirmed_state = 0
+    cross_idx = None
+    for c, direction, confirm_at in _cross_events(signal, above, below, obs_days):
+        if confirm_at > n - 1:
+            # 資料結束時仍在觀察期
+            return direction * 2, n - c, cross_idx
+        confirmed_state = direction
+        cross_idx = c
+    return confirmed_state, 0, cross_idx
+
+def cross_state_series(signal, above, below, obs_days):
+    """
+    逐根 K 棒的「已確認」交叉狀態 (與 _run_cross_state_machine 相同規則，供回測使用)
+
+    Returns:
+        tuple: (state, cross_pos)
+            state: int 陣列，+1 黃金交叉 / -1 死亡交叉 / 0 尚未確認過，從確認當天起生效
+            cross_pos: 目前狀態所對應的交叉位置 (無則 -1)
+    """
+    n = len(signal)
+    events = [e for e in _cross_events(signal, above, below, obs_days) if e[2] <= n - 1]
+    if not events:
+        return np.zeros(n, dtype=np.int8), np.full(n, -1)
+    crosses, directions, confirm_at = (np.array(v) for v in zip(*events))
+
+    # 每根 K 棒對應到最近一次的確認事件 (前向填補)
+    marker = np.full(n, -1)
+    marker[confirm_at] = np.arange(len(events))
+    latest = np.maximum.accumulate(marker)
+    state = np.where(latest >= 0, directions[latest], 0).astype(np.int8)
+    cross_pos = np.where(latest >= 0, crosses[latest], -1)
+    return state, cross_pos
+
+def ma_trigger_price(fast_ma, slow_ma, deduct_fast, deduct_slow, fast, slow, ma_type="sma"):
+    """
+    求解「明日收盤價 P」使快慢線在明日相等 (交叉臨界價)
+
+    SMA: 新MA_n = (今MA_n * n - 扣抵價_n + P) / n
+         令兩者相等 -> P = k * (慢線 - 快線) + (k / fast) * 扣抵_fast - (k / slow) * 扣抵_slow，k = fast*slow/(slow-fast)
+         (fast=20, slow=60 時即 P = 30 * (MA60 - MA20) + 1.5 * d20 - 0.5 * d60)
+    EMA: 新EMA_n = EMA_n + a_n * (P - EMA_n)，a_n = 2 / (n + 1)
+         令兩者相等 -> P = (慢線 * (1 - a_slow) - 快線 * (1 - a_fast)) / (a_fast - a_slow)
+
+    Returns:
+        float: 臨界價
     """
-    MA20 與 MA60 交叉分析 (黃金交叉/死亡交叉) + 3天觀察期
+    if ma_type == "ema":
+        a_fast = 2 / (fast + 1)
+        a_slow = 2 / (slow + 1)
+        return (slow_ma * (1 - a_slow) - fast_ma * (1 - a_fast)) / (a_fast - a_slow)
+    k = fast * slow / (slow - fast)
+    return k * (slow_ma - fast_ma) + (k / fast) * deduct_fast - (k / slow) * deduct_slow
+
+def _default_ma_cross():
+    return {
+        "state_desc": "無交叉訊號",
+        "cross_date": None,
+        "key_price": None,
+        "key_price_desc": None
+    }
+
+def analyze_ma_cross(df, fast=20, slow=60, ma_type="sma", obs_days=3, window=90, trigger_band_pct=10):
+    """
+    均線交叉分析 (預設 MA20 與 MA60，黃金交叉/死亡交叉) + 3天觀察期
     
     Args:
-        df: 必須包含 'MA20' 和 'MA60' 欄位
+        df: 價格資料；若已有 'MA20'、'MA60' 等欄位則直接使用，否則由收盤價計算
+        fast, slow (int): 快線 / 慢線天數
+        ma_type (str): "sma" 或 "ema"
+        obs_days (int): 交叉後需維持的觀察天數 (含交叉當天，至少 2)
+        window (int): 建立狀態所使用的最後 N 根 K 棒，None 表示使用全部歷史
+        trigger_band_pct (float): 觸發價與今日收盤的差距在此百分比內才顯示
         
     Returns:
         dict: {
@@ -493,190 +567,87 @@ def analyze_ma_cross(df):
             "key_price_desc": str # 描述 (e.g. "關鍵點前後高點: 153.5")
         }
     """
-    default_res = {
-        "state_desc": "無交叉訊號",
-        "cross_date": None,
-        "key_price": None,
-        "key_price_desc": None
-    }
-    
     # 至少需要足夠的資料來回溯
-    if df.empty or 'MA20' not in df.columns or 'MA60' not in df.columns or len(df) < 10:
-        return default_res
-        
-    # 重設索引以便計算
-    df = df.reset_index(drop=True)
-    
-    # 狀態定義
-    # "Neutral": 無明確交叉或已過很久
-    # "Golden_Obs": 黃金交叉觀察中 (count: 1~3)
-    # "Golden_Confirmed": 黃金交叉已確認
-    # "Death_Obs": 死亡交叉觀察中 (count: 1~3)
-    # "Death_Confirmed": 死亡交叉已確認
+    if df.empty or len(df) < 10:
+        return _default_ma_cross()
+    if ma_type == "sma" and (f"MA{fast}" not in df.columns or f"MA{slow}" not in df.columns) and len(df) < slow:
+        return _default_ma_cross()
+        
+    fast_all = _ma_column(df, fast, ma_type)
+    slow_all = _ma_column(df, slow, ma_type)
+    return _ma_cross_result(
+        _bar_dates(df), df['max'].to_numpy(), df['min'].to_numpy(), df['close'].to_numpy(),
+        fast_all, slow_all, fast, slow, ma_type, obs_days, window, trigger_band_pct
+    )
+
+def _ma_cross_result(dates, highs, lows, closes, fast_all, slow_all, fast, slow, ma_type, obs_days, window, trigger_band_pct):
+    """
+    由快慢線陣列建立均線交叉結果 (analyze_ma_cross 與 panel 引擎共用)
     
-    # 我們需要模擬過去一段時間的狀態變化，為了效能，可以只跑最後 N 天
-    # 但為了捕捉"最近一次"確認的交叉，可能需要跑一段
-    # 假設跑最後 90 天
-    subset = df.tail(90).copy().reset_index(drop=True)
+    Args:
+        dates, highs, lows, closes (np.ndarray): 完整歷史的 K 棒日期 (可為 None) 與價格
+        fast_all, slow_all (np.ndarray): 與價格等長的快線 / 慢線
+        其餘參數同 analyze_ma_cross
+    """
+    res = _default_ma_cross()
     
-    current_state = "Neutral"
-    obs_count = 0
-    confirmed_cross_date = None
-    confirmed_price_range = [] # 用來存 [i-3, i+3] 的索引
+    # 只跑最後 N 天的狀態變化
+    n = len(closes)
+    start = max(0, n - window) if window else 0
+    fast_ma = fast_all[start:]
+    slow_ma = slow_all[start:]
     
-    # 為了能回到"上一個狀態"，我們需要簡單記錄最後一個"Confirmed"的狀態
-    last_confirmed_state = "Neutral"
+    signal = ma_cross_signals(fast_ma, slow_ma)
+    state, obs_count, cross_idx = _run_cross_state_machine(
+        signal, fast_ma > slow_ma, fast_ma < slow_ma, max(2, obs_days)
+    )
     
-    # 從第 1 天開始 (比較 i 和 i-1)
-    for i in range(1, len(subset)):
-        row = subset.loc[i]
-        prev = subset.loc[i-1]
-        
-        ma20 = row['MA20']
-        ma60 = row['MA60']
-        prev_ma20 = prev['MA20']
-        prev_ma60 = prev['MA60']
-        
-        # 1. 偵測交叉訊號
-        cross_signal = None
-        if prev_ma20 <= prev_ma60 and ma20 > ma60:
-            cross_signal = "Golden"
-        elif prev_ma20 >= prev_ma60 and ma20 < ma60:
-            cross_signal = "Death"
-            
-        # 2. 狀態機邏輯
-        
-        # 如果在觀察期中
-        if current_state == "Golden_Obs":
-            if ma20 > ma60:
-                obs_count += 1
-                if obs_count >= 3:
-                    # 確認成立
-                    current_state = "Golden_Confirmed"
-                    last_confirmed_state = "Golden_Confirmed"
-                    # 記錄交叉點索引 (i-2 是第一天發生的點)
-                    # 觀察期是 T(i-2), T+1(i-1), T+2(i) -> 滿3天 -> 確認
-                    # 交叉日是 T (i-2)
-                    cross_idx = i - 2
-                    if cross_idx >= 0:
-                        confirmed_cross_date = subset.loc[cross_idx]
-                        confirmed_price_range = range(max(0, cross_idx-3), min(len(subset), cross_idx+4))
-            else:
-                # 失敗，回到上一個確認狀態
-                current_state = last_confirmed_state
-                obs_count = 0
-                
-        elif current_state == "Death_Obs":
-            if ma20 < ma60:
-                obs_count += 1
-                if obs_count >= 3:
-                    # 確認成立
-                    current_state = "Death_Confirmed"
-                    last_confirmed_state = "Death_Confirmed"
-                    cross_idx = i - 2
-                    if cross_idx >= 0:
-                        confirmed_cross_date = subset.loc[cross_idx]
-                        confirmed_price_range = range(max(0, cross_idx-3), min(len(subset), cross_idx+4))
-            else:
-                # 失敗
-                current_state = last_confirmed_state
-                obs_count = 0
-                
-        else:
-            # 不在觀察期 (Neutral, Golden_Confirmed, Death_Confirmed)
-            if cross_signal == "Golden":
-                current_state = "Golden_Obs"
-                obs_count = 1 # 當天算第1天
-            elif cross_signal == "Death":
-                current_state = "Death_Obs"
-                obs_count = 1 # 當天算第1天
-                
     # 輸出結果格式化
-    res = default_res.copy()
-    
-    # 取得日期字串輔助函式
-    def get_date_str(r):
-        if 'date' in r:
-            return pd.to_datetime(r['date']).strftime('%Y/%m/%d')
-        return ""
-
-    if current_state == "Golden_Confirmed":
-        res['state_desc'] = "黃金交叉"
-        if confirmed_cross_date is not None:
-            c_date = get_date_str(confirmed_cross_date)
-            res['state_desc'] += f" ({c_date})"
-            res['cross_date'] = c_date
-            
-            # 計算前後3天最高價
-            if confirmed_price_range:
-                # 檢查索引是否有效
-                valid_indices = [ix for ix in confirmed_price_range if ix < len(subset)]
-                if valid_indices:
-                    max_p = subset.loc[valid_indices, 'max'].max()
-                    res['key_price'] = max_p
-                    res['key_price_desc'] = f"關鍵點前後高點: {max_p}"
-                    
-    elif current_state == "Death_Confirmed":
-        res['state_desc'] = "死亡交叉"
-        if confirmed_cross_date is not None:
-            c_date = get_date_str(confirmed_cross_date)
+    if state in (1, -1):
+        res['state_desc'] = "黃金交叉" if state == 1 else "死亡交叉"
+        if cross_idx is not None:
+            c_date = _format_bar_dates(dates[start:], [cross_idx])[0] if dates is not None else ""
             res['state_desc'] += f" ({c_date})"
             res['cross_date'] = c_date
             
-            # 計算前後3天最低價
-            if confirmed_price_range:
-                valid_indices = [ix for ix in confirmed_price_range if ix < len(subset)]
-                if valid_indices:
-                    min_p = subset.loc[valid_indices, 'min'].min()
-                    res['key_price'] = min_p
-                    res['key_price_desc'] = f"關鍵點前後低點: {min_p}"
+            # 計算交叉日前後3天最高價 (黃金) / 最低價 (死亡)
+            lo, hi = start + max(0, cross_idx - 3), start + min(n - start, cross_idx + 4)
+            if state == 1:
+                max_p = np.nanmax(highs[lo:hi])
+                res['key_price'] = max_p
+                res['key_price_desc'] = f"關鍵點前後高點: {max_p}"
+            else:
+                min_p = np.nanmin(lows[lo:hi])
+                res['key_price'] = min_p
+                res['key_price_desc'] = f"關鍵點前後低點: {min_p}"
                     
-    elif current_state == "Golden_Obs":
+    elif state == 2:
         res['state_desc'] = f"黃金交叉觀察中 (第 {obs_count} 天)"
-    elif current_state == "Death_Obs":
+    elif state == -2:
         res['state_desc'] = f"死亡交叉觀察中 (第 {obs_count} 天)"
     
     # --- 計算明日交叉觸發價 ---
-    # 需要足夠資料: 至少 60 天
-    if len(df) >= 60:
-        last_idx = len(df) - 1
-        
-        # 今日數據
-        today_ma20 = df.loc[last_idx, 'MA20']
-        today_ma60 = df.loc[last_idx, 'MA60']
-        today_close = df.loc[last_idx, 'close']
-        
-        # 明日扣抵值 (會被踢出 MA 計算的舊價格)
-        # MA20 扣抵: T-19 (今天是 last_idx, 所以是 last_idx - 19)
-        # MA60 扣抵: T-59 (今天是 last_idx, 所以是 last_idx - 59)
-        deduct_idx_20 = last_idx - 19
-        deduct_idx_60 = last_idx - 59
-        
-        if deduct_idx_20 >= 0 and deduct_idx_60 >= 0:
-            d20 = df.loc[deduct_idx_20, 'close']
-            d60 = df.loc[deduct_idx_60, 'close']
-            
-            # 交叉臨界價公式:
-            # 設明日收盤 = P
-            # 新MA20 = (今MA20 * 20 - d20 + P) / 20
-            # 新MA60 = (今MA60 * 60 - d60 + P) / 60
-            # 令 新MA20 = 新MA60, 解 P:
-            # P = 30 * (MA60 - MA20) + 1.5 * d20 - 0.5 * d60
-            trigger_price = 30 * (today_ma60 - today_ma20) + 1.5 * d20 - 0.5 * d60
-            
-            # 判斷是否在合理範圍 (±10% of 今日收盤)
-            price_diff_pct = abs(trigger_price - today_close) / today_close * 100
-            
-            if price_diff_pct <= 10:
-                # 判斷方向
-                if today_ma20 < today_ma60:
-                    # 目前月線在季線下方，若收在 trigger_price 以上 -> 黃金交叉
-                    res['trigger_price'] = trigger_price
-                    res['trigger_desc'] = f"⚠️ 黃金交叉觸發價: 明日收盤 > {trigger_price:.2f}"
-                else:
-                    # 目前月線在季線上方，若收在 trigger_price 以下 -> 死亡交叉
-                    res['trigger_price'] = trigger_price
-                    res['trigger_desc'] = f"⚠️ 死亡交叉觸發價: 明日收盤 < {trigger_price:.2f}"
+    # 需要足夠資料: 至少 slow 天
+    if n >= slow:
+        today_fast = fast_all[-1]
+        today_slow = slow_all[-1]
+        today_close = closes[-1]
+        
+        # 明日扣抵值 (會被踢出 MA 計算的舊價格): T-(n-1)
+        trigger_price = ma_trigger_price(
+            today_fast, today_slow, closes[-fast], closes[-slow], fast, slow, ma_type
+        )
+        
+        # 判斷是否在合理範圍 (±10% of 今日收盤)
+        price_diff_pct = abs(trigger_price - today_close) / today_close * 100
+        
+        if price_diff_pct <= trigger_band_pct:
+            res['trigger_price'] = trigger_price
+            if today_fast < today_slow:
+                # 目前快線在慢線下方，若收在 trigger_price 以上 -> 黃金交叉
+                res['trigger_desc'] = f"⚠️ 黃金交叉觸發價: 明日收盤 > {trigger_price:.2f}"
+            else:
+                # 目前快線在慢線上方，若收在 trigger_price 以下 -> 死亡交叉
+                res['trigger_desc'] = f"⚠️ 死亡交叉觸發價: 明日收盤 < {trigger_price:.2f}"
         
     return res
-
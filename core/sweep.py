@@ -0,0 +1,281 @@
+import itertools
+import numpy as np
+import pandas as pd
+import logging
+from multiprocessing import shared_memory, resource_tracker
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from config import BACKTEST_WORKERS, ANALYSIS_WORKERS
+from core import store
+from core import backtest as bt
+from core.panel import build_panel
+from core.strategy import inertia_signals, breakout_signals, ma_cross_signals, cross_state_series
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 參數掃描：對本地日線資料庫的歷史評估多組策略參數並排名
+# 價格 panel (股票 × K 棒) 放在 shared memory，各 worker process 直接映射同一份記憶體 (不複製)；
+# 共用同一組中間結果 (均線、訊號、交叉狀態機) 的參數組合會分到同一個工作，中間結果只算一次。
+
+# 預設掃描範圍 (window 為 None 表示完整歷史)
+DEFAULT_GRID = {
+    'inertia': {'window': [None, 20, 60, 120]},
+    'breakout': {'lookback': [2, 3, 5], 'window': [None, 60]},
+    'ma_cross': {'fast': [5, 10, 20], 'slow': [60, 120], 'ma_type': ["sma", "ema"], 'obs_days': [2, 3, 5], 'window': [None, 90]},
+}
+
+PANEL_FIELDS = ('open', 'max', 'min', 'close')
+
+# 可用來排名的欄位 (summarize_rules 的欄位)
+RANK_METRICS = ('mean_total_return_pct', 'median_total_return_pct', 'avg_return_pct', 'hit_rate')
+
+# worker process 中映射到 shared memory 的陣列與中間結果快取
+_arrays = {}
+_blocks = []
+_cache = {}
+
+
+def expand_grid(grid=None, rules=None):
+    """
+    展開參數組合
+
+    Args:
+        grid (dict): {rule: {param: [values]}}，未指定的規則使用 DEFAULT_GRID，未列出的參數使用 DEFAULT_PARAMS
+        rules (list): 要掃描的規則，None 表示 grid (或 DEFAULT_GRID) 中的全部
+
+    Returns:
+        list: [(rule, params), ...]，快線天數不小於慢線的組合會被略過
+    """
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    rules = bt._check_rules(rules or list(grid))
+    combos = []
+    for rule in rules:
+        names = list(grid[rule])
+        for values in itertools.product(*(grid[rule][name] for name in names)):
+            params = {**bt.DEFAULT_PARAMS[rule], **dict(zip(names, values))}
+            if rule == 'ma_cross' and params['fast'] >= params['slow']:
+                continue
+            combos.append((rule, params))
+    return combos
+
+
+def _group_key(rule, params):
+    """
+    共用中間結果的參數組合有相同的 key (同一個工作內只算一次)
+    """
+    if rule == 'breakout':
+        return rule, params['lookback']
+    if rule == 'ma_cross':
+        return rule, params['fast'], params['slow'], params['ma_type']
+    return (rule,)
+
+
+def _cached(key, compute):
+    if key not in _cache:
+        _cache[key] = compute()
+    return _cache[key]
+
+
+def _ma(n, ma_type):
+    return _cached(('ma', n, ma_type), lambda: bt.ma_values(_arrays['close'], n, ma_type))
+
+
+def _state(rule, params):
+    """
+    以快取的中間結果計算單一參數組合的逐根狀態 (與 backtest.rule_state 相同)
+    """
+    if rule == 'inertia':
+        signal = _cached(('inertia',), lambda: inertia_signals(_arrays['max'], _arrays['min'], _arrays['close']))
+        window = params['window']
+        return bt._windowed_latch(signal, window - 2 if window else None)
+
+    if rule == 'breakout':
+        lookback = params['lookback']
+        signal = _cached(('breakout', lookback), lambda: bt._mask_after_missing(
+            breakout_signals(_arrays['max'], _arrays['min'], _arrays['close'], lookback)[0], _arrays['close'], lookback
+        ))
+        window = params['window']
+        return bt._windowed_latch(signal, window - 1 - lookback if window else None)
+
+    fast_ma = _ma(params['fast'], params['ma_type'])
+    slow_ma = _ma(params['slow'], params['ma_type'])
+
+    def run_machine():
+        signal = ma_cross_signals(fast_ma, slow_ma)
+        above, below = fast_ma > slow_ma, fast_ma < slow_ma
+        rows = [cross_state_series(signal[i], above[i], below[i], max(2, params['obs_days'])) for i in range(len(signal))]
+        return np.stack([r[0] for r in rows]), np.stack([r[1] for r in rows])
+
+    state, cross_pos = _cached(
+        ('cross', params['fast'], params['slow'], params['ma_type'], params['obs_days']), run_machine
+    )
+    window = params['window']
+    return bt._expire(state, cross_pos, window - 2 if window else None)
+
+
+def _evaluate_combo(rule, params, costs, fill, allow_short):
+    """
+    評估單一參數組合 (所有股票一次計算)，回傳 summarize_rules 格式的一列
+    """
+    state = _state(rule, params)
+    position = state if allow_short else np.maximum(state, 0)
+    sim = bt.simulate(position, _arrays['open'], _arrays['close'], costs, fill)
+    trades = bt.extract_trades(sim['held'], _arrays['open'], _arrays['close'], costs, fill)
+    per_stock = pd.DataFrame({'rule': rule, **bt.evaluate(sim, trades)})
+    return bt.summarize_rules(per_stock[_arrays['lengths'] >= 2]).to_dict('records')
+
+
+def _run_group(combos, costs, fill, allow_short):
+    """
+    執行一組共用中間結果的參數組合 (worker 進入點)
+    完成後只保留均線 (其他工作的快慢線組合也會用到)，訊號與狀態機結果清除
+    """
+    try:
+        results = []
+        for rule, params in combos:
+            for row in _evaluate_combo(rule, params, costs, fill, allow_short):
+                results.append({**row, 'params': params})
+        return results
+    finally:
+        for key in [k for k in _cache if k[0] != 'ma']:
+            del _cache[key]
+
+
+def _share(panel):
+    """
+    將 panel 的價格陣列複製到 shared memory
+
+    Returns:
+        tuple: (blocks, spec) spec 為 {field: (名稱, 形狀, dtype)}，供 worker 映射
+    """
+    blocks, spec = [], {}
+    for field in PANEL_FIELDS + ('lengths',):
+        arr = np.ascontiguousarray(panel[field])
+        block = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)[...] = arr
+        blocks.append(block)
+        spec[field] = (block.name, arr.shape, arr.dtype.str)
+    return blocks, spec
+
+
+def _open_shared(name):
+    """
+    開啟既有的 shared memory，但不向 resource tracker 登記 (清理只由建立者的 unlink 負責)
+
+    Python 3.13 之前開啟既有區塊也會登記，worker 結束時可能被視為洩漏而提早 unlink；
+    若在 worker 中 unregister，共用同一個 resource tracker 時又會刪掉建立者的登記，
+    因此改為開啟時暫時略過登記 (3.13 起使用 track=False)
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == "shared_memory" else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _attach(spec):
+    """
+    worker 初始化：映射 shared memory 中的價格陣列 (唯讀，不複製)
+    """
+    for field, (name, shape, dtype) in spec.items():
+        block = _open_shared(name)
+        _blocks.append(block)
+        view = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        view.flags.writeable = False
+        _arrays[field] = view
+
+
+def load_price_panel(stock_ids=None, start_date=None, end_date=None, workers=None):
+    """
+    從本地日線資料庫讀取多檔股票並建立 panel (不呼叫 FinMind)
+    """
+    stock_ids = stock_ids or store.list_stocks()
+    with ThreadPoolExecutor(max_workers=max(1, workers or ANALYSIS_WORKERS)) as executor:
+        frames = dict(zip(stock_ids, executor.map(lambda sid: store.load_bars(sid, start_date, end_date), stock_ids)))
+    return build_panel(frames)
+
+
+def format_params(params):
+    return ", ".join(f"{k}={v}" for k, v in params.items())
+
+
+def run_sweep(grid=None, rules=None, stock_ids=None, start_date=None, end_date=None, costs=None,
+              fill='open', allow_short=False, sort_by='mean_total_return_pct', workers=None, panel=None):
+    """
+    參數掃描
+
+    Args:
+        grid (dict): {rule: {param: [values]}}，見 expand_grid
+        rules (list): 要掃描的規則
+        stock_ids, start_date, end_date: 讀取的股票與區間 (同 run_backtest)
+        costs, fill, allow_short: 同 backtest_frame
+        sort_by (str): 排名依據 (RANK_METRICS 之一，由大到小)
+        workers (int): process 數，預設為 BACKTEST_WORKERS；1 表示在目前的 process 依序執行
+        panel (dict): 已建立的 panel (build_panel 格式)，None 時由本地資料庫讀取
+
+    Returns:
+        pd.DataFrame: 每個參數組合一列 (rule, params, rank 及 summarize_rules 的欄位)，
+                      依 sort_by 由大到小排序，rank 為規則內的名次
+    """
+    if sort_by not in RANK_METRICS:
+        raise ValueError(f"不支援的排名欄位: {sort_by}")
+    if fill not in bt.FILL_MODES:
+        raise ValueError(f"不支援的成交方式: {fill}")
+    combos = expand_grid(grid, rules)
+    if panel is None:
+        panel = load_price_panel(stock_ids, start_date, end_date)
+
+    groups = {}
+    for rule, params in combos:
+        groups.setdefault(_group_key(rule, params), []).append((rule, params))
+    tasks = list(groups.values())
+    workers = max(1, min(workers or BACKTEST_WORKERS, len(tasks)))
+    logger.info(f"開始參數掃描: {len(panel['ids'])} 檔, {len(combos)} 組參數 ({len(tasks)} 個工作), {workers} 個 process")
+
+    args = (costs, fill, allow_short)
+    if workers == 1:
+        _arrays.update({field: panel[field] for field in PANEL_FIELDS + ('lengths',)})
+        try:
+            results = [_run_group(task, *args) for task in tasks]
+        finally:
+            _arrays.clear()
+            _cache.clear()
+    else:
+        blocks, spec = _share(panel)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(spec,)) as executor:
+                results = list(executor.map(_run_group, tasks, *([a] * len(tasks) for a in args)))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    table = pd.DataFrame([row for rows in results for row in rows])
+    if table.empty:
+        return table
+    table['params'] = table['params'].map(format_params)
+    table = table.sort_values(sort_by, ascending=False, kind='stable').reset_index(drop=True)
+    table['rank'] = table.groupby('rule').cumcount() + 1
+    columns = ['rule', 'rank', 'params'] + [c for c in table.columns if c not in ('rule', 'rank', 'params')]
+    return table[columns]
+
+
+def format_sweep_report(table, top=5):
+    """
+    將掃描結果整理成文字報告 (每個規則列出前 top 名)
+    """
+    sections = []
+    for rule, rows in table.groupby('rule', sort=False):
+        lines = [f"【{bt.BACKTEST_RULES[rule]}】{len(rows)} 組參數"]
+        for row in rows.head(top).to_dict('records'):
+            lines.append(
+                f"{row['rank']}. {row['params']} - 總報酬中位數 {row['median_total_return_pct']:+.2f}%，"
+                f"勝率 {row['hit_rate']:.1f}%，{row['trades']} 筆，最大回撤平均 {row['mean_max_drawdown_pct']:.2f}%"
+            )
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
@@ -5,6 +5,10 @@ SERVICE_NAME="stock-analysis-bot"
 REGION="asia-east1"
 JOB_NAME="stock-bot-daily-job"
 SCHEDULE="0 6 * * 1-5"
+# EPS 預估背景佇列 (EPS_FORECAST_MODE=background 時使用，報告後 30 分鐘；Cloud Run 回應後背景執行緒可能拿不到 CPU)
+# 背景模式需要持久的 DATA_STORE_DIR (掛載 Volume)，預設的 inline 模式下此排程沒有工作可處理
+EPS_JOB_NAME="stock-bot-eps-jobs"
+EPS_SCHEDULE="30 6 * * 1-5"
 TIMEZONE="Asia/Taipei"
 
 # Colors
@@ -75,6 +79,26 @@ else
         --time-zone "$TIMEZONE"
 fi
 
+# 6. EPS forecast job queue
+if gcloud scheduler jobs describe $EPS_JOB_NAME --location $REGION &> /dev/null; then
+    echo "Updating existing EPS job..."
+    gcloud scheduler jobs update http $EPS_JOB_NAME \
+        --location $REGION \
+        --schedule "$EPS_SCHEDULE" \
+        --uri "${SERVICE_URL}/process_eps_jobs" \
+        --http-method POST \
+        --time-zone "$TIMEZONE"
+else
+    echo "Creating new EPS job..."
+    gcloud scheduler jobs create http $EPS_JOB_NAME \
+        --location $REGION \
+        --schedule "$EPS_SCHEDULE" \
+        --uri "${SERVICE_URL}/process_eps_jobs" \
+        --http-method POST \
+        --time-zone "$TIMEZONE"
+fi
+
 echo -e "${GREEN}=== Deployment Complete ===${NC}"
 echo "Webhook URL for LINE: ${SERVICE_URL}/callback"
 echo "Scheduler: ${SCHEDULE} (Approx 6:00 AM Mon-Fri)"
+echo "EPS jobs: ${EPS_SCHEDULE} (Approx 6:30 AM Mon-Fri)"
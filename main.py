@@ -1,20 +1,27 @@
-from flask import Flask, request, abort
+from flask import Flask, request, abort, jsonify
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import MessageEvent, TextMessage, TextSendMessage
 
-from config import LINE_CHANNEL_ACCESS_TOKEN, LINE_CHANNEL_SECRET
+from config import LINE_CHANNEL_ACCESS_TOKEN, LINE_CHANNEL_SECRET, DAILY_INGEST_MODE, ANALYSIS_WORKERS, TECHNICAL_ENGINE, EPS_FORECAST_MODE
 from core.sheets import (
     get_watchlist_details, 
     update_last_revenue_month, 
     update_last_financial_quarter, 
     update_stock_name_cell
 )
-from core.data import get_stock_name
-from core.analysis import analyze_stock
+from core.data import get_stock_names, ingest_market_daily
+from core.loader import format_call_stats
+from core.ai import format_cache_stats, format_model_health, get_model_health
+from core.analysis import analyze_stock, analyze_index, prefetch_eps_forecasts
+from core.eps_jobs import start_worker as start_eps_worker, process_jobs as process_eps_jobs
+from core.panel import analyze_stocks
+from core.state import update_technicals
+from core.screener import screen_market, format_screen_report
 from core.notifier import send_line_notification
 from core.test_logic import run_batch_test 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
@@ -71,6 +78,77 @@ def handle_message(event):
     else:
         pass
 
+def _analyze_index_item(index_item, technical=None):
+    """
+    分析單一指數 (供 worker pool 使用)，失敗時回傳 None
+    """
+    idx_id, idx_name = index_item
+    try:
+        logger.info(f"正在分析指數 {idx_name} ({idx_id})...")
+        return analyze_index(idx_id, idx_name, technical=technical)
+    except Exception as e:
+        logger.error(f"分析指數 {idx_id} 失敗: {e}")
+        return None
+
+def _analyze_watchlist_item(stock_info, technical=None, eps_mode=None):
+    """
+    分析觀察清單中的單一股票 (供 worker pool 使用)，失敗時回傳錯誤訊息字串
+    technical 為 panel 引擎預先算好的技術面結果 (None 時逐檔計算)
+    eps_mode 為 EPS 預估搜尋方式 (background / inline)
+    """
+    stock_id = stock_info['id']
+    last_rev_month = stock_info.get('last_revenue_month')
+    last_fin_quarter = stock_info.get('last_financial_quarter')
+    stock_name = stock_info.get('name')
+    
+    logger.info(f"正在分析 {stock_id} {stock_name} (Last Rev: {last_rev_month}, Last Fin: {last_fin_quarter})...")
+    try:
+        # analyze_stock return dict
+        return analyze_stock(stock_id, last_rev_month, last_fin_quarter, stock_name=stock_name, technical=technical,
+                             eps_mode=eps_mode)
+    except Exception as e:
+        logger.error(f"分析 {stock_id} 時發生錯誤: {e}")
+        return f"【{stock_id}】分析失敗: {e}\n"
+
+@app.route("/screen", methods=["GET"])
+def screen():
+    """
+    全市場選股 (只讀本地日線資料庫，不呼叫 FinMind)
+    參數: rules=breakout,golden_cross,weekly_up  limit=20  recent=5  format=json|text
+    """
+    rules = request.args.get('rules')
+    try:
+        results = screen_market(
+            rules=rules.split(',') if rules else None,
+            limit=int(request.args.get('limit', 20)),
+            recent_days=int(request.args.get('recent', 5)),
+        )
+    except ValueError as e:
+        return str(e), 400
+        
+    if request.args.get('format') == 'text':
+        return format_screen_report(results), 200
+    return jsonify(results)
+
+@app.route("/gemini_health", methods=["GET"])
+def gemini_health():
+    """
+    Gemini 各 model 的熔斷狀態、成功率與延遲，以及目前的備援順序
+    """
+    return jsonify(get_model_health())
+
+@app.route("/process_eps_jobs", methods=["POST", "GET"])
+def process_eps_jobs_route():
+    """
+    處理 EPS 預估背景佇列中剩下的工作 (可由 Cloud Scheduler 在報告後觸發，完成後推播)
+    """
+    try:
+        done = process_eps_jobs()
+        return f"EPS forecast jobs processed: {len(done)}", 200
+    except Exception as e:
+        logger.error(f"處理 EPS 預估背景工作失敗: {e}")
+        return f"Error: {e}", 500
+
 @app.route("/run_analysis", methods=["POST", "GET"])
 def run_analysis():
     logger.info("收到執行分析請求...")
@@ -85,46 +163,64 @@ def run_analysis():
             
         logger.info(f"觀察清單: {[s['id'] for s in stock_list]}")
         
+        # 1.1 更新日線 (bulk 模式：每個交易日一次全市場查詢，失敗時由逐檔抓取補上)
+        ingest_mode = request.args.get('ingest', DAILY_INGEST_MODE)
+        if ingest_mode == 'bulk':
+            if not ingest_market_daily():
+                logger.warning("全市場批次匯入失敗，改為逐檔抓取日線")
+        
         # 2. 逐一分析
         results = []
         updates_rev = []
         updates_fin = []
         updates_name = []
         
-        # 1.5. Analyze Market Indices (TAIEX, TPEx)
-        from core.analysis import analyze_index
+        # Check/Update Name if missing (一次查詢本地股票基本資料索引)
+        missing_ids = [s['id'] for s in stock_list if not s.get('name')]
+        fetched_names = get_stock_names(missing_ids) if missing_ids else {}
+        for stock_info in stock_list:
+            fetched_name = fetched_names.get(stock_info['id'])
+            if not stock_info.get('name') and fetched_name:
+                stock_info['name'] = fetched_name
+                updates_name.append({
+                    'row_idx': stock_info.get('row_idx'),
+                    'name': fetched_name
+                })
+                logger.info(f"已補全 {stock_info['id']} 名稱: {fetched_name}")
+
+        # 1.5. Analyze Market Indices (TAIEX, TPEx) 與個股 -> 併行分析，報告順序維持與清單相同
         market_indices = [('TAIEX', '加權指數'), ('TPEx', '櫃買指數')]
+        workers = max(1, int(request.args.get('workers', ANALYSIS_WORKERS)))
+        logger.info(f"分析併行數: {workers}")
+        
+        # 技術面：指數與個股一次計算 (缺少的股票由逐檔分析補上)
+        # panel: 以 panel 引擎同時計算；incremental: 讀取保存的策略狀態，只處理新的 K 棒
+        tech_ids = [idx_id for idx_id, _ in market_indices] + [s['id'] for s in stock_list]
+        if request.args.get('engine', TECHNICAL_ENGINE) == 'incremental':
+            technicals = update_technicals(tech_ids, workers=workers)
+        else:
+            technicals = analyze_stocks(tech_ids, workers=workers)
         
-        for idx_id, idx_name in market_indices:
+        # EPS 預估: background 時報告不等待 Gemini (排入背景佇列，報告發送後處理)；
+        # inline 時有新營收的股票先合併搜尋 (寫入快取，個股分析時直接使用)
+        eps_mode = request.args.get('eps', EPS_FORECAST_MODE)
+        if eps_mode != 'background':
             try:
-                logger.info(f"正在分析指數 {idx_name} ({idx_id})...")
-                idx_report = analyze_index(idx_id, idx_name)
-                results.append(idx_report)
+                prefetch_eps_forecasts(stock_list, workers=workers)
             except Exception as e:
-                logger.error(f"分析指數 {idx_id} 失敗: {e}")
-
-        for stock_info in stock_list:
-            stock_id = stock_info['id']
-            last_rev_month = stock_info.get('last_revenue_month')
-            last_fin_quarter = stock_info.get('last_financial_quarter')
-            stock_name = stock_info.get('name')
-            row_idx = stock_info.get('row_idx')
+                logger.error(f"預先搜尋 EPS 預估失敗，改為逐檔搜尋: {e}")
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            index_reports = executor.map(_analyze_index_item, market_indices,
+                                         [technicals.get(idx_id) for idx_id, _ in market_indices])
+            stock_results = executor.map(_analyze_watchlist_item, stock_list,
+                                         [technicals.get(s['id']) for s in stock_list],
+                                         [eps_mode] * len(stock_list))
             
-            # Check/Update Name if missing
-            if not stock_name:
-                fetched_name = get_stock_name(stock_id)
-                if fetched_name:
-                    stock_name = fetched_name
-                    updates_name.append({
-                        'row_idx': row_idx,
-                        'name': stock_name
-                    })
-                    logger.info(f"已補全 {stock_id} 名稱: {stock_name}")
+            results.extend(report for report in index_reports if report)
             
-            logger.info(f"正在分析 {stock_id} {stock_name} (Last Rev: {last_rev_month}, Last Fin: {last_fin_quarter})...")
-            try:
-                # analyze_stock return dict
-                analysis_result = analyze_stock(stock_id, last_rev_month, last_fin_quarter, stock_name=stock_name)
+            for stock_info, analysis_result in zip(stock_list, stock_results):
+                row_idx = stock_info.get('row_idx')
                 
                 if isinstance(analysis_result, dict):
                     report = analysis_result.get('report', '')
@@ -146,10 +242,6 @@ def run_analysis():
                         })
                 else:
                     results.append(str(analysis_result))
-                    
-            except Exception as e:
-                logger.error(f"分析 {stock_id} 時發生錯誤: {e}")
-                results.append(f"【{stock_id}】分析失敗: {e}\n")
         
         # 3. 彙整報告
         if not results:
@@ -160,6 +252,11 @@ def run_analysis():
         # 4. 發送通知
         send_line_notification(final_report)
         
+        # 4.1 報告發送後才處理 EPS 預估背景工作 (完成後另外推播)
+        # Cloud Run 回應後 CPU 受限，此執行緒可能停住；排程的 /process_eps_jobs 會在租約過期後接手
+        if eps_mode == 'background' and start_eps_worker():
+            logger.info("已啟動 EPS 預估背景工作")
+        
         # 5. 更新 Google Sheets
         # 5.1 Update Names first
         for up in updates_name:
@@ -180,6 +277,9 @@ def run_analysis():
             except Exception as e:
                 logger.error(f"Failed to update financial for row {up['row_idx']}: {e}")
         
+        logger.info(f"FinMind API 呼叫統計:\n{format_call_stats()}")
+        logger.info(f"EPS 預估快取: {format_cache_stats()}")
+        logger.info(f"Gemini model 狀態:\n{format_model_health()}")
         logger.info("分析任務完成並已發送通知。")
         return "Analysis completed successfully", 200
 
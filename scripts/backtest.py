@@ -0,0 +1,43 @@
+import argparse
+import logging
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.backtest import BACKTEST_RULES, DEFAULT_COSTS, run_backtest, format_backtest_report
+
+# 配置日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="策略回測 (只讀本地日線資料庫)")
+    parser.add_argument('--rules', default=",".join(BACKTEST_RULES), help="規則，逗號分隔: " + ", ".join(BACKTEST_RULES))
+    parser.add_argument('--stocks', help="股票代碼，逗號分隔 (預設為本地資料庫中的所有股票)")
+    parser.add_argument('--start', help="起始日期 YYYY-MM-DD")
+    parser.add_argument('--end', help="結束日期 YYYY-MM-DD")
+    parser.add_argument('--fill', default='open', choices=['open', 'close'], help="隔天開盤 (open) 或當天收盤 (close) 成交")
+    parser.add_argument('--short', action='store_true', help="空方訊號時放空")
+    parser.add_argument('--fee', type=float, default=DEFAULT_COSTS['fee_rate'], help="手續費率 (買賣各一次)")
+    parser.add_argument('--tax', type=float, default=DEFAULT_COSTS['tax_rate'], help="證交稅率 (賣出)")
+    parser.add_argument('--slippage', type=float, default=DEFAULT_COSTS['slippage'], help="滑價比例 (買賣各一次)")
+    parser.add_argument('--workers', type=int, help="process 數")
+    parser.add_argument('--csv', help="將各股票明細寫入 CSV")
+    args = parser.parse_args()
+
+    result = run_backtest(
+        stock_ids=args.stocks.split(',') if args.stocks else None,
+        start_date=args.start, end_date=args.end,
+        rules=args.rules.split(','),
+        costs={'fee_rate': args.fee, 'tax_rate': args.tax, 'slippage': args.slippage},
+        fill=args.fill, allow_short=args.short, workers=args.workers,
+    )
+    print(format_backtest_report(result['rules']))
+    if args.csv:
+        result['stocks'].to_csv(args.csv, index=False)
+        logger.info(f"明細已寫入 {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import logging
+import sys
+import os
+import time
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("GEMINI_API_KEY", "fake-key")
+
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+from core import ai
+from scripts.fake_gemini import FakeGemini, start_server
+
+# 配置日誌 (只顯示結果，略過每次請求的 log)
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+logger = logging.getLogger(__name__)
+
+# Gemini client 每次呼叫的額外成本：每次重建 (舊做法) vs process 共用 client + 預先建立的設定
+
+
+def per_call_setup():
+    """
+    舊做法：每次搜尋都重新讀 .env、建立 Client 與 Tool / GenerateContentConfig
+    """
+    load_dotenv()
+    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=ai._http_options())
+    config = types.GenerateContentConfig(tools=[types.Tool(google_search=types.GoogleSearch())])
+    return client, config
+
+
+def shared_setup():
+    return ai.get_client(), ai.SEARCH_CONFIG
+
+
+def timed(func, n):
+    """
+    執行 n 次，回傳每次平均毫秒數
+    """
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) * 1000 / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini client 每次呼叫的額外成本 (不需要網路，請求送到本機假伺服器)")
+    parser.add_argument('--setup-loops', type=int, default=200, help="只測建立 client / 設定的次數")
+    parser.add_argument('--requests', type=int, default=50, help="對假伺服器送出的請求數 (0 = 略過)")
+    args = parser.parse_args()
+
+    state = FakeGemini(latency=0.0)
+    server, base_url = start_server(state)
+    ai.GEMINI_BASE_URL = base_url
+    prompt = ai._eps_prompt("2330", "台積電")
+    model = ai.SEARCH_CAPABLE_MODELS[0]
+
+    before = timed(per_call_setup, args.setup_loops)
+    after = timed(shared_setup, args.setup_loops)
+    print(f"建立 client 與設定: 每次重建 {before:.3f} ms，共用 {after:.4f} ms")
+
+    if args.requests:
+        def fresh_request():
+            client, config = per_call_setup()
+            client.models.generate_content(model=model, contents=prompt, config=config)
+
+        def shared_request():
+            client, config = shared_setup()
+            client.models.generate_content(model=model, contents=prompt, config=config)
+
+        shared_request()  # 先建立共用 client 與連線
+        before = timed(fresh_request, args.requests)
+        after = timed(shared_request, args.requests)
+        print(f"完整請求 (假伺服器，無延遲): 每次重建 {before:.2f} ms，共用 client {after:.2f} ms")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
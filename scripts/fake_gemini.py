@@ -0,0 +1,214 @@
+import argparse
+import json
+import logging
+import re
+import sys
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 配置日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 本機假 Gemini 伺服器：回應 generateContent / streamGenerateContent (SSE)，
+# 依每個 model 的 RPM 上限回覆 429 + Retry-After，搭配 GEMINI_BASE_URL 測試 core.ai 的併行與限速 (不消耗真實額度)
+
+_PATH = re.compile(r"/models/([^/:]+):(generateContent|streamGenerateContent)")
+
+# 串流時第一段回應在延遲的多少比例後送出
+FIRST_CHUNK_RATIO = 0.2
+_BATCH_ITEM = re.compile(r"^- (\S+) \(", re.M)
+
+
+def fake_answer(prompt_text, model):
+    """
+    單檔 prompt 回傳一段結果；合併搜尋的 prompt 依清單每檔回傳一個 "### [股票代號]" 區段
+    """
+    answer = f"2025 EPS: 10元 (持平)\nSource: [fake]({model})"
+    stock_ids = _BATCH_ITEM.findall(prompt_text)
+    if not stock_ids:
+        return answer
+    return "\n\n".join(f"### [{sid}]\n{answer}" for sid in stock_ids)
+
+
+class FakeGemini:
+    """
+    假伺服器的狀態：每個 model 的 RPM 上限 (滑動 60 秒視窗)、回應延遲、請求統計
+    """
+
+    def __init__(self, rpm=None, latency=0.5, unavailable=()):
+        self.rpm = rpm or {}
+        self.latency = latency
+        self.unavailable = set(unavailable)
+        self.lock = threading.Lock()
+        self.recent = {}
+        self.stats = {"ok": 0, "429": 0, "503": 0, "max_inflight": 0}
+        self.inflight = 0
+
+    def admit(self, model):
+        """
+        回傳 (HTTP 狀態, retry-after 秒數)
+        """
+        with self.lock:
+            if model in self.unavailable:
+                self.stats["503"] += 1
+                return 503, 1.0
+            limit = self.rpm.get(model, self.rpm.get("*"))
+            now = time.monotonic()
+            window = self.recent.setdefault(model, deque())
+            while window and now - window[0] >= 60:
+                window.popleft()
+            if limit and len(window) >= limit:
+                self.stats["429"] += 1
+                return 429, 60 - (now - window[0])
+            window.append(now)
+            self.inflight += 1
+            self.stats["max_inflight"] = max(self.stats["max_inflight"], self.inflight)
+            return 200, 0.0
+
+    def done(self):
+        with self.lock:
+            self.inflight -= 1
+            self.stats["ok"] += 1
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive (重複使用同一個 client 時可共用連線)
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            match = _PATH.search(self.path)
+            if not match:
+                return self._send(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            model, stream = match.group(1), match.group(2) == "streamGenerateContent"
+
+            status, retry_after = state.admit(model)
+            if status != 200:
+                name = "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE"
+                return self._send(status, {"error": {
+                    "code": status, "message": f"{model} {name}", "status": name,
+                    "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_after:.1f}s"}],
+                }}, {"Retry-After": f"{retry_after:.1f}"})
+
+            prompt = json.dumps(payload, ensure_ascii=False)
+            parts = [p.get("text", "") for c in payload.get("contents", []) for p in c.get("parts", [])]
+            answer = fake_answer("\n".join(parts), model)
+            usage = {"promptTokenCount": len(prompt), "candidatesTokenCount": 20, "totalTokenCount": len(prompt) + 20}
+
+            def body(text, finish=True):
+                candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+                if finish:
+                    candidate["finishReason"] = "STOP"
+                return {"candidates": [candidate], **({"usageMetadata": usage} if finish else {})}
+
+            if not stream:
+                time.sleep(state.latency)
+                state.done()
+                return self._send(200, body(answer))
+
+            # SSE：第一段在 FIRST_CHUNK_RATIO * latency 後送出，其餘在延遲結束後送出
+            lines = answer.split("\n")
+            head, tail = lines[0] + "\n", "\n".join(lines[1:])
+            events = [f"data: {json.dumps(body(head, finish=not tail))}\r\n\r\n".encode("utf-8")]
+            if tail:
+                events.append(f"data: {json.dumps(body(tail))}\r\n\r\n".encode("utf-8"))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(sum(len(e) for e in events)))
+            self.end_headers()
+            time.sleep(state.latency * FIRST_CHUNK_RATIO)
+            self.wfile.write(events[0])
+            self.wfile.flush()
+            time.sleep(state.latency * (1 - FIRST_CHUNK_RATIO))
+            for event in events[1:]:
+                self.wfile.write(event)
+            state.done()
+
+    return Handler
+
+
+def start_server(state, port=0):
+    """
+    在背景執行緒啟動假伺服器
+
+    Returns:
+        tuple: (server, base_url)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench(base_url, n, batch_size=1):
+    """
+    對假伺服器送出 n 檔股票的 EPS 搜尋 (直接呼叫 Gemini，不讀寫快取)，回傳耗時秒數
+    batch_size > 1 時每 batch_size 檔合併成一次搜尋
+    """
+    os.environ.setdefault("GEMINI_API_KEY", "fake-key")
+    from core import ai
+    from config import GEMINI_CONCURRENCY
+    ai.GEMINI_BASE_URL = base_url
+    stocks = [(str(1000 + k), f"測試{k}") for k in range(n)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=GEMINI_CONCURRENCY) as executor:
+        if batch_size > 1:
+            chunks = [stocks[i:i + batch_size] for i in range(0, n, batch_size)]
+            found = sum(len(sections) for sections in executor.map(ai._request_eps_batch, chunks))
+        else:
+            found = sum(ok for _, ok in executor.map(lambda s: ai._request_eps_forecast(*s), stocks))
+    elapsed = time.perf_counter() - start
+    failed = n - found
+    logger.info(f"{n} 檔搜尋完成: {elapsed:.2f} 秒 ({n / elapsed:.1f} 檔/秒)，失敗 {failed} 次")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機假 Gemini 伺服器 (測試併行與限速)")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--rpm', default='{}', help='各 model 的 RPM 上限 JSON，例如 \'{"gemini-2.5-flash": 10, "*": 15}\'')
+    parser.add_argument('--latency', type=float, default=0.5, help="每個請求的回應延遲 (秒)")
+    parser.add_argument('--unavailable', default="", help="一律回覆 503 的 model，逗號分隔")
+    parser.add_argument('--bench', type=int, help="啟動後直接對伺服器送出 N 檔股票的搜尋並輸出吞吐量 (不指定則持續執行)")
+    parser.add_argument('--batch-size', type=int, default=1, help="--bench 時每次合併搜尋的股票數")
+    args = parser.parse_args()
+
+    state = FakeGemini(json.loads(args.rpm), args.latency, [m for m in args.unavailable.split(',') if m])
+    server, base_url = start_server(state, 0 if args.bench else args.port)
+    logger.info(f"假 Gemini 伺服器: {base_url} (設定 GEMINI_BASE_URL={base_url})")
+
+    if args.bench:
+        bench(base_url, args.bench, args.batch_size)
+        logger.info(f"伺服器統計: {state.stats}")
+        server.shutdown()
+        return
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import logging
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.data import fetch_monthly_revenue
+from core.fundamentals import REVENUE_HIGH_WINDOWS, scan_revenue_highs
+
+# 配置日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="營收新高掃描 (讀取本地月營收快取)")
+    parser.add_argument('--stocks', help="股票代碼，逗號分隔 (預設為本地有營收快取的所有股票)")
+    parser.add_argument('--window', type=int, default=3, choices=REVENUE_HIGH_WINDOWS, help="至少為近幾個月新高")
+    parser.add_argument('--month', help="營收月份 YYYY-MM (預設為最新月份)")
+    parser.add_argument('--refresh', action='store_true', help="掃描前先以 fetch_monthly_revenue 更新指定股票的快取")
+    parser.add_argument('--limit', type=int, default=50, help="最多列出幾檔")
+    args = parser.parse_args()
+
+    stock_ids = args.stocks.split(',') if args.stocks else None
+    if args.refresh and stock_ids:
+        for stock_id in stock_ids:
+            fetch_monthly_revenue(stock_id)
+
+    hits = scan_revenue_highs(stock_ids, min_window=args.window, month=args.month)
+    for rank, row in enumerate(hits.head(args.limit).to_dict('records'), 1):
+        print(f"{rank}. {row['stock_id']} {row['date_str']} {row['revenue'] / 1e8:.2f} 億 "
+              f"{row['high_status']} (MoM {row['mom_pct']:+.2f}%, YoY {row['yoy_pct']:+.2f}%)")
+
+if __name__ == "__main__":
+    main()
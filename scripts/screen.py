@@ -0,0 +1,34 @@
+import argparse
+import json
+import logging
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.screener import SCREEN_RULES, screen_market, format_screen_report
+
+# 配置日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="全市場選股 (只讀本地日線資料庫)")
+    parser.add_argument('--rules', default=",".join(SCREEN_RULES), help="規則，逗號分隔: " + ", ".join(SCREEN_RULES))
+    parser.add_argument('--limit', type=int, default=20, help="每個規則最多列出幾檔")
+    parser.add_argument('--recent', type=int, default=5, help="黃金交叉在最近幾天內確認")
+    parser.add_argument('--days', type=int, default=180, help="讀取的日線天數")
+    parser.add_argument('--json', action='store_true', help="以 JSON 輸出")
+    args = parser.parse_args()
+
+    results = screen_market(
+        rules=args.rules.split(','), days=args.days, recent_days=args.recent, limit=args.limit
+    )
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(format_screen_report(results))
+
+if __name__ == "__main__":
+    main()
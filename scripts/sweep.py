@@ -0,0 +1,45 @@
+import argparse
+import json
+import logging
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.backtest import BACKTEST_RULES
+from core.sweep import RANK_METRICS, run_sweep, format_sweep_report
+
+# 配置日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="策略參數掃描 (只讀本地日線資料庫)")
+    parser.add_argument('--rules', default=",".join(BACKTEST_RULES), help="規則，逗號分隔: " + ", ".join(BACKTEST_RULES))
+    parser.add_argument('--grid', help='參數範圍 JSON，例如 \'{"ma_cross": {"fast": [10, 20], "slow": [60]}}\'，未指定的使用預設範圍')
+    parser.add_argument('--stocks', help="股票代碼，逗號分隔 (預設為本地資料庫中的所有股票)")
+    parser.add_argument('--start', help="起始日期 YYYY-MM-DD")
+    parser.add_argument('--end', help="結束日期 YYYY-MM-DD")
+    parser.add_argument('--fill', default='open', choices=['open', 'close'], help="隔天開盤 (open) 或當天收盤 (close) 成交")
+    parser.add_argument('--short', action='store_true', help="空方訊號時放空")
+    parser.add_argument('--sort', default='mean_total_return_pct', choices=RANK_METRICS, help="排名依據")
+    parser.add_argument('--top', type=int, default=5, help="每個規則列出前幾名")
+    parser.add_argument('--workers', type=int, help="process 數")
+    parser.add_argument('--csv', help="將完整排名寫入 CSV")
+    args = parser.parse_args()
+
+    table = run_sweep(
+        grid=json.loads(args.grid) if args.grid else None,
+        rules=args.rules.split(','),
+        stock_ids=args.stocks.split(',') if args.stocks else None,
+        start_date=args.start, end_date=args.end,
+        fill=args.fill, allow_short=args.short, sort_by=args.sort, workers=args.workers,
+    )
+    print(format_sweep_report(table, args.top))
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+        logger.info(f"排名已寫入 {args.csv}")
+
+if __name__ == "__main__":
+    main()
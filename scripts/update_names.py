@@ -1,5 +1,4 @@
 import logging
-import time
 import sys
 import os
 
@@ -7,7 +6,7 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core.sheets import get_watchlist, update_stock_names
-from core.data import get_stock_name
+from core.data import get_stock_names
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,18 +23,13 @@ def main():
 
     logger.info(f"Found {len(stock_ids)} stock IDs: {stock_ids}")
 
-    # 2. 查詢每個 ID 的名稱
-    stock_map = {}
+    # 2. 查詢每個 ID 的名稱 (一次載入股票基本資料索引後直接查表)
+    stock_map = get_stock_names(stock_ids)
     for sid in stock_ids:
-        logger.info(f"Fetching name for {sid}...")
-        name = get_stock_name(sid)
-        if name:
-            stock_map[sid] = name
-            logger.info(f"  -> {name}")
+        if sid in stock_map:
+            logger.info(f"{sid} -> {stock_map[sid]}")
         else:
-            logger.warning(f"  -> Name not found for {sid}")
-        # 避免請求過快 (雖然 FinMind 限制寬鬆，但好習慣)
-        time.sleep(0.5)
+            logger.warning(f"{sid} -> Name not found")
     
     if not stock_map:
         logger.warning("No stock names fetched successfully.")
@@ -1,5 +1,6 @@
 import sys
 import os
+import numpy as np
 import pandas as pd
 import logging
 
@@ -137,5 +138,69 @@ def test_3day_rule():
 
     print("All 3-day rule tests passed!")
 
+def reference_3day(df, time_type="日線"):
+    """原本逐列 (subset.loc + idxmax) 的實作，作為向量化版本的對照組"""
+    res = {"state": "盤整", "count": 0, "trigger_dates": [], "zone_type": None,
+           "zone_range": None, "zone_date": None, "description": f"{time_type}盤整"}
+    if df.empty or len(df) < 4:
+        return res
+    subset = df.tail(60).copy().reset_index(drop=True)
+    state, count, dates, zone = "盤整/無訊號", 0, [], None
+    for i in range(3, len(subset)):
+        close = subset.loc[i, 'close']
+        d = pd.to_datetime(subset.loc[i, 'date']).strftime('%Y/%m/%d')
+        idx3 = [i-3, i-2, i-1]
+        if close > subset.loc[idx3, 'max'].max():
+            new_state, t = "站上三日高點", subset.loc[idx3, 'max'].idxmax()
+            zone_type = "support"
+        elif close < subset.loc[idx3, 'min'].min():
+            new_state, t = "跌破三日低點", subset.loc[idx3, 'min'].idxmin()
+            zone_type = "resistance"
+        else:
+            continue
+        if state == new_state:
+            count += 1
+            dates.append(d)
+        else:
+            state, count, dates = new_state, 1, [d]
+        zone = (zone_type, [subset.loc[t, 'min'], subset.loc[t, 'max']], subset.loc[t, 'date'])
+    res.update(state=state, count=count, trigger_dates=dates)
+    if zone:
+        res['zone_type'], res['zone_range'], res['zone_date'] = zone
+        label = "最新支撐" if zone[0] == 'support' else "最新壓力"
+        res['description'] = (f"{label}: {pd.to_datetime(zone[2]).strftime('%Y/%m/%d')} "
+                              f"({float(zone[1][0])}~{float(zone[1][1])})")
+    return res
+
+def test_3day_matches_reference():
+    """向量化版本需與逐列實作的輸出完全相同 (含平手時取第一個極值)"""
+    rng = np.random.default_rng(3)
+    for trial in range(200):
+        n = int(rng.integers(1, 120))
+        close = 100 + np.cumsum(rng.integers(-3, 4, n))
+        df = pd.DataFrame({
+            'date': pd.bdate_range('2024-01-01', periods=n),
+            'max': close + rng.integers(0, 3, n),
+            'min': close - rng.integers(0, 3, n),
+            'close': close,
+        })
+        assert analyze_3day_high_low(df) == reference_3day(df), f"trial {trial}"
+
+def test_n_day_lookback():
+    # 5 日規則：第 5 根收盤 106 > 前 5 日最高 105
+    df = pd.DataFrame({
+        'date': pd.bdate_range('2025-01-01', periods=6),
+        'max': [101, 105, 103, 102, 104, 107],
+        'min': [99, 100, 98, 97, 100, 103],
+        'close': [100, 104, 99, 98, 103, 106],
+    })
+    res = analyze_3day_high_low(df, lookback=5)
+    assert res['state'] == "站上5日高點"
+    assert res['zone_range'] == [100, 105]
+    # 同樣資料用預設 3 日規則，結果需與逐列實作一致
+    assert analyze_3day_high_low(df)['state'] == reference_3day(df)['state']
+
 if __name__ == "__main__":
     test_3day_rule()
+    test_3day_matches_reference()
+    test_n_day_lookback()
@@ -0,0 +1,113 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import store, backtest as bt
+from core.strategy import analyze_inertia_with_state, analyze_3day_high_low, analyze_ma_cross
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_frame(rng, n_days, end='2025-06-30'):
+    dates = pd.bdate_range(end=end, periods=n_days)
+    close = 100 + np.cumsum(rng.normal(0, 2, n_days))
+    return pd.DataFrame({
+        'date': dates,
+        'open': close + rng.normal(0, 1, n_days),
+        'max': close + rng.uniform(0, 3, n_days),
+        'min': close - rng.uniform(0, 3, n_days),
+        'close': close,
+    }).round(2)
+
+
+def bars_of(df):
+    return {col: df[col].to_numpy(dtype=float) for col in ('open', 'max', 'min', 'close')}
+
+
+def test_rule_state_matches_strategy_functions():
+    """第 t 根的狀態應等同以前 t+1 根呼叫 analyze_*"""
+    rng = np.random.default_rng(3)
+    df = make_frame(rng, 220)
+    bars = bars_of(df)
+    inertia = {w: bt.rule_state('inertia', bars, {'window': w}) for w in (None, 60)}
+    breakout = {w: bt.rule_state('breakout', bars, {'window': w}) for w in (None, 60)}
+    ma_cross = bt.rule_state('ma_cross', bars)
+    inertia_label = {"慣性向上": 1, "慣性向下": -1}
+    breakout_label = {"站上三日高點": 1, "跌破三日低點": -1}
+
+    for t in range(5, len(df)):
+        sub = df.iloc[:t + 1]
+        for w in (None, 60):
+            expected = inertia_label.get(analyze_inertia_with_state(sub, window=w)['state'], 0)
+            assert inertia[w][t] == expected, f"inertia t={t} window={w}"
+            expected = breakout_label.get(analyze_3day_high_low(sub, window=w)['state'], 0)
+            assert breakout[w][t] == expected, f"breakout t={t} window={w}"
+
+        desc = analyze_ma_cross(sub, window=None)['state_desc']
+        if t >= 60 and "觀察中" not in desc:
+            expected = 1 if desc.startswith("黃金交叉") else -1 if desc.startswith("死亡交叉") else 0
+            assert ma_cross[t] == expected, f"ma_cross t={t}: {desc}"
+
+
+def test_simulate_costs_and_trades():
+    close = np.array([10.0, 11.0, 12.0, 12.0, 9.0, 10.0])
+    open_ = np.array([10.0, 10.5, 11.5, 12.5, 9.5, 10.0])
+    position = np.array([1, 1, 0, 0, 1, 1], dtype=np.int8)
+    costs = {'fee_rate': 0.001, 'tax_rate': 0.003, 'slippage': 0.0}
+
+    # 隔天開盤成交：第 1 根開盤買進、第 3 根開盤賣出；第 5 根開盤買進並持有到最後
+    sim = bt.simulate(position, open_, close, costs, fill='open')
+    assert sim['held'].tolist() == [0, 1, 1, 0, 0, 1]
+    trades = bt.extract_trades(sim['held'], open_, close, costs, fill='open')
+    assert trades['entry'].tolist() == [1, 5]
+    assert trades['exit'].tolist() == [3, -1]
+    first = 12.5 / 10.5 * (1 - 0.001) * (1 - 0.004) - 1
+    assert abs(trades['return'][0] - first) < 1e-12
+    assert abs(trades['return'][1] - (10.0 / 10.0 * (1 - 0.001) - 1)) < 1e-12
+    # 淨值 = 各筆交易報酬連乘
+    assert abs(sim['equity'][-1] - (1 + first) * (1 + trades['return'][1])) < 1e-12
+
+    # 當天收盤成交
+    sim = bt.simulate(position, open_, close, costs, fill='close')
+    trades = bt.extract_trades(sim['held'], open_, close, costs, fill='close')
+    assert trades['entry'].tolist() == [0, 4]
+    assert abs(trades['return'][0] - (12.0 / 10.0 * (1 - 0.001) * (1 - 0.004) - 1)) < 1e-12
+    assert abs(bt.max_drawdown(sim['equity']) - (1 - sim['equity'][4] / sim['equity'][2])) < 1e-12
+
+    # 放空：報酬方向相反
+    sim = bt.simulate(-position, open_, close, {'fee_rate': 0, 'tax_rate': 0}, fill='close')
+    trades = bt.extract_trades(sim['held'], open_, close, {'fee_rate': 0, 'tax_rate': 0}, fill='close')
+    assert abs(trades['return'][0] - (1 - 12.0 / 10.0)) < 1e-12
+
+
+def test_run_backtest_process_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    rng = np.random.default_rng(11)
+    for k in range(6):
+        store.save_bars(f"{2000 + k}", make_frame(rng, 400))
+
+    serial = bt.run_backtest(workers=1)
+    pooled = bt.run_backtest(workers=2)
+    pd.testing.assert_frame_equal(serial['stocks'], pooled['stocks'])
+    assert set(serial['stocks']['stock_id']) == {f"{2000 + k}" for k in range(6)}
+
+    summary = serial['rules'].set_index('rule')
+    assert list(summary.index) == list(bt.BACKTEST_RULES)
+    stocks = serial['stocks']
+    for rule in bt.BACKTEST_RULES:
+        rows = stocks[stocks['rule'] == rule]
+        assert summary.loc[rule, 'trades'] == rows['trades'].sum()
+        assert summary.loc[rule, 'worst_drawdown_pct'] == rows['max_drawdown_pct'].max()
+    logger.info("\n" + bt.format_backtest_report(serial['rules']))
+
+    try:
+        bt.run_backtest(rules=['unknown'], workers=1)
+        assert False, "未知規則應拋出 ValueError"
+    except ValueError:
+        pass
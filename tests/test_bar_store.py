@@ -0,0 +1,244 @@
+import sys
+import os
+import pandas as pd
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.data as data
+import core.loader as loader
+from core import store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_bars(start, end, stock_id='2330'):
+    dates = pd.bdate_range(start, end)
+    return pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'stock_id': stock_id,
+        'Trading_Volume': 1000,
+        'open': 100.0, 'max': 101.0, 'min': 99.0, 'close': 100.5,
+    })
+
+
+def use_loader(monkeypatch, loader_cls):
+    """讓共用 DataLoader 池改用假的 DataLoader"""
+    monkeypatch.setattr(loader, 'DataLoader', loader_cls)
+    monkeypatch.setattr(loader, '_pool', None)
+
+
+class FakeLoader:
+    """模擬 FinMind DataLoader，記錄每次請求的日期區間"""
+    calls = []
+
+    def login_by_token(self, api_token):
+        pass
+
+    def taiwan_stock_daily(self, stock_id, start_date, end_date):
+        FakeLoader.calls.append((stock_id, start_date, end_date))
+        last = min(pd.Timestamp(end_date), pd.Timestamp(store.latest_expected_trading_day()))
+        return make_bars(start_date, last, stock_id)
+
+
+def test_incremental_fetch(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    use_loader(monkeypatch, FakeLoader)
+    FakeLoader.calls = []
+
+    # 1. 首次抓取：整段區間
+    df1 = data.fetch_stock_data('2330', days=180)
+    assert len(FakeLoader.calls) == 1
+    assert not df1.empty
+
+    # 2. 第二次：本地已完整涵蓋，不應再呼叫 API
+    df2 = data.fetch_stock_data('2330', days=180)
+    assert len(FakeLoader.calls) == 1
+    assert len(df2) == len(df1)
+
+    # 3. 要求更長的歷史：只補抓前段缺口
+    data.fetch_stock_data('2330', days=365)
+    assert len(FakeLoader.calls) == 2
+    _, head_start, head_end = FakeLoader.calls[-1]
+    cov_start, _ = store.get_coverage('2330')
+    assert head_start == cov_start
+    assert head_end < df1['date'].iloc[0].strftime('%Y-%m-%d')
+
+
+def test_tail_gap_and_api_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    use_loader(monkeypatch, FakeLoader)
+    FakeLoader.calls = []
+
+    # 本地只有到 10 天前的資料
+    old_end = datetime.now() - timedelta(days=10)
+    old = make_bars(datetime.now() - timedelta(days=200), old_end)
+    old['date'] = pd.to_datetime(old['date'])
+    store.save_bars('2330', old, covered_from=(datetime.now() - timedelta(days=200)).strftime('%Y-%m-%d'))
+
+    ranges = store.missing_ranges('2330', (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d'),
+                                  datetime.now().strftime('%Y-%m-%d'))
+    assert len(ranges) == 1
+    assert ranges[0][0] > old['date'].iloc[-1].strftime('%Y-%m-%d')
+
+    # API 失敗時應回傳本地資料而非空表
+    class BrokenLoader(FakeLoader):
+        def taiwan_stock_daily(self, stock_id, start_date, end_date):
+            raise Exception("402 upper limit")
+
+    use_loader(monkeypatch, BrokenLoader)
+    df = data.fetch_stock_data('2330', days=180)
+    assert not df.empty
+    assert df['date'].iloc[-1] == old['date'].iloc[-1]
+
+    # API 恢復後只補抓尾段
+    use_loader(monkeypatch, FakeLoader)
+    df = data.fetch_stock_data('2330', days=180)
+    assert len(FakeLoader.calls) == 1
+    assert df['date'].is_unique
+    assert df['date'].iloc[-1].strftime('%Y-%m-%d') == store.latest_expected_trading_day()
+
+
+def test_latest_expected_trading_day():
+    # 2025-01-04 是週六
+    assert store.latest_expected_trading_day(datetime(2025, 1, 4, 10)) == '2025-01-03'
+    # 週一早上 06:00 -> 上週五
+    assert store.latest_expected_trading_day(datetime(2025, 1, 6, 6)) == '2025-01-03'
+    # 週一收盤後 -> 當天
+    assert store.latest_expected_trading_day(datetime(2025, 1, 6, 18)) == '2025-01-06'
+
+
+def test_latest_expected_trading_day_uses_taipei_time(monkeypatch):
+    # 台北 16:00 = UTC 08:00：容器時區為 UTC 時仍應預期當天的 K 棒
+    utc_now = datetime(2025, 1, 6, 8, tzinfo=timezone.utc)
+    assert store.latest_expected_trading_day(utc_now) == '2025-01-06'
+    # 台北週二 07:00 = UTC 週一 23:00 -> 週一
+    assert store.latest_expected_trading_day(datetime(2025, 1, 6, 23, tzinfo=timezone.utc)) == '2025-01-06'
+
+    class UTCClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return utc_now.astimezone(tz) if tz else utc_now.replace(tzinfo=None)
+
+    # 不傳 now 時依台北時間判斷，而非容器的系統時間
+    monkeypatch.setattr(store, 'datetime', UTCClock)
+    assert store.latest_expected_trading_day() == '2025-01-06'
+
+
+def test_market_day_fan_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+
+    def day_frame(date_str, stock_ids):
+        df = pd.concat([make_bars(date_str, date_str, sid) for sid in stock_ids], ignore_index=True)
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    # 2330 本地已涵蓋到 01-02；2317 只到 12-27 (有缺口)
+    for sid, end in [('2330', '2025-01-02'), ('2317', '2024-12-27')]:
+        bars = make_bars('2024-12-02', end, sid)
+        bars['date'] = pd.to_datetime(bars['date'])
+        store.save_bars(sid, bars, covered_from='2024-12-01')
+
+    written = store.save_market_day(day_frame('2025-01-03', ['2330', '2317', '2454']), '2025-01-03')
+    assert written == 2
+    assert store.get_coverage('2330')[1] == '2025-01-03'
+    assert store.get_coverage('2317')[1] == '2024-12-27'   # 有缺口 -> 不附加
+    assert store.get_coverage('2454') == ('2025-01-03', '2025-01-03')
+
+    # 01-06 休市：標記已檢查後，2330 不需要再補抓尾段
+    store.mark_market_checked('2025-01-06')
+    now = datetime(2025, 1, 7, 6)
+    assert store.missing_ranges('2330', '2024-12-01', '2025-01-07', now=now) == []
+    assert store.missing_ranges('2317', '2024-12-01', '2025-01-07', now=now) == [('2024-12-28', '2025-01-07')]
+
+
+def test_ingest_market_daily_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+
+    class NoBulkLoader(FakeLoader):
+        def taiwan_stock_daily(self, stock_id="", start_date="", end_date=""):
+            if not stock_id:
+                raise Exception("bulk query requires sponsor plan")
+            return super().taiwan_stock_daily(stock_id, start_date, end_date)
+
+    use_loader(monkeypatch, NoBulkLoader)
+    assert data.ingest_market_daily() is False
+    assert store.get_market_sync() is None
+
+
+def test_empty_tail_is_not_refetched(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    FakeLoader.calls = []
+
+    # 暫停交易 / 休市：尾段補抓沒有新資料
+    class EmptyTailLoader(FakeLoader):
+        def taiwan_stock_daily(self, stock_id, start_date, end_date):
+            FakeLoader.calls.append((stock_id, start_date, end_date))
+            return make_bars(start_date, datetime.now() - timedelta(days=10), stock_id)
+
+    use_loader(monkeypatch, EmptyTailLoader)
+    data.fetch_stock_data('2330', days=180)
+    data.fetch_stock_data('2330', days=180)
+    assert len(FakeLoader.calls) == 1
+    cov_end = store.get_coverage('2330')[1]
+    assert cov_end < store.latest_expected_trading_day()
+
+    # 之後恢復交易：從實際資料的最後一天接續補抓
+    later = datetime.now() + timedelta(days=7)
+    ranges = store.missing_ranges('2330', cov_end, later.strftime('%Y-%m-%d'), now=later)
+    assert ranges[0][0] == (pd.Timestamp(cov_end) + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def test_atomic_write_uses_unique_temp_files(tmp_path):
+    path = str(tmp_path / "cache" / "x.json")
+    seen = []
+
+    def write(tmp):
+        seen.append(tmp)
+        with open(tmp, "w") as f:
+            f.write("ok")
+
+    store._atomic_write(path, write)
+    store._atomic_write(path, write)
+    assert seen[0] != seen[1]
+
+    def broken(tmp):
+        raise OSError("disk full")
+
+    try:
+        store._atomic_write(path, broken)
+    except OSError:
+        pass
+    assert os.listdir(tmp_path / "cache") == ["x.json"]
+
+
+def test_reads_do_not_wait_for_store_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    df = make_bars('2025-01-02', '2025-01-10')
+    df['date'] = pd.to_datetime(df['date'])
+    store.save_bars('2330', df)
+    store.save_frame('revenue', '2330', pd.DataFrame({'revenue': [1, 2]}))
+
+    # 其他執行緒持有鎖 (例如正在寫入) 時，讀取仍可直接完成
+    held, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with store._lock:
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    held.wait(5)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(
+        (len(store.load_bars('2330')), len(store.load_frame('revenue', '2330')))))
+    reader.start()
+    reader.join(2)
+    release.set()
+    holder.join()
+    assert results == [(7, 2)]
@@ -0,0 +1,91 @@
+import sys
+import os
+import pandas as pd
+import logging
+from datetime import date, datetime
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import chips, store, disclosure
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def test_chips_periods():
+    # 週一~週四：上週的資料應已公布，不在公布期間
+    assert disclosure.chips_periods(date(2025, 10, 13)) == ('2025-W41', None)
+    assert disclosure.chips_periods(date(2025, 10, 16)) == ('2025-W41', None)
+    # 週五、週六：本週資料隨時可能公布
+    assert disclosure.chips_periods(date(2025, 10, 17)) == ('2025-W41', '2025-W42')
+    assert disclosure.chips_periods(date(2025, 10, 18)) == ('2025-W41', '2025-W42')
+    # 週日：本週資料應已公布
+    assert disclosure.chips_periods(date(2025, 10, 19)) == ('2025-W42', None)
+    # 週五休市時資料日期為週四，仍屬同一週
+    assert disclosure.chips_week('20251009') == disclosure.chips_week('20251010')
+
+
+def make_chips(last_friday, weeks=10):
+    dates = pd.date_range(end=last_friday, periods=weeks, freq='W-FRI')
+    return pd.DataFrame({
+        'Date': dates.strftime('%Y%m%d'),
+        'TotalShareholders': range(1000, 1000 + weeks),
+        'BigHand400_Pct': [70.0] * weeks,
+        'BigHand1000_Pct': [60.0] * weeks,
+    })
+
+
+def test_chips_cache_scrapes_once_per_week(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    pages = {'last_friday': '2025-10-10'}
+    calls = []
+
+    def fake_scrape(stock_id):
+        calls.append(stock_id)
+        return make_chips(pages['last_friday'])
+
+    monkeypatch.setattr(chips, '_scrape_chips', fake_scrape)
+
+    # 週一第一次：沒有快取，抓取並保存
+    df = chips.fetch_chips_data('2330', today=datetime(2025, 10, 13))
+    assert len(calls) == 1 and df['Date'].iloc[-1] == '20251010'
+
+    # 週一~週四：直接使用快取
+    for day in (13, 14, 15, 16):
+        df = chips.fetch_chips_data('2330', today=datetime(2025, 10, day))
+    assert len(calls) == 1 and len(df) == 10
+
+    # 週五公布前：抓取一次但沒有新資料，同一天不再重試
+    chips.fetch_chips_data('2330', today=datetime(2025, 10, 17))
+    chips.fetch_chips_data('2330', today=datetime(2025, 10, 17))
+    assert len(calls) == 2
+
+    # 週六已公布：取得本週資料，合併保留舊的歷史
+    pages['last_friday'] = '2025-10-17'
+    df = chips.fetch_chips_data('2330', today=datetime(2025, 10, 18))
+    assert len(calls) == 3 and df['Date'].iloc[-1] == '20251017' and len(df) == 11
+
+    # 下週一~週四：使用快取
+    chips.fetch_chips_data('2330', today=datetime(2025, 10, 20))
+    chips.fetch_chips_data('2330', today=datetime(2025, 10, 23))
+    assert len(calls) == 3
+
+
+def test_chips_cache_falls_back_on_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    store.save_frame('chips', '2330', make_chips('2025-10-03'))
+    calls = []
+
+    def failing_scrape(stock_id):
+        calls.append(stock_id)
+        return None
+
+    monkeypatch.setattr(chips, '_scrape_chips', failing_scrape)
+
+    # 快取落後一週：抓取失敗時使用快取，且不記錄為已檢查 (同一天可再重試)
+    df = chips.fetch_chips_data('2330', today=datetime(2025, 10, 14))
+    assert df['Date'].iloc[-1] == '20251003'
+    chips.fetch_chips_data('2330', today=datetime(2025, 10, 14))
+    assert len(calls) == 2
+    assert store.load_cache('chips_checked') is None
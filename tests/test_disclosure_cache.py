@@ -0,0 +1,99 @@
+import sys
+import os
+import pandas as pd
+import logging
+from datetime import date, datetime
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.data as data
+from core import store, disclosure
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def test_revenue_periods():
+    # 1~10 日：上月營收公布期間
+    assert disclosure.revenue_periods(date(2025, 3, 5)) == ('2025-01', '2025-02')
+    # 11 日之後：上月營收應已公布，不在公布期間
+    assert disclosure.revenue_periods(date(2025, 3, 11)) == ('2025-02', None)
+    # 跨年
+    assert disclosure.revenue_periods(date(2025, 1, 3)) == ('2024-11', '2024-12')
+
+
+def test_financial_periods():
+    # 年報期限 3/31 前：Q4 公布期間
+    assert disclosure.financial_periods(date(2025, 3, 20)) == ('2024-Q3', '2024-Q4')
+    # 4/20：年報已過期限，Q1 公布期間
+    assert disclosure.financial_periods(date(2025, 4, 20)) == ('2024-Q4', '2025-Q1')
+    # 6/10：Q1 已過期限，不在公布期間
+    assert disclosure.financial_periods(date(2025, 6, 10)) == ('2025-Q1', None)
+    # 11/14 當天仍在 Q3 公布期間
+    assert disclosure.financial_periods(date(2025, 11, 14)) == ('2025-Q2', '2025-Q3')
+
+
+def test_needs_refresh():
+    today = date(2025, 6, 10)
+    expected, pending = disclosure.financial_periods(today)
+    assert disclosure.needs_refresh('2025-Q1', expected, pending, '2025-06-01', today) is False
+    assert disclosure.needs_refresh('2024-Q4', expected, pending, '2025-06-01', today) is True
+    assert disclosure.needs_refresh('2024-Q4', expected, pending, '2025-06-10', today) is False
+    assert disclosure.needs_refresh(None, expected, pending, None, today) is True
+    # 查過但沒有資料 (ETF)，公布期間外不再查詢
+    assert disclosure.needs_refresh(None, expected, pending, '2025-06-01', today) is False
+
+
+def make_revenue(last_year, last_month, months=24):
+    end = pd.Timestamp(last_year, last_month, 1)
+    periods = pd.date_range(end=end, periods=months, freq='MS')
+    return pd.DataFrame({
+        'date': [(p + pd.DateOffset(months=1)).strftime('%Y-%m-%d') for p in periods],
+        'stock_id': '2330',
+        'revenue': range(1, months + 1),
+        'revenue_month': [p.month for p in periods],
+        'revenue_year': [p.year for p in periods],
+    })
+
+
+def test_revenue_cache_skips_api_outside_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    calls = []
+
+    def fake_call(method, **kwargs):
+        calls.append((method, kwargs))
+        today = datetime.now()
+        expected, pending = disclosure.revenue_periods(today)
+        year, month = map(int, (pending or expected).split('-'))
+        df = make_revenue(year, month)
+        return df[df['date'] >= kwargs['start_date']].reset_index(drop=True)
+
+    monkeypatch.setattr(data, 'finmind_call', fake_call)
+
+    df1 = data.fetch_monthly_revenue('2330')
+    assert len(calls) == 1
+    assert not df1.empty
+
+    # 同一天再次呼叫：不論是否在公布期間，都不應再查詢
+    df2 = data.fetch_monthly_revenue('2330')
+    assert len(calls) == 1
+    assert len(df2) == len(df1)
+
+
+def test_revenue_cache_window_when_api_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    # 快取落後 (最新為 4 個月前) 且有 4 年的資料
+    last = pd.Timestamp.now() - pd.DateOffset(months=4)
+    store.save_frame('revenue', '2330', make_revenue(last.year, last.month, months=48))
+
+    def broken_call(method, **kwargs):
+        raise Exception("402 upper limit")
+
+    monkeypatch.setattr(data, 'finmind_call', broken_call)
+
+    # 需要查詢但 API 失敗：回傳的快取與成功時一樣只包含 years 範圍內的資料
+    df = data.fetch_monthly_revenue('2330', years=1)
+    start_date = (pd.Timestamp.now() - pd.Timedelta(days=365)).strftime('%Y-%m-%d')
+    assert 0 < len(df) < 48
+    assert (df['date'] >= start_date).all()
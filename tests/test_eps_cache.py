@@ -0,0 +1,119 @@
+import sys
+import os
+import time
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import ai, store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def setup_fake(monkeypatch, tmp_path, results):
+    """以假的搜尋取代 Gemini，記錄呼叫次數"""
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(ai, '_cache_stats', {"hit": 0, "stale": 0, "miss": 0, "refresh": 0})
+    calls = []
+
+    def fake_request(stock_id, stock_name):
+        calls.append(stock_id)
+        return results.pop(0)
+
+    monkeypatch.setattr(ai, '_request_eps_forecast', fake_request)
+    return calls
+
+
+def age_entry(key, hours):
+    store.update_cache(ai.EPS_CACHE_NAME, lambda c: {**c, key: {**c[key], "fetched_at": time.time() - hours * 3600}})
+
+
+def test_hit_miss_and_period_key(monkeypatch, tmp_path):
+    calls = setup_fake(monkeypatch, tmp_path, [("2025 EPS: 10元", True), ("2025 EPS: 11元", True)])
+    assert ai.search_eps_forecast('2330', '台積電', period='2025-09') == "2025 EPS: 10元"
+    assert ai.search_eps_forecast('2330', '台積電', period='2025-09') == "2025 EPS: 10元"
+    assert calls == ['2330']
+    # 新的揭露期間 -> 重新搜尋
+    assert ai.search_eps_forecast('2330', '台積電', period='2025-10') == "2025 EPS: 11元"
+    assert calls == ['2330', '2330']
+    assert ai.get_cache_stats() == {"hit": 1, "stale": 0, "miss": 2, "refresh": 0}
+
+
+def test_failures_are_not_cached(monkeypatch, tmp_path):
+    calls = setup_fake(monkeypatch, tmp_path, [("EPS 搜尋失敗 (所有 model 額度已滿)", False), ("2025 EPS: 3元", True)])
+    assert ai.search_eps_forecast('3037', '欣興', period='2025-09').startswith("EPS 搜尋失敗")
+    assert ai.search_eps_forecast('3037', '欣興', period='2025-09') == "2025 EPS: 3元"
+    assert len(calls) == 2
+
+
+def test_stale_while_revalidate(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai, 'EPS_CACHE_TTL_HOURS', 1)
+    monkeypatch.setattr(ai, 'EPS_CACHE_STALE_HOURS', 24)
+    calls = setup_fake(monkeypatch, tmp_path, [("old", True), ("new", True), ("error", False)])
+    ai.search_eps_forecast('2317', '鴻海', period='2025-09')
+
+    age_entry('2317:2025-09', 5)
+    assert ai.search_eps_forecast('2317', '鴻海', period='2025-09') == "old"
+    for _ in range(100):
+        if not ai._refreshing and store.load_cache(ai.EPS_CACHE_NAME)['2317:2025-09']['text'] == "new":
+            break
+        time.sleep(0.01)
+    assert ai.search_eps_forecast('2317', '鴻海', period='2025-09') == "new"
+    assert ai.get_cache_stats()["refresh"] == 1
+
+    # 超過 stale 期間 -> 同步搜尋，失敗時回傳舊結果
+    age_entry('2317:2025-09', 48)
+    assert ai.search_eps_forecast('2317', '鴻海', period='2025-09') == "new"
+    assert len(calls) == 3
+
+
+
+def test_parse_batch_sections():
+    text = """### [2330]
+2025 EPS: 60元 (調升)
+Source: [工商時報](https://a)
+
+## **[2317]** 鴻海
+暫無 EPS 預估資料
+
+### [9999]
+2025 EPS: 1元
+
+### [3037]
+"""
+    sections = ai.parse_batch_sections(text, ['2330', '2317', '3037'])
+    assert sections == {'2330': "2025 EPS: 60元 (調升)\nSource: [工商時報](https://a)", '2317': "暫無 EPS 預估資料"}
+
+    # 區段內容中的標題 (不是要求的股票代號) 不會切斷區段
+    text = "### [2330]\n## 2025 EPS\n2025 EPS: 10元\n### [2317]\n## [2026] 預估\n2026 EPS: 12元"
+    sections = ai.parse_batch_sections(text, ['2330', '2317'])
+    assert sections == {'2330': "## 2025 EPS\n2025 EPS: 10元", '2317': "## [2026] 預估\n2026 EPS: 12元"}
+    # 模型省略方括號時仍可拆開
+    text = "### 2330\n## 2025 EPS\n2025 EPS: 10元\n### 2317\n2025 EPS: 5元"
+    sections = ai.parse_batch_sections(text, ['2330', '2317'])
+    assert sections == {'2330': "## 2025 EPS\n2025 EPS: 10元", '2317': "2025 EPS: 5元"}
+
+
+def test_batch_mode_with_single_fallback(monkeypatch, tmp_path):
+    calls = setup_fake(monkeypatch, tmp_path, [("single 3037", True)])
+    batches = []
+
+    def fake_batch(stocks):
+        batches.append([sid for sid, _ in stocks])
+        # 3037 的區段缺少 -> 單檔搜尋
+        return {sid: f"batch {sid}" for sid, _ in stocks if sid != '3037'}
+
+    monkeypatch.setattr(ai, '_request_eps_batch', fake_batch)
+    ai._save_forecast('2454', '2025-09', "cached 2454")
+    stocks = [('2330', '台積電', '2025-09'), ('2454', '聯發科', '2025-09'), ('3037', '欣興', '2025-09'),
+              ('2317', '鴻海', '2025-09'), ('2308', '台達電', '2025-09')]
+    results = ai.search_eps_forecasts(stocks, batch_size=2)
+    assert results == ["batch 2330", "cached 2454", "single 3037", "batch 2317", "batch 2308"]
+    assert sorted(batches) == [['2317', '2308'], ['2330', '3037']]
+    assert calls == ['3037']
+
+    # 第二次全部命中快取，不再搜尋
+    assert ai.search_eps_forecasts(stocks, batch_size=2) == results
+    assert len(batches) == 2
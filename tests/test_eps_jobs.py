@@ -0,0 +1,137 @@
+import sys
+import os
+import time
+import threading
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import ai, store, eps_jobs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def setup_fake(monkeypatch, tmp_path, ok=True):
+    """以假的搜尋與推播取代 Gemini / LINE"""
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    searched, pushed = [], []
+
+    def fake_request(stock_id, stock_name):
+        searched.append(stock_id)
+        return (f"2025 EPS: {stock_id}", True) if ok else ("EPS 搜尋失敗", False)
+
+    def fake_batch(stocks):
+        searched.extend(sid for sid, _ in stocks)
+        return {sid: f"2025 EPS: {sid}" for sid, _ in stocks} if ok else {}
+
+    monkeypatch.setattr(ai, '_request_eps_forecast', fake_request)
+    monkeypatch.setattr(ai, '_request_eps_batch', fake_batch)
+    monkeypatch.setattr(eps_jobs, 'send_line_notification', pushed.append)
+    return searched, pushed
+
+
+def test_report_does_not_wait_and_push_follows(monkeypatch, tmp_path):
+    searched, pushed = setup_fake(monkeypatch, tmp_path)
+    ai._save_forecast('2317', '2025-08', "2025 EPS: 舊的")
+
+    assert eps_jobs.forecast_for_report('2330', '台積電', '2025-09') == "法人 EPS 預估搜尋中，完成後另行推播"
+    text = eps_jobs.forecast_for_report('2317', '鴻海', '2025-09')
+    assert text.startswith("[先前的法人預估 (2025-08)") and text.endswith("2025 EPS: 舊的")
+    assert searched == []
+    # 同一檔同一期間不重複排入
+    assert not eps_jobs.enqueue('2330', '台積電', '2025-09')
+    assert [job['stock_id'] for _, job in eps_jobs.pending_jobs()] == ['2330', '2317']
+
+    done = eps_jobs.process_jobs(batch_size=5)
+    assert [job['stock_id'] for job, _ in done] == ['2330', '2317']
+    assert sorted(searched) == ['2317', '2330']
+    assert len(pushed) == 1 and "【2330 台積電】 (2025-09 營收)\n2025 EPS: 2330" in pushed[0]
+    assert eps_jobs.pending_jobs() == []
+
+    # 之後的報告直接使用新的預估
+    assert eps_jobs.forecast_for_report('2330', '台積電', '2025-09') == "2025 EPS: 2330"
+    assert eps_jobs.process_jobs() == []
+
+
+def test_stale_entry_is_searched_again_before_push(monkeypatch, tmp_path):
+    searched, pushed = setup_fake(monkeypatch, tmp_path)
+    refreshed = []
+    monkeypatch.setattr(ai, '_refresh_in_background', lambda *args: refreshed.append(args))
+
+    # 超過新鮮期、仍在 stale 期間內的快取
+    ai._save_forecast('2330', '2025-09', "OLD 2025 EPS: 10")
+    aged = time.time() - (ai.EPS_CACHE_TTL_HOURS + 1) * 3600
+    store.update_cache(ai.EPS_CACHE_NAME, lambda c: {**c, '2330:2025-09': {**c['2330:2025-09'], 'fetched_at': aged}})
+
+    text = eps_jobs.forecast_for_report('2330', '台積電', '2025-09')
+    assert text.endswith("OLD 2025 EPS: 10")
+    done = eps_jobs.process_jobs()
+    assert searched == ['2330'] and refreshed == []
+    assert [text for _, text in done] == ["2025 EPS: 2330"]
+    assert len(pushed) == 1 and "2025 EPS: 2330" in pushed[0] and "OLD" not in pushed[0]
+
+
+def test_failed_jobs_retry_then_give_up(monkeypatch, tmp_path):
+    searched, pushed = setup_fake(monkeypatch, tmp_path, ok=False)
+    monkeypatch.setattr(eps_jobs, 'EPS_JOB_MAX_ATTEMPTS', 2)
+    eps_jobs.enqueue('3037', '欣興', '2025-09')
+
+    assert eps_jobs.process_jobs() == []
+    assert eps_jobs.pending_jobs()[0][1]['attempts'] == 1
+    assert eps_jobs.process_jobs() == []
+    assert eps_jobs.pending_jobs() == []
+    assert store.load_cache(eps_jobs.EPS_JOBS_NAME)['3037:2025-09']['status'] == "failed"
+    assert pushed == [] and searched == ['3037', '3037']
+
+
+def test_background_worker(monkeypatch, tmp_path):
+    searched, pushed = setup_fake(monkeypatch, tmp_path)
+    assert not eps_jobs.start_worker()
+    eps_jobs.enqueue('2454', '聯發科', '2025-09')
+    assert eps_jobs.start_worker()
+    eps_jobs._worker.join(timeout=10)
+    assert searched == ['2454'] and len(pushed) == 1
+    assert eps_jobs.pending_jobs() == []
+
+
+def test_concurrent_runs_claim_each_job_once(monkeypatch, tmp_path):
+    searched, pushed = setup_fake(monkeypatch, tmp_path)
+    original = ai._request_eps_batch
+
+    def slow_batch(stocks):
+        time.sleep(0.2)
+        return original(stocks)
+
+    monkeypatch.setattr(ai, '_request_eps_batch', slow_batch)
+    for sid in ('2330', '2317', '2454'):
+        eps_jobs.enqueue(sid, '測試', '2025-09')
+
+    # 背景執行緒與 /process_eps_jobs 同時處理：每檔只搜尋、推播一次
+    runs = [threading.Thread(target=eps_jobs.process_jobs) for _ in range(2)]
+    for t in runs:
+        t.start()
+    for t in runs:
+        t.join()
+    assert sorted(searched) == ['2317', '2330', '2454']
+    assert len(pushed) == 1
+    # 處理中的工作不會再排入
+    assert eps_jobs.pending_jobs() == []
+
+
+def test_expired_lease_is_claimed_again(monkeypatch, tmp_path):
+    searched, pushed = setup_fake(monkeypatch, tmp_path)
+    eps_jobs.enqueue('3037', '欣興', '2025-09')
+    claimed = eps_jobs._claim_jobs()
+    assert [key for key, _ in claimed] == ['3037:2025-09']
+    # 認領的 process 停住：租約內不可再認領，也不重複排入
+    assert eps_jobs.pending_jobs() == [] and eps_jobs.process_jobs() == []
+    assert not eps_jobs.enqueue('3037', '欣興', '2025-09')
+
+    expired = time.time() - 1
+    store.update_cache(eps_jobs.EPS_JOBS_NAME,
+                       lambda jobs: {k: {**job, 'lease_until': expired} for k, job in jobs.items()})
+    done = eps_jobs.process_jobs()
+    assert [job['stock_id'] for job, _ in done] == ['3037'] and searched == ['3037']
+    assert store.load_cache(eps_jobs.EPS_JOBS_NAME)['3037:2025-09']['status'] == "done"
@@ -0,0 +1,124 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import fundamentals
+from core.strategy import analyze_financials
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+KEYS = ['gm', 'om', 'nm', 'gm_qoq', 'om_qoq', 'nm_qoq', 'gm_yoy', 'om_yoy', 'nm_yoy',
+        'eps', 'eps_qoq', 'eps_yoy', 'eps_ytd', 'eps_ytd_last_year', 'eps_ytd_growth']
+
+
+def reference_financials(df_fin, last_processed=None):
+    """原本逐檔的 analyze_financials (pivot_table + 以位置 -2 / -5 取上一季、去年同季)，資料連續時兩者相同"""
+    df_pivot = df_fin.pivot_table(index='date', columns='type', values='value', aggfunc='first').sort_index()
+    last_dt = pd.to_datetime(df_pivot.index[-1])
+    year, quarter = last_dt.year, (last_dt.month - 1) // 3 + 1
+    current_q_str = f"{year}-Q{quarter}"
+    if last_processed and current_q_str <= last_processed:
+        return None
+    latest = df_pivot.iloc[-1]
+
+    def get_margin(row):
+        r = row.get('Revenue', 0)
+        return (row.get('GrossProfit', 0) / r * 100, row.get('OperatingIncome', 0) / r * 100,
+                row.get('IncomeAfterTaxes', 0) / r * 100) if r > 0 else (0, 0, 0)
+
+    res = dict(zip(('gm', 'om', 'nm'), get_margin(latest)))
+    eps = latest.get('EPS', 0)
+    for label, idx in (('qoq', -2), ('yoy', -5)):
+        diff, growth = (0, 0, 0), 0
+        if len(df_pivot) >= -idx:
+            prev = df_pivot.iloc[idx]
+            diff = [a - b for a, b in zip(get_margin(latest), get_margin(prev))]
+            if prev.get('EPS', 0) > 0:
+                growth = (eps - prev['EPS']) / prev['EPS'] * 100
+        res.update({f"{k}_{label}": d for k, d in zip(('gm', 'om', 'nm'), diff)}, **{f"eps_{label}": growth})
+    dates = pd.to_datetime(df_fin['date'])
+    is_eps = df_fin['type'] == 'EPS'
+    ytd = df_fin[is_eps & (dates.dt.year == year) & (dates <= last_dt)]['value'].sum()
+    ytd_ly = df_fin[is_eps & (dates.dt.year == year - 1) & (dates.dt.month <= last_dt.month)]['value'].sum()
+    res.update(eps=eps, eps_ytd=ytd, eps_ytd_last_year=ytd_ly,
+               eps_ytd_growth=(ytd - ytd_ly) / ytd_ly * 100 if ytd_ly > 0 else 0)
+    return {"quarter_str": current_q_str, **res}
+
+
+def make_financials(rng, stock_id, n_quarters, end='2025-06-30', drop=0.0):
+    """季財報長表格式 (單季數值，含一個不使用的科目)"""
+    quarters = pd.period_range(end=pd.Period(end, freq='Q'), periods=n_quarters, freq='Q')
+    keep = rng.random(n_quarters) >= drop
+    keep[-1] = True
+    rows = []
+    for q in quarters[keep]:
+        revenue = float(rng.choice([rng.uniform(1e8, 1e10), 0.0], p=[0.95, 0.05]))
+        values = {
+            'Revenue': revenue,
+            'GrossProfit': revenue * rng.uniform(0.1, 0.6),
+            'OperatingIncome': revenue * rng.uniform(-0.1, 0.4),
+            'IncomeAfterTaxes': revenue * rng.uniform(-0.1, 0.3),
+            'EPS': round(float(rng.normal(2, 2)), 2),
+            'CostOfGoodsSold': revenue * 0.5,
+        }
+        date = q.end_time.strftime('%Y-%m-%d')
+        rows += [{'date': date, 'stock_id': stock_id, 'type': t, 'value': v, 'origin_name': t} for t, v in values.items()]
+    return pd.DataFrame(rows)
+
+
+def test_financial_table_matches_per_stock():
+    rng = np.random.default_rng(3)
+    frames = [make_financials(rng, f"{5000 + k}", int(rng.integers(1, 14))) for k in range(60)]
+    df_all = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=0)
+
+    table = fundamentals.financial_table(df_all).set_index('stock_id')
+    assert len(table) == 60
+    for df in frames:
+        sid = df['stock_id'].iloc[0]
+        ref = reference_financials(df)
+        row = table.loc[sid]
+        assert row['quarter_str'] == ref['quarter_str']
+        for key in KEYS:
+            assert np.isclose(row[key], ref[key]), (sid, key, row[key], ref[key])
+        assert fundamentals.financial_result(row) == analyze_financials(df)
+
+
+def test_missing_quarters_do_not_misalign():
+    rng = np.random.default_rng(4)
+    df = make_financials(rng, '2330', 9)
+    dates = sorted(df['date'].unique())
+    # 去掉 2024-Q4 與 2025-Q1：上一季不存在，去年同季 (2024-Q2) 仍可比較
+    gapped = df[~df['date'].isin(['2024-12-31', '2025-03-31'])].reset_index(drop=True)
+    full = analyze_financials(df)
+    res = analyze_financials(gapped)
+    assert dates[-1] == '2025-06-30'
+    assert res['quarter_str'] == '2025-Q2'
+    assert res['gm_qoq'] == 0 and res['eps_qoq'] == 0
+    for key in ('gm_yoy', 'om_yoy', 'nm_yoy', 'eps_yoy', 'eps_ytd_last_year'):
+        assert np.isclose(res[key], full[key])
+    eps = gapped[gapped['type'] == 'EPS'].set_index('date')['value']
+    assert np.isclose(res['eps_ytd'], eps['2025-06-30'])
+
+
+def test_does_not_mutate_input_and_skips_processed():
+    rng = np.random.default_rng(5)
+    df = pd.concat([make_financials(rng, '2330', 6), make_financials(rng, '2317', 5, end='2025-03-31')], ignore_index=True)
+    before = df.copy()
+    table = fundamentals.financial_table(df, last_processed={'2330': '2025-Q2', '2317': '2024-Q4'})
+    pd.testing.assert_frame_equal(df, before)
+    assert table['stock_id'].tolist() == ['2317']
+    assert analyze_financials(df[df['stock_id'] == '2330'], '2025-Q2') is None
+    assert fundamentals.financial_table(pd.DataFrame()).empty
+
+
+if __name__ == "__main__":
+    test_financial_table_matches_per_stock()
+    test_missing_quarters_do_not_misalign()
+    test_does_not_mutate_input_and_skips_processed()
+    print("✅ Batch financials match per-stock analysis")
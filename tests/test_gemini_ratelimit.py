@@ -0,0 +1,190 @@
+import sys
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import ai
+from core.ratelimit import TokenBucket, ModelLimiter, CircuitBreaker
+from scripts.fake_gemini import FakeGemini, start_server
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FakeClock:
+    """以假時鐘取代 time.monotonic / time.sleep (sleep 直接推進時間)"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_burst_then_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock, clock.sleep)
+    waits = [bucket.acquire() for _ in range(61)]
+    assert waits[:60] == [0.0] * 60
+    assert abs(waits[60] - 1.0) < 1e-9
+
+    # 實際用量比預估少時退還額度
+    bucket.adjust(-1)
+    assert bucket.acquire() == 0.0
+
+
+def test_model_limiter_pause_and_tokens():
+    clock = FakeClock()
+    limiter = ModelLimiter(rpm=100, tpm=600, clock=clock, sleep=clock.sleep)
+    limiter.pause(5)
+    assert limiter.paused_for() == 5
+    assert limiter.acquire(600) == 5
+    # token 額度用完：等 1000 token 的補充時間 (600/分 -> 10/秒)
+    assert abs(limiter.acquire(100) - 10.0) < 1e-9
+
+
+def use_fake_server(monkeypatch, **kwargs):
+    state = FakeGemini(latency=kwargs.pop('latency', 0.0), **kwargs)
+    server, base_url = start_server(state)
+    monkeypatch.setenv("GEMINI_API_KEY", "fake-key")
+    monkeypatch.setattr(ai, 'GEMINI_BASE_URL', base_url)
+    monkeypatch.setattr(ai, '_limiters', {})
+    monkeypatch.setattr(ai, '_breakers', {})
+    monkeypatch.setattr(ai, '_health', {})
+    return state, server
+
+
+def test_concurrent_requests_without_fixed_delay(monkeypatch):
+    state, server = use_fake_server(monkeypatch, latency=0.2)
+    monkeypatch.setattr(ai, '_gemini_slots', ai.threading.BoundedSemaphore(8))
+    monkeypatch.setattr(ai, 'GEMINI_RPM', 600)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda k: ai._request_eps_forecast(str(k), "測試"), range(16)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    assert all(ok for _, ok in results)
+    assert state.stats["max_inflight"] > 1
+    assert elapsed < 16 * 0.2
+
+
+def test_fallback_order_and_retry_after(monkeypatch):
+    # 主要 model 一律 503 (retry-after 1 秒)：先重試一次，再改用備援 model
+    state, server = use_fake_server(monkeypatch, unavailable=[ai.SEARCH_CAPABLE_MODELS[0]])
+    monkeypatch.setattr(ai, 'GEMINI_MAX_RETRIES', 1)
+    monkeypatch.setattr(ai, 'GEMINI_MAX_RETRY_WAIT', 5)
+    try:
+        text, ok = ai._request_eps_forecast("2330", "台積電")
+    finally:
+        server.shutdown()
+    assert ok and ai.SEARCH_CAPABLE_MODELS[1] in text
+    assert state.stats["503"] == 2
+    assert ai._get_limiter(ai.SEARCH_CAPABLE_MODELS[0]).paused_for() > 0
+
+
+def test_long_retry_after_switches_model(monkeypatch):
+    state, server = use_fake_server(monkeypatch, rpm={ai.SEARCH_CAPABLE_MODELS[0]: 1})
+    try:
+        first, _ = ai._request_eps_forecast("2330", "台積電")
+        second, ok = ai._request_eps_forecast("2317", "鴻海")
+    finally:
+        server.shutdown()
+    assert ai.SEARCH_CAPABLE_MODELS[0] in first
+    assert ok and ai.SEARCH_CAPABLE_MODELS[1] in second
+    assert state.stats["429"] == 1
+
+
+def test_open_breaker_skips_model_and_reorders(monkeypatch):
+    state, server = use_fake_server(monkeypatch, unavailable=[ai.SEARCH_CAPABLE_MODELS[0]])
+    monkeypatch.setattr(ai, 'GEMINI_MAX_RETRIES', 0)
+    try:
+        for sid in ("2330", "2317", "3037"):
+            text, ok = ai._request_eps_forecast(sid, "測試")
+            assert ok and ai.SEARCH_CAPABLE_MODELS[1] in text
+    finally:
+        server.shutdown()
+    # 第一次 503 後熔斷，之後不再送出請求到主要 model
+    assert state.stats["503"] == 1
+    health = ai.get_model_health()
+    assert health["order"] == [ai.SEARCH_CAPABLE_MODELS[1], ai.SEARCH_CAPABLE_MODELS[0]]
+    primary = health["models"][ai.SEARCH_CAPABLE_MODELS[0]]
+    assert primary["state"] == CircuitBreaker.OPEN and primary["quota"] == 1 and primary["reopens_in"] > 0
+    assert health["models"][ai.SEARCH_CAPABLE_MODELS[1]]["success_rate"] == 1.0
+
+
+def test_circuit_breaker_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker(cooldown=10, max_cooldown=25, clock=clock)
+    breaker.record_failure()
+    assert not breaker.allow() and breaker.remaining() == 10
+    clock.sleep(10)
+    # 冷卻結束只放行一個試探請求
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.remaining() == 20
+    clock.sleep(20)
+    assert breaker.allow()
+    breaker.record_failure(retry_after=40)
+    assert breaker.remaining() == 40
+    clock.sleep(40)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_unhealthy_model_moves_back():
+    base = {"quota": 0, "error": 0, "max_ms": 0, "last_error": None, "state": CircuitBreaker.CLOSED, "reopens_in": 0}
+    first, second = ai.SEARCH_CAPABLE_MODELS[:2]
+    slow = {first: {**base, "calls": 10, "ok": 10, "success_rate": 1.0, "avg_ms": 9000.0},
+            second: {**base, "calls": 10, "ok": 10, "success_rate": 1.0, "avg_ms": 2000.0}}
+    assert ai._model_order(slow)[:2] == [second, first]
+    failing = {first: {**base, "calls": 10, "ok": 3, "success_rate": 0.3, "avg_ms": 1000.0},
+               second: {**base, "calls": 0, "ok": 0, "success_rate": None, "avg_ms": None}}
+    assert ai._model_order(failing)[:2] == [second, first]
+    few = {first: {**base, "calls": 2, "ok": 0, "success_rate": 0.0, "avg_ms": 1000.0},
+           second: {**base, "calls": 0, "ok": 0, "success_rate": None, "avg_ms": None}}
+    assert ai._model_order(few)[:2] == [first, second]
+
+
+def test_batch_request_against_fake_server(monkeypatch):
+    state, server = use_fake_server(monkeypatch)
+    try:
+        sections = ai._request_eps_batch([('2330', '台積電'), ('2317', '鴻海'), ('3037', '欣興')])
+    finally:
+        server.shutdown()
+    assert set(sections) == {'2330', '2317', '3037'}
+    assert state.stats["ok"] == 1
+
+
+def test_client_is_shared_and_rebuilt_on_change(monkeypatch):
+    monkeypatch.setattr(ai, '_client', None)
+    monkeypatch.setenv("GEMINI_API_KEY", "key-1")
+    first = ai.get_client()
+    assert ai.get_client() is first
+    monkeypatch.setenv("GEMINI_API_KEY", "key-2")
+    assert ai.get_client() is not first
+    monkeypatch.delenv("GEMINI_API_KEY")
+    assert ai.get_client() is None
+    assert ai._generate("prompt", "test", 100) == ("無法執行 EPS 搜尋 (Missing API Key)", False)
+
+
+def test_streaming_request_against_fake_server(monkeypatch):
+    state, server = use_fake_server(monkeypatch)
+    chunks = []
+    try:
+        text, ok = ai._generate(ai._eps_prompt("2330", "台積電"), "2330", 100, stream=True, on_chunk=chunks.append)
+    finally:
+        server.shutdown()
+    assert ok and len(chunks) == 2
+    assert text == "".join(chunks).strip()
+    assert state.stats["ok"] == 1
@@ -0,0 +1,84 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.indicators import sma, stochastic, compute_indicators
+from core.analysis import calculate_technical_indicators
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_prices(seed, n=300):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 2, n))
+    return pd.DataFrame({
+        'date': pd.bdate_range('2024-01-01', periods=n),
+        'max': close + rng.uniform(0, 2, n),
+        'min': close - rng.uniform(0, 2, n),
+        'close': close,
+    })
+
+
+def test_parity_with_ta():
+    """與 ta 套件 SMAIndicator / StochasticOscillator 的結果一致"""
+    ta_momentum = pytest.importorskip("ta.momentum")
+    ta_trend = pytest.importorskip("ta.trend")
+
+    for seed in range(5):
+        df = make_prices(seed)
+        ours = compute_indicators(df['max'].to_numpy(), df['min'].to_numpy(), df['close'].to_numpy())
+        for n in (5, 20, 60):
+            expected = ta_trend.SMAIndicator(close=df['close'], window=n).sma_indicator().to_numpy()
+            np.testing.assert_allclose(ours[f"MA{n}"], expected, rtol=1e-9, equal_nan=True)
+
+        kd = ta_momentum.StochasticOscillator(high=df['max'], low=df['min'], close=df['close'], window=9, smooth_window=3)
+        np.testing.assert_allclose(ours['K'], kd.stoch().to_numpy(), rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(ours['D'], kd.stoch_signal().to_numpy(), rtol=1e-9, equal_nan=True)
+
+
+def test_parity_with_pandas_rolling_and_nan():
+    df = make_prices(42, 100)
+    df.loc[30, 'close'] = np.nan
+    expected = df['close'].rolling(20).mean().to_numpy()
+    np.testing.assert_allclose(sma(df['close'].to_numpy(), 20), expected, rtol=1e-9, equal_nan=True)
+
+
+def test_stochastic_parity_with_pandas_rolling():
+    """單獨呼叫 stochastic 的 K/D 與 pandas rolling 計算的結果一致 (不需要 ta 套件)"""
+    df = make_prices(7, 100)
+    lowest = df['min'].rolling(9).min()
+    highest = df['max'].rolling(9).max()
+    expected_k = 100 * (df['close'] - lowest) / (highest - lowest)
+    expected_d = expected_k.rolling(3).mean()
+
+    k, d = stochastic(df['max'].to_numpy(), df['min'].to_numpy(), df['close'].to_numpy())
+    np.testing.assert_allclose(k, expected_k.to_numpy(), rtol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(d, expected_d.to_numpy(), rtol=1e-9, equal_nan=True)
+
+
+def test_matrix_matches_per_stock():
+    """2-D (股票 × 日期) 一次計算的結果需與逐檔計算相同"""
+    frames = [make_prices(seed, 120) for seed in range(4)]
+    high = np.vstack([f['max'].to_numpy() for f in frames])
+    low = np.vstack([f['min'].to_numpy() for f in frames])
+    close = np.vstack([f['close'].to_numpy() for f in frames])
+
+    panel = compute_indicators(high, low, close)
+    for i, f in enumerate(frames):
+        single = compute_indicators(f['max'].to_numpy(), f['min'].to_numpy(), f['close'].to_numpy())
+        for key, values in single.items():
+            np.testing.assert_allclose(panel[key][i], values, rtol=1e-12, equal_nan=True)
+
+
+def test_calculate_technical_indicators_fills_leading_values():
+    df = calculate_technical_indicators(make_prices(1, 80))
+    assert (df.loc[:58, 'MA60'] == 0).all()
+    assert df.loc[59, 'MA60'] == pytest.approx(df['close'].iloc[:60].mean())
+    assert not df[['MA5', 'MA20', 'MA60', 'K', 'D']].isna().any().any()
@@ -1,5 +1,6 @@
 import sys
 import os
+import numpy as np
 import pandas as pd
 import logging
 from datetime import datetime
@@ -68,7 +69,48 @@ def test_schedule_logic():
     logger.info(f"Feb Run (Data Feb): Monthly should be None. Result: {res_skip_m['monthly']}")
     assert res_skip_m['monthly'] is None
 
+def reference_inertia(df, time_type="日線"):
+    """原本逐列 (subset.loc[i]) 的實作，作為向量化版本的對照組"""
+    if df.empty or len(df) < 2:
+        return {"state": "盤整/無訊號", "count": 0, "trigger_dates": [], "description": f"{time_type}慣性沒改變"}
+    subset = df.tail(60).copy().reset_index(drop=True)
+    state, count, dates = "盤整/無訊號", 0, []
+    for i in range(1, len(subset)):
+        t1, t2 = subset.loc[i], subset.loc[i-1]
+        d = pd.to_datetime(t1['date']).strftime('%Y/%m/%d')
+        if (t1['max'] > t2['max']) and (t1['min'] > t2['min']) and (t1['close'] > t2['close']):
+            new_state = "慣性向上"
+        elif (t1['max'] < t2['max']) and (t1['min'] < t2['min']) and (t1['close'] < t2['close']):
+            new_state = "慣性向下"
+        else:
+            continue
+        if state == new_state:
+            count += 1
+            dates.append(d)
+        else:
+            state, count, dates = new_state, 1, [d]
+    if state == "盤整/無訊號":
+        return {"state": state, "count": 0, "trigger_dates": [], "description": f"{time_type}慣性沒改變"}
+    dates_str = f" [{', '.join(dates)}]" if dates else ""
+    return {"state": state, "count": count, "trigger_dates": dates,
+            "description": f"{time_type}{state} (連續 {count} 次){dates_str}"}
+
+def test_inertia_matches_reference():
+    """向量化版本需與逐列實作的輸出完全相同"""
+    rng = np.random.default_rng(7)
+    for trial in range(200):
+        n = int(rng.integers(2, 120))
+        close = 100 + np.cumsum(rng.integers(-3, 4, n))
+        df = pd.DataFrame({
+            'date': pd.bdate_range('2024-01-01', periods=n),
+            'max': close + rng.integers(0, 3, n),
+            'min': close - rng.integers(0, 3, n),
+            'close': close,
+        })
+        assert analyze_inertia_with_state(df, "週線") == reference_inertia(df, "週線"), f"trial {trial}"
+
 if __name__ == "__main__":
     test_inertia_state()
+    test_inertia_matches_reference()
     test_schedule_logic()
     print("All tests passed!")
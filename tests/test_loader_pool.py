@@ -0,0 +1,97 @@
+import sys
+import os
+import threading
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.loader as loader
+from core.loader import LoaderPool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CountingLoader:
+    """模擬 DataLoader：計算登入次數，token 過期時回傳 401"""
+    instances = 0
+    logins = 0
+    expired = False
+
+    def __init__(self):
+        CountingLoader.instances += 1
+
+    def login_by_token(self, api_token):
+        CountingLoader.logins += 1
+
+    def taiwan_stock_info(self):
+        if CountingLoader.expired:
+            CountingLoader.expired = False
+            raise Exception("401 Unauthorized: token expired")
+        return "ok"
+
+
+def reset():
+    CountingLoader.instances = 0
+    CountingLoader.logins = 0
+    CountingLoader.expired = False
+
+
+def test_login_once_and_reuse(monkeypatch):
+    monkeypatch.setattr(loader, 'DataLoader', CountingLoader)
+    reset()
+    pool = LoaderPool(token="dummy", max_size=2)
+
+    for _ in range(10):
+        assert pool.call('taiwan_stock_info') == "ok"
+
+    # 依序呼叫只需要一個 DataLoader、登入一次
+    assert CountingLoader.instances == 1
+    assert CountingLoader.logins == 1
+    stats = pool.get_stats()
+    assert stats['taiwan_stock_info']['count'] == 10
+    assert stats['login']['count'] == 1
+
+
+def test_relogin_on_auth_failure(monkeypatch):
+    monkeypatch.setattr(loader, 'DataLoader', CountingLoader)
+    reset()
+    pool = LoaderPool(token="dummy", max_size=2)
+    pool.call('taiwan_stock_info')
+
+    CountingLoader.expired = True
+    assert pool.call('taiwan_stock_info') == "ok"
+    assert CountingLoader.logins == 2
+    assert pool.get_stats()['taiwan_stock_info']['errors'] == 1
+
+
+def test_concurrent_access_bounded(monkeypatch):
+    monkeypatch.setattr(loader, 'DataLoader', CountingLoader)
+    reset()
+    pool = LoaderPool(token="dummy", max_size=3)
+
+    threads = [threading.Thread(target=lambda: [pool.call('taiwan_stock_info') for _ in range(20)]) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert CountingLoader.instances <= 3
+    assert pool.get_stats()['taiwan_stock_info']['count'] == 160
+
+
+def test_auth_error_detection():
+    class HTTPError(Exception):
+        def __init__(self, status):
+            super().__init__(f"HTTP {status}: token quota")
+            self.response = type("Response", (), {"status_code": status})()
+
+    assert loader._is_auth_error(Exception("401 Unauthorized: token expired"))
+    assert loader._is_auth_error(Exception("<Response [403]>"))
+    assert loader._is_auth_error(Exception("FinMind API unexpected response: Token is invalid"))
+    assert loader._is_auth_error(HTTPError(401))
+    # 訊息中提到 token 但不是授權錯誤：不重新登入
+    assert not loader._is_auth_error(HTTPError(402))
+    assert not loader._is_auth_error(Exception("FinMind API unexpected response: Requests reach the upper limit for this token"))
+    assert not loader._is_auth_error(Exception("Expecting value: unexpected token at line 1 column 1"))
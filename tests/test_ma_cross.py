@@ -0,0 +1,106 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.strategy import analyze_ma_cross, ma_trigger_price, moving_average
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def reference_ma_cross(df):
+    """原本逐列 (subset.loc[i]) 的 MA20/MA60 狀態機，作為陣列版本的對照組"""
+    res = {"state_desc": "無交叉訊號", "cross_date": None, "key_price": None, "key_price_desc": None}
+    df = df.reset_index(drop=True)
+    subset = df.tail(90).copy().reset_index(drop=True)
+    state, last_confirmed, obs, cross_row, rng_idx = "Neutral", "Neutral", 0, None, []
+    for i in range(1, len(subset)):
+        row, prev = subset.loc[i], subset.loc[i-1]
+        golden = prev['MA20'] <= prev['MA60'] and row['MA20'] > row['MA60']
+        death = prev['MA20'] >= prev['MA60'] and row['MA20'] < row['MA60']
+        if state in ("Golden_Obs", "Death_Obs"):
+            ok = row['MA20'] > row['MA60'] if state == "Golden_Obs" else row['MA20'] < row['MA60']
+            if ok:
+                obs += 1
+                if obs >= 3:
+                    state = last_confirmed = state.replace("Obs", "Confirmed")
+                    cross_row = subset.loc[i - 2]
+                    rng_idx = range(max(0, i - 5), min(len(subset), i + 2))
+            else:
+                state, obs = last_confirmed, 0
+        elif golden:
+            state, obs = "Golden_Obs", 1
+        elif death:
+            state, obs = "Death_Obs", 1
+    if state.endswith("Confirmed"):
+        is_golden = state.startswith("Golden")
+        c_date = pd.to_datetime(cross_row['date']).strftime('%Y/%m/%d')
+        res['state_desc'] = ("黃金交叉" if is_golden else "死亡交叉") + f" ({c_date})"
+        res['cross_date'] = c_date
+        p = subset.loc[list(rng_idx), 'max'].max() if is_golden else subset.loc[list(rng_idx), 'min'].min()
+        res['key_price'] = p
+        res['key_price_desc'] = f"關鍵點前後{'高' if is_golden else '低'}點: {p}"
+    elif state.endswith("Obs"):
+        res['state_desc'] = f"{'黃金' if state.startswith('Golden') else '死亡'}交叉觀察中 (第 {obs} 天)"
+    if len(df) >= 60:
+        last = len(df) - 1
+        ma20, ma60, close = df.loc[last, 'MA20'], df.loc[last, 'MA60'], df.loc[last, 'close']
+        tp = 30 * (ma60 - ma20) + 1.5 * df.loc[last - 19, 'close'] - 0.5 * df.loc[last - 59, 'close']
+        if abs(tp - close) / close * 100 <= 10:
+            res['trigger_price'] = tp
+            res['trigger_desc'] = (f"⚠️ 黃金交叉觸發價: 明日收盤 > {tp:.2f}" if ma20 < ma60
+                                   else f"⚠️ 死亡交叉觸發價: 明日收盤 < {tp:.2f}")
+    return res
+
+
+def make_prices(rng, n):
+    close = 100 + np.cumsum(rng.normal(0, 1.5, n)).round(2)
+    df = pd.DataFrame({
+        'date': pd.bdate_range('2024-01-01', periods=n),
+        'max': close + 1, 'min': close - 1, 'close': close,
+    })
+    df['MA20'] = df['close'].rolling(20).mean()
+    df['MA60'] = df['close'].rolling(60).mean()
+    return df.fillna(0)
+
+
+def test_ma_cross_matches_reference():
+    rng = np.random.default_rng(11)
+    for trial in range(150):
+        df = make_prices(rng, int(rng.integers(60, 200)))
+        assert analyze_ma_cross(df) == reference_ma_cross(df), f"trial {trial}"
+
+
+def test_trigger_price_solves_crossing():
+    """臨界價 P 代入後，明日快慢線應相等 (SMA 與 EMA 皆同)"""
+    rng = np.random.default_rng(5)
+    close = pd.Series(100 + np.cumsum(rng.normal(0, 1, 120)))
+    for fast, slow in [(5, 20), (20, 60), (10, 120)]:
+        for ma_type in ("sma", "ema"):
+            f_ma = moving_average(close, fast, ma_type).iloc[-1]
+            s_ma = moving_average(close, slow, ma_type).iloc[-1]
+            p = ma_trigger_price(f_ma, s_ma, close.iloc[-fast], close.iloc[-slow], fast, slow, ma_type)
+            nxt = pd.concat([close, pd.Series([p])], ignore_index=True)
+            assert np.isclose(moving_average(nxt, fast, ma_type).iloc[-1], moving_average(nxt, slow, ma_type).iloc[-1])
+
+
+def test_configurable_pair_without_columns():
+    # 沒有 MA 欄位時由收盤價計算；持續上漲 -> 5/20 黃金交叉已確認
+    close = np.concatenate([np.linspace(120, 100, 40), np.linspace(100, 130, 30)])
+    df = pd.DataFrame({'date': pd.bdate_range('2024-01-01', periods=70), 'max': close + 1, 'min': close - 1, 'close': close})
+    res = analyze_ma_cross(df, fast=5, slow=20)
+    assert res['state_desc'].startswith("黃金交叉 (")
+    res_ema = analyze_ma_cross(df, fast=5, slow=20, ma_type="ema")
+    assert res_ema['state_desc'].startswith("黃金交叉 (")
+
+
+if __name__ == "__main__":
+    test_ma_cross_matches_reference()
+    test_trigger_price_solves_crossing()
+    test_configurable_pair_without_columns()
+    print("All MA cross tests passed!")
@@ -0,0 +1,76 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.analysis import calculate_technical_indicators, analyze_technical
+from core.panel import build_panel, resample_panel, analyze_panel
+from core.strategy import resample_to_period
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_frame(rng, n_days, end='2025-06-30', drop=0.05):
+    """隨機漫步日線，隨機刪掉部分日期模擬停牌"""
+    dates = pd.bdate_range(end=end, periods=n_days)
+    close = 100 + np.cumsum(rng.normal(0, 2, n_days))
+    df = pd.DataFrame({
+        'date': dates,
+        'open': close + rng.normal(0, 1, n_days),
+        'max': close + rng.uniform(0, 3, n_days),
+        'min': close - rng.uniform(0, 3, n_days),
+        'close': close,
+    })
+    df = df[rng.random(n_days) > drop].reset_index(drop=True)
+    return df.round(2)
+
+
+def same(a, b):
+    if isinstance(a, float) and isinstance(b, float) and np.isnan(a) and np.isnan(b):
+        return True
+    return a == b
+
+
+def test_panel_matches_per_stock():
+    sizes = [3, 8, 45, 59, 60, 75, 130, 180, 250, 250]
+    for seed in (11, 12, 13):
+        rng = np.random.default_rng(seed)
+        frames = {f"S{i}": make_frame(rng, n, end=f"2025-06-{20 + i % 5}") for i, n in enumerate(sizes)}
+
+        records = analyze_panel(build_panel(frames))
+        assert list(records) == list(frames)
+
+        for stock_id, df in frames.items():
+            expected = analyze_technical(calculate_technical_indicators(df.copy()))
+            got = records[stock_id]
+            for key in expected:
+                assert same(got[key], expected[key]), f"{seed} {stock_id} {key}: {got[key]} != {expected[key]}"
+
+
+def test_resample_panel_matches_pandas():
+    rng = np.random.default_rng(3)
+    frames = {sid: make_frame(rng, n, drop=0.2) for sid, n in [('A', 300), ('B', 40), ('C', 1)]}
+    panel = build_panel(frames)
+
+    for period, pandas_period in (('W', 'W'), ('M', 'ME')):
+        resampled = resample_panel(panel, period)
+        for i, (sid, df) in enumerate(frames.items()):
+            expected = resample_to_period(df, pandas_period)
+            n = resampled['lengths'][i]
+            assert n == len(expected)
+            np.testing.assert_array_equal(resampled['dates'][i, -n:], expected['date'].to_numpy())
+            for field in ('open', 'max', 'min', 'close'):
+                np.testing.assert_allclose(resampled[field][i, -n:], expected[field].to_numpy())
+
+
+def test_empty_frames_are_skipped():
+    rng = np.random.default_rng(5)
+    panel = build_panel({'A': make_frame(rng, 100), 'B': pd.DataFrame()})
+    assert panel['ids'] == ['A']
+    assert list(analyze_panel(panel)) == ['A']
+    assert analyze_panel(build_panel({})) == {}
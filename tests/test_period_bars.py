@@ -0,0 +1,75 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import store, bars
+from core.strategy import resample_to_period
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_frame(rng, n_days, end='2025-06-30', drop=0.1):
+    dates = pd.bdate_range(end=end, periods=n_days)
+    close = 100 + np.cumsum(rng.normal(0, 2, n_days))
+    df = pd.DataFrame({
+        'date': dates,
+        'stock_id': '2330',
+        'open': close + rng.normal(0, 1, n_days),
+        'max': close + rng.uniform(0, 3, n_days),
+        'min': close - rng.uniform(0, 3, n_days),
+        'close': close,
+    }).round(2)
+    return df[rng.random(n_days) > drop].reset_index(drop=True)
+
+
+def assert_bars_equal(got, expected):
+    assert len(got) == len(expected)
+    np.testing.assert_array_equal(pd.to_datetime(got['date']).to_numpy(), expected['date'].to_numpy())
+    for col in bars.OHLC:
+        np.testing.assert_allclose(got[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float))
+
+
+def test_aggregate_matches_resample():
+    rng = np.random.default_rng(1)
+    df = make_frame(rng, 400)
+    assert_bars_equal(bars.aggregate_bars(df, 'W'), resample_to_period(df, 'W'))
+    assert_bars_equal(bars.aggregate_bars(df, 'M'), resample_to_period(df, 'ME'))
+
+
+def test_daily_rollup_matches_full_aggregate():
+    rng = np.random.default_rng(2)
+    df = make_frame(rng, 200)
+    for period in ('W', 'M'):
+        rolled = bars.aggregate_bars(df.iloc[:100], period)
+        for i in range(100, len(df)):
+            rolled = bars.rollup(rolled, df.iloc[i:i + 1], period)
+        full = bars.aggregate_bars(df, period)
+        pd.testing.assert_frame_equal(rolled.reset_index(drop=True), full)
+
+
+def test_update_period_bars_persistence(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    rng = np.random.default_rng(3)
+    df = make_frame(rng, 500)
+
+    # 本地日線有完整歷史，但分析時只傳入最近 180 根：月線應以完整歷史建立
+    store.save_bars('2330', df.iloc[:400])
+    monthly = bars.update_period_bars('2330', df.iloc[220:400], 'M')
+    assert_bars_equal(monthly, bars.aggregate_bars(df.iloc[:400], 'M'))
+
+    # 之後每天只併入新的日 K
+    for i in range(400, 420):
+        store.save_bars('2330', df.iloc[i:i + 1])
+        monthly = bars.update_period_bars('2330', df.iloc[i - 179:i + 1], 'M')
+    assert_bars_equal(bars.load_period_bars('2330', 'M'), bars.aggregate_bars(df.iloc[:420], 'M'))
+
+    # 傳入的資料與保存的 K 棒之間有缺口：從本地日線補讀
+    store.save_bars('2330', df.iloc[420:])
+    monthly = bars.update_period_bars('2330', df.iloc[-5:], 'M')
+    assert_bars_equal(monthly, bars.aggregate_bars(df, 'M'))
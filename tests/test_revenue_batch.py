@@ -0,0 +1,114 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import store, fundamentals
+from core.strategy import analyze_revenue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def reference_revenue(df, last_processed=None):
+    """原本逐檔的 analyze_revenue (排序 + 遮罩查詢去年同月 + tail(w).max())"""
+    df = df.sort_values('date')
+    last = df.iloc[-1]
+    current_ym = f"{last['revenue_year']}-{str(last['revenue_month']).zfill(2)}"
+    if last_processed and current_ym <= last_processed:
+        return None
+    cur = last['revenue']
+    mom = 0.0
+    if len(df) >= 2 and df.iloc[-2]['revenue'] > 0:
+        mom = (cur - df.iloc[-2]['revenue']) / df.iloc[-2]['revenue'] * 100
+    yoy = 0.0
+    prev = df[(df['revenue_year'] == last['revenue_year'] - 1) & (df['revenue_month'] == last['revenue_month'])]
+    if not prev.empty and prev.iloc[0]['revenue'] > 0:
+        yoy = (cur - prev.iloc[0]['revenue']) / prev.iloc[0]['revenue'] * 100
+    status = ""
+    if cur >= df['revenue'].max():
+        status = "歷史新高"
+    else:
+        for w in (12, 6, 3):
+            if len(df) >= w and cur >= df.tail(w)['revenue'].max():
+                status = f"近 {w} 個月新高"
+                break
+    return {"mom_pct": mom, "yoy_pct": yoy, "high_status": status, "date_str": current_ym}
+
+
+def make_revenue(rng, stock_id, n_months, end_year=2025, end_month=9, drop=0.1):
+    """月營收 (隨機缺幾個月，模擬資料不連續)"""
+    months = pd.period_range(end=pd.Period(year=end_year, month=end_month, freq='M'), periods=n_months, freq='M')
+    keep = rng.random(n_months) > drop
+    keep[-1] = True
+    months = months[keep]
+    revenue = np.round(1e8 * np.exp(np.cumsum(rng.normal(0.01, 0.15, len(months)))))
+    return pd.DataFrame({
+        'date': [(m + 1).start_time.strftime('%Y-%m-%d') for m in months],
+        'stock_id': stock_id,
+        'revenue_year': [m.year for m in months],
+        'revenue_month': [m.month for m in months],
+        'revenue': revenue,
+    })
+
+
+def test_revenue_table_matches_per_stock():
+    rng = np.random.default_rng(1)
+    frames = [make_revenue(rng, f"{4000 + k}", int(rng.integers(1, 40))) for k in range(80)]
+    df_all = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=0)
+    last_processed = {f"{4000 + k}": "2025-09" for k in range(0, 80, 7)}
+
+    table = fundamentals.revenue_table(df_all, last_processed).set_index('stock_id')
+    for df in frames:
+        sid = df['stock_id'].iloc[0]
+        expected = reference_revenue(df, last_processed.get(sid))
+        if expected is None:
+            assert sid not in table.index
+            assert analyze_revenue(df, last_processed.get(sid)) is None
+            continue
+        row = table.loc[sid]
+        single = analyze_revenue(df, last_processed.get(sid))
+        for got in (row, single):
+            assert abs(got['mom_pct'] - expected['mom_pct']) < 1e-9, sid
+            assert abs(got['yoy_pct'] - expected['yoy_pct']) < 1e-9, sid
+            assert got['high_status'] == expected['high_status'], sid
+            assert got['date_str'] == expected['date_str'], sid
+
+
+def test_yoy_uses_same_month_despite_gaps():
+    df = pd.DataFrame({
+        'date': ['2024-04-10', '2024-06-10', '2025-04-10'],
+        'revenue_year': [2024, 2024, 2025],
+        'revenue_month': [3, 5, 3],
+        'revenue': [100.0, 300.0, 150.0],
+    })
+    res = analyze_revenue(df)
+    assert res['date_str'] == "2025-03"
+    assert abs(res['yoy_pct'] - 50.0) < 1e-9      # 2024-03，不是前 12 筆
+    assert abs(res['mom_pct'] - (150 / 300 - 1) * 100) < 1e-9
+    assert res['high_status'] == ""              # 只有 3 筆，且不是最高
+    assert analyze_revenue(df, "2025-03") is None
+
+
+def test_scan_revenue_highs(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    rng = np.random.default_rng(2)
+    for k in range(30):
+        df = make_revenue(rng, f"{5000 + k}", 30, end_month=9 if k else 8, drop=0)
+        store.save_frame('revenue', f"{5000 + k}", df.drop(columns='stock_id'))
+    assert len(store.list_frames('revenue')) == 30
+
+    hits = fundamentals.scan_revenue_highs(min_window=6)
+    assert '5000' not in set(hits['stock_id'])   # 最新月份落後
+    assert (hits['date_str'] == "2025-09").all()
+    assert (hits['all_time_high'] | hits['high_12m'] | hits['high_6m']).all()
+
+    # 全部股票中符合的都要列入
+    table = fundamentals.revenue_table(fundamentals.load_revenue_table(), only_new=False)
+    expected = table[(table['date_str'] == "2025-09") & (table['all_time_high'] | table['high_6m'])]
+    assert set(hits['stock_id']) == set(expected['stock_id'])
+    assert hits['all_time_high'].tolist() == sorted(hits['all_time_high'].tolist(), reverse=True)
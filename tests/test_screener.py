@@ -0,0 +1,104 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import logging
+from datetime import datetime, timedelta
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import store, screener
+from core.analysis import calculate_technical_indicators
+from core.strategy import analyze_3day_high_low, analyze_inertia_with_state, analyze_ma_cross, resample_to_period
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DAYS = 300
+
+
+def make_market(tmp_path, monkeypatch, n_stocks=60, seed=7):
+    """在暫存目錄建立假的本地日線資料庫 (含一檔資料過期的股票)"""
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(store.latest_expected_trading_day())
+    for k in range(n_stocks):
+        stock_end = end - pd.offsets.BDay(5) if k == 0 else end
+        dates = pd.bdate_range(end=stock_end, periods=180)
+        close = 50 + np.cumsum(rng.normal(rng.normal(0, 0.3), 1.5, len(dates)))
+        df = pd.DataFrame({
+            'date': dates,
+            'stock_id': f"{1000 + k}",
+            'open': close + rng.normal(0, 0.5, len(dates)),
+            'max': close + rng.uniform(0, 2, len(dates)),
+            'min': close - rng.uniform(0, 2, len(dates)),
+            'close': close,
+        }).round(2)
+        store.save_bars(f"{1000 + k}", df)
+    store.save_cache('stock_info', {'date': '2025-01-01', 'stocks': {'1001': {'name': '測試一'}}})
+
+
+def reference_hits(recent_days):
+    """以逐檔的策略函式計算預期結果"""
+    start = (datetime.now() - timedelta(days=DAYS)).strftime("%Y-%m-%d")
+    frames = {sid: store.load_bars(sid, start) for sid in store.list_stocks()}
+    market_end = max(df['date'].iloc[-1] for df in frames.values())
+    expected = {'breakout': set(), 'golden_cross': set(), 'weekly_up': set()}
+
+    for sid, df in frames.items():
+        last = df['date'].iloc[-1]
+        if last != market_end:
+            continue
+        last_str = last.strftime('%Y/%m/%d')
+
+        res = analyze_3day_high_low(df)
+        if res['state'] == "站上三日高點" and res['trigger_dates'][-1] == last_str:
+            expected['breakout'].add(sid)
+
+        df_w = resample_to_period(df, 'W')
+        res = analyze_inertia_with_state(df_w, "週線")
+        if res['state'] == "慣性向上" and res['trigger_dates'][-1] == df_w['date'].iloc[-1].strftime('%Y/%m/%d'):
+            expected['weekly_up'].add(sid)
+
+        res = analyze_ma_cross(calculate_technical_indicators(df.copy()))
+        if res['state_desc'].startswith("黃金交叉 ("):
+            pos = int(np.flatnonzero(df['date'].dt.strftime('%Y/%m/%d') == res['cross_date'])[0])
+            if len(df) - 1 - (pos + 2) < recent_days:
+                expected['golden_cross'].add(sid)
+    return expected
+
+
+def test_screen_matches_strategy_functions(tmp_path, monkeypatch):
+    make_market(tmp_path, monkeypatch)
+    recent_days = 10
+    expected = reference_hits(recent_days)
+    results = screener.screen_market(days=DAYS, recent_days=recent_days)
+
+    for rule, hits in results.items():
+        logger.info(f"{rule}: {[h['stock_id'] for h in hits]}")
+        assert expected[rule], f"fixture 應至少有一檔符合 {rule}"
+        assert {h['stock_id'] for h in hits} == expected[rule]
+        assert '1000' not in {h['stock_id'] for h in hits}   # 資料過期
+
+    # 排序
+    scores = [h['score'] for h in results['breakout']]
+    assert scores == sorted(scores, reverse=True)
+    days_ago = [h['days_ago'] for h in results['golden_cross']]
+    assert days_ago == sorted(days_ago)
+
+    report = screener.format_screen_report(results)
+    assert "【站上三日高點】" in report
+
+
+def test_screen_limit_and_rules(tmp_path, monkeypatch):
+    make_market(tmp_path, monkeypatch)
+    results = screener.screen_market(rules=['breakout'], days=DAYS, limit=2)
+    assert list(results) == ['breakout']
+    assert len(results['breakout']) <= 2
+
+    try:
+        screener.screen_market(rules=['unknown'], days=DAYS)
+        assert False, "未知規則應拋出 ValueError"
+    except ValueError:
+        pass
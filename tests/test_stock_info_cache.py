@@ -0,0 +1,59 @@
+import sys
+import os
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.data as data
+from core import store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_info():
+    return pd.DataFrame({
+        'industry_category': ['半導體業', '電子工業', '其他電子業', '半導體業'],
+        'stock_id': ['2330', '2317', '2317', '2454'],
+        'stock_name': ['台積電', '鴻海', '鴻海', '聯發科'],
+        'type': ['twse', 'twse', 'twse', 'twse'],
+        'date': ['2025-01-02'] * 4,
+    })
+
+
+def test_stock_info_loaded_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(data, '_stock_info_index', None)
+    calls = []
+
+    def fake_call(method, **kwargs):
+        calls.append(method)
+        return make_info()
+
+    monkeypatch.setattr(data, 'finmind_call', fake_call)
+
+    assert data.get_stock_name('2330') == '台積電'
+    assert data.get_stock_name('9999') is None
+    names = data.get_stock_names(['2317', '2454', '9999'])
+    assert names == {'2317': '鴻海', '2454': '聯發科'}
+    assert data.get_stock_info_index()['2317']['industry'] == '電子工業'
+    assert len(calls) == 1
+
+    # 新的 process (記憶體快取清空) 當天應直接讀取本地快取
+    monkeypatch.setattr(data, '_stock_info_index', None)
+    assert data.get_stock_name('2454') == '聯發科'
+    assert len(calls) == 1
+
+
+def test_stale_cache_used_on_api_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(data, '_stock_info_index', None)
+    store.save_cache('stock_info', {'date': '2000-01-01', 'stocks': {'2330': {'name': '台積電', 'industry': None, 'type': None}}})
+
+    def broken_call(method, **kwargs):
+        raise Exception("402 upper limit")
+
+    monkeypatch.setattr(data, 'finmind_call', broken_call)
+    assert data.get_stock_name('2330') == '台積電'
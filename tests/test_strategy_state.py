@@ -0,0 +1,123 @@
+import sys
+import os
+import json
+import numpy as np
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import store
+from core import state as st
+from core.strategy import analyze_inertia_with_state, analyze_3day_high_low, analyze_ma_cross, resample_to_period
+from core.analysis import calculate_technical_indicators
+from core.panel import build_panel, analyze_panel
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_frame(rng, n_days, end='2025-06-30'):
+    dates = pd.bdate_range(end=end, periods=n_days)
+    close = 100 + np.cumsum(rng.normal(0, 2, n_days))
+    return pd.DataFrame({
+        'date': dates,
+        'open': close + rng.normal(0, 1, n_days),
+        'max': close + rng.uniform(0, 3, n_days),
+        'min': close - rng.uniform(0, 3, n_days),
+        'close': close,
+    }).round(2)
+
+
+def fold(df):
+    state, _ = st.advance_state(None, df)
+    return state
+
+
+def assert_same(got, expected):
+    assert got.keys() == expected.keys()
+    for key in expected:
+        if key == 'trigger_price':
+            assert abs(got[key] - expected[key]) < 1e-6
+        elif key == 'trigger_desc':
+            continue   # 觸發價的浮點誤差可能影響小數第二位
+        else:
+            assert got[key] == expected[key], f"{key}: {got[key]} != {expected[key]}"
+
+
+def test_step_matches_full_history():
+    for seed in range(5):
+        rng = np.random.default_rng(seed)
+        for n in (1, 3, 5, 30, 61, 250):
+            df = make_frame(rng, n)
+            state = fold(df)
+
+            assert_same(st.inertia_state_result(state['inertia']), analyze_inertia_with_state(df, window=None))
+            assert_same(st.breakout_state_result(state['breakout']), analyze_3day_high_low(df, window=None))
+            assert_same(st.ma_cross_state_result(state['ma_cross']),
+                        analyze_ma_cross(calculate_technical_indicators(df.copy()), window=None))
+
+            df_w = resample_to_period(df, 'W')
+            assert_same(st.period_state_result(state['weekly'], "週線"),
+                        analyze_inertia_with_state(df_w, "週線", window=None))
+            df_m = resample_to_period(df, 'ME')
+            assert_same(st.period_state_result(state['monthly'], "月線"),
+                        analyze_inertia_with_state(df_m, "月線", window=None))
+
+
+def test_short_history_matches_panel_engine():
+    # 歷史不長 (均線前段補 0 的部分仍在 MA_WINDOW 內) 時，兩種引擎的均線交叉結果相同
+    for seed in range(5):
+        rng = np.random.default_rng(seed)
+        for n in (30, 60, 61, 75, 90):
+            df = make_frame(rng, n)
+            expected = analyze_panel(build_panel({'2330': df}))['2330']
+            got = st.technical_from_state(fold(df))
+            assert_same(got['ma_cross'], expected['ma_cross'])
+
+
+def test_ema_cross_matches_full_history():
+    rng = np.random.default_rng(42)
+    df = make_frame(rng, 300)
+    state = st.new_ma_cross_state(fast=5, slow=20, ma_type="ema")
+    for row in df.to_dict('records'):
+        st.step_ma_cross(state, st._to_bar(row))
+    assert_same(st.ma_cross_state_result(state),
+                analyze_ma_cross(df, fast=5, slow=20, ma_type="ema", window=None))
+
+
+def test_incremental_update_and_persistence(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    rng = np.random.default_rng(7)
+    df = make_frame(rng, 200)
+
+    # 第一次：從頭建立 (180 根)，之後每天只處理 1 根
+    record = st.update_technical('2330', df.iloc[:180])
+    assert record['date'] == df['date'].iloc[179]
+    for i in range(180, 200):
+        record = st.update_technical('2330', df.iloc[i - 60:i + 1])
+        saved = st.load_state('2330')
+        assert saved['last_date'] == df['date'].iloc[i].strftime('%Y-%m-%d')
+
+    # 與一次處理完整資料的結果相同，且狀態可完整 JSON 化
+    expected = st.technical_from_state(fold(df))
+    assert json.loads(json.dumps(st.load_state('2330'))) == st.load_state('2330')
+    assert record['three_day'] == expected['three_day']
+    assert record['inertia'] == expected['inertia']
+    assert record['ma_cross']['state_desc'] == expected['ma_cross']['state_desc']
+
+    # 舊版本的狀態：重建
+    old = dict(st.load_state('2330'), version=1)
+    _, processed = st.advance_state(old, df.iloc[-60:])
+    assert processed == 60
+
+    # 沒有新 K 棒：不處理
+    _, processed = st.advance_state(st.load_state('2330'), df.iloc[-10:])
+    assert processed == 0
+
+    # 有缺口：重建
+    later = make_frame(rng, 50, end='2025-12-31')
+    state, processed = st.advance_state(st.load_state('2330'), later)
+    assert processed == 50
+    assert state['breakout']['bars'] == 50
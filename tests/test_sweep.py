@@ -0,0 +1,91 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import store, backtest as bt, sweep
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GRID = {
+    'inertia': {'window': [None, 60]},
+    'breakout': {'lookback': [2, 3], 'window': [None, 60]},
+    'ma_cross': {'fast': [10, 20], 'slow': [20, 60], 'obs_days': [2, 3]},
+}
+
+
+def make_store(tmp_path, monkeypatch, n_stocks=8, seed=5):
+    """長短不一的假日線 (panel 左側會補 NaN)"""
+    monkeypatch.setattr(store, 'DATA_STORE_DIR', str(tmp_path))
+    rng = np.random.default_rng(seed)
+    for k in range(n_stocks):
+        n_days = 150 + 40 * k
+        dates = pd.bdate_range(end='2025-06-30', periods=n_days)
+        close = 100 + np.cumsum(rng.normal(0, 2, n_days))
+        store.save_bars(f"{3000 + k}", pd.DataFrame({
+            'date': dates,
+            'open': close + rng.normal(0, 1, n_days),
+            'max': close + rng.uniform(0, 3, n_days),
+            'min': close - rng.uniform(0, 3, n_days),
+            'close': close,
+        }).round(2))
+
+
+def test_expand_grid_skips_invalid_pairs():
+    combos = sweep.expand_grid(GRID)
+    ma = [p for rule, p in combos if rule == 'ma_cross']
+    assert len(ma) == 6   # (20, 20) 被略過
+    assert all(p['fast'] < p['slow'] and p['ma_type'] == "sma" for p in ma)
+    assert len(combos) == 2 + 4 + 6
+
+
+def test_sweep_matches_backtest(tmp_path, monkeypatch):
+    make_store(tmp_path, monkeypatch)
+    serial = sweep.run_sweep(GRID, workers=1)
+    shared = sweep.run_sweep(GRID, workers=3)
+    pd.testing.assert_frame_equal(serial, shared)
+
+    # 每一組參數都應等同逐檔回測
+    for rule, params in sweep.expand_grid(GRID):
+        expected = bt.run_backtest(rules=[rule], params={rule: params}, workers=1)['rules'].iloc[0]
+        row = serial[(serial['rule'] == rule) & (serial['params'] == sweep.format_params(params))].iloc[0]
+        for col in ('trades', 'wins', 'hit_rate', 'avg_return_pct', 'median_total_return_pct', 'worst_drawdown_pct'):
+            assert abs(row[col] - expected[col]) < 1e-9, f"{rule} {params} {col}: {row[col]} != {expected[col]}"
+
+    # 排名
+    values = serial['mean_total_return_pct'].tolist()
+    assert values == sorted(values, reverse=True)
+    for rule, rows in serial.groupby('rule'):
+        assert rows['rank'].tolist() == list(range(1, len(rows) + 1))
+    logger.info("\n" + sweep.format_sweep_report(serial))
+
+
+def test_sweep_rejects_unknown_metric(tmp_path, monkeypatch):
+    make_store(tmp_path, monkeypatch, n_stocks=1)
+    try:
+        sweep.run_sweep(GRID, sort_by='unknown', workers=1)
+        assert False, "未知排名欄位應拋出 ValueError"
+    except ValueError:
+        pass
+
+
+def test_attached_shared_memory_is_not_tracked_by_worker():
+    # 另一個 process (不共用 resource tracker) 映射後結束，區塊仍由建立者負責清理
+    import subprocess
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(create=True, size=16)
+    try:
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        code = f"from core import sweep; b = sweep._open_shared({block.name!r}); b.close()"
+        result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert "leaked" not in result.stderr
+        shared_memory.SharedMemory(name=block.name).close()
+    finally:
+        block.close()
+        block.unlink()